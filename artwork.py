@@ -0,0 +1,325 @@
+# artwork.py
+"""
+Album art, extracted in the background and stored once per image.
+
+A worker pulls the embedded cover out of each new or changed audio file
+(or takes a cover.jpg/folder.jpg next to it) and saves it downscaled to
+a few fixed sizes. Thumbnails are named after a hash of the original
+image, so the identical covers of a whole album are stored once. Which
+track has which cover is kept in the library database, so the UI only
+ever reads the small thumbnails and never opens an audio file.
+"""
+import base64
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+import cue
+import utils
+from metadata import LIBRARY_FILE
+
+try:
+    import mutagen      # optional: without it only cover files next to the songs are found
+    from mutagen.flac import Picture
+except ImportError:
+    mutagen = None
+
+ART_DIR = os.path.join(utils.get_config_dir(), "art")
+THUMB_SIZES = (32, 128, 256)                # px, longest side
+FOLDER_COVERS = ("cover", "folder", "front", "album")
+FOLDER_COVER_TYPES = (".jpg", ".jpeg", ".png")
+FRONT_COVER = 3                             # ID3/FLAC picture type
+MAX_PIXMAPS = 512                           # thumbnails kept loaded
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS art (
+    path TEXT PRIMARY KEY,
+    digest TEXT NOT NULL DEFAULT '',
+    mtime REAL NOT NULL DEFAULT 0
+)
+"""
+
+def thumb_path(digest, size):
+    return os.path.join(ART_DIR, digest[:2], f"{digest}-{size}.jpg")
+
+def thumb_size(size):
+    """The smallest thumbnail size at least `size` px, or the largest one"""
+    return next((s for s in THUMB_SIZES if s >= size), THUMB_SIZES[-1])
+
+def embedded_cover(path):
+    """Image data of the embedded cover (the front cover if marked), or None"""
+    if mutagen is None:
+        return None
+    try:
+        audio = mutagen.File(path)
+    except Exception:
+        return None
+    if audio is None:
+        return None
+    pictures = []                           # (is front cover, data)
+    try:
+        for picture in getattr(audio, "pictures", None) or ():          # FLAC
+            pictures.append((picture.type == FRONT_COVER, picture.data))
+        tags = audio.tags
+        if tags is not None and hasattr(tags, "getall"):                # ID3
+            for frame in tags.getall("APIC"):
+                pictures.append((frame.type == FRONT_COVER, frame.data))
+        elif tags is not None:
+            for cover in tags.get("covr") or ():                        # MP4
+                pictures.append((True, bytes(cover)))
+            for value in tags.get("metadata_block_picture") or ():      # Ogg
+                picture = Picture(base64.b64decode(value))
+                pictures.append((picture.type == FRONT_COVER, picture.data))
+    except Exception:
+        pass
+    pictures = [p for p in pictures if p[1]]
+    if not pictures:
+        return None
+    return max(pictures, key=lambda p: p[0])[1]
+
+def folder_cover(directory):
+    """Path of a cover image file in a directory, or None"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    for name in sorted(names):
+        stem, ext = os.path.splitext(name.lower())
+        if stem in FOLDER_COVERS and ext in FOLDER_COVER_TYPES:
+            return os.path.join(directory, name)
+    return None
+
+def store_thumbnails(data):
+    """Save thumbnails of an image unless they exist; returns its digest, or "" if unreadable"""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if all(os.path.exists(thumb_path(digest, size)) for size in THUMB_SIZES):
+        return digest
+    image = QImage.fromData(data)
+    if image.isNull():
+        return ""
+    try:
+        os.makedirs(os.path.dirname(thumb_path(digest, THUMB_SIZES[0])), exist_ok=True)
+        for size in THUMB_SIZES:
+            thumb = image
+            if max(image.width(), image.height()) > size:
+                thumb = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            target = thumb_path(digest, size)
+            tmp = target + ".part"
+            if not thumb.save(tmp, "JPG", 90):
+                raise OSError("could not write image")
+            os.replace(tmp, target)
+    except OSError as e:
+        print(f"Warning: Could not save album art thumbnails: {e}")
+        return ""
+    return digest
+
+
+class ArtStore:
+    """Which cover each track has, in the library database ("" = none)"""
+
+    def __init__(self, path=LIBRARY_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def digest(self, path):
+        row = self.db.execute("SELECT digest FROM art WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def mtimes(self, paths):
+        """{path: mtime} of the given tracks that were looked at before"""
+        paths = list(paths)
+        known = {}
+        # A few hundred paths per query keeps under SQLite's parameter limit
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            known.update(self.db.execute(
+                f"SELECT path, mtime FROM art WHERE path IN ({', '.join('?' * len(chunk))})", chunk))
+        return known
+
+    def digests(self):
+        """Every cover still in use"""
+        return {row[0] for row in self.db.execute("SELECT DISTINCT digest FROM art WHERE digest != ''")}
+
+    def put_many(self, rows):
+        try:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO art VALUES (?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save album art index: {e}")
+
+    def remove_many(self, paths):
+        try:
+            with self.db:
+                self.db.executemany("DELETE FROM art WHERE path = ?", [(p,) for p in paths])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not remove album art index entries: {e}")
+
+
+class ArtScanThread(QThread):
+    """Extract and store the covers of files whose modification time changed"""
+    scanned = pyqtSignal(list)              # emits batches of (path, digest, mtime)
+
+    BATCH_SIZE = 200
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs                    # [(path, known mtime or None)]
+
+    def run(self):
+        batch = []
+        folders = {}                        # directory -> digest of its cover file
+        for path, known_mtime in self.jobs:
+            if self.isInterruptionRequested():
+                break
+            try:
+                mtime = os.path.getmtime(cue.source_file(path))
+            except OSError:
+                continue
+            if known_mtime is not None and mtime == known_mtime:
+                continue
+            data = embedded_cover(cue.media_file(path))
+            if data:
+                digest = store_thumbnails(data)
+            else:
+                directory = os.path.dirname(path)
+                if directory not in folders:
+                    folders[directory] = self._folder_digest(directory)
+                digest = folders[directory]
+            batch.append((path, digest, mtime))
+            if len(batch) >= self.BATCH_SIZE:
+                self.scanned.emit(batch)
+                batch = []
+        if batch:
+            self.scanned.emit(batch)
+
+    @staticmethod
+    def _folder_digest(directory):
+        cover = folder_cover(directory)
+        if cover is None:
+            return ""
+        try:
+            with open(cover, "rb") as f:
+                return store_thumbnails(f.read())
+        except OSError:
+            return ""
+
+
+class AlbumArt(QObject):
+    """Cover thumbnails by track path, and the background scans that make them"""
+    changed = pyqtSignal(list)              # emits paths whose cover changed
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or ArtStore()
+        self._digests = OrderedDict()       # path -> digest, recently looked up
+        self._pixmaps = OrderedDict()       # (digest, size) -> QPixmap, recently used
+        self._pending = []
+        self._thread = None
+        self._dirty = False                 # covers changed since the last prune
+
+    def digest(self, path):
+        """Digest of a track's cover, "" if it has none"""
+        digest = self._digests.get(path)
+        if digest is None:
+            digest = self.store.digest(path) or ""
+            self._digests[path] = digest
+            if len(self._digests) > MAX_PIXMAPS * 4:
+                self._digests.popitem(last=False)
+        else:
+            self._digests.move_to_end(path)
+        return digest
+
+    def pixmap(self, path, size):
+        """A track's cover as a thumbnail of at least `size` px where available, or None"""
+        digest = self.digest(path)
+        if not digest:
+            return None
+        key = (digest, thumb_size(size))
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            pixmap = QPixmap(thumb_path(*key))
+            if pixmap.isNull():
+                return None
+            self._pixmaps[key] = pixmap
+            if len(self._pixmaps) > MAX_PIXMAPS:
+                self._pixmaps.popitem(last=False)
+        else:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def request(self, paths):
+        """Look for covers of these tracks, skipping files unchanged since the last look"""
+        known = self.store.mtimes(paths)
+        self._pending.extend((path, known.get(path)) for path in paths)
+        if self._thread is None:
+            self._start_next()
+
+    def forget(self, paths):
+        self.store.remove_many(paths)
+        for path in paths:
+            self._digests.pop(path, None)
+        self._dirty = True
+
+    def stop(self):
+        self._pending = []
+        if self._thread is not None:
+            self._thread.requestInterruption()
+            self._thread.wait()
+
+    def close(self):
+        self.stop()
+        self.store.close()
+
+    def _start_next(self):
+        if not self._pending:
+            self._thread = None
+            if self._dirty:
+                self.prune()
+            return
+        jobs, self._pending = self._pending, []
+        self._thread = ArtScanThread(jobs, self)
+        self._thread.scanned.connect(self._on_scanned)
+        self._thread.finished.connect(self._on_finished)
+        self._thread.start()
+
+    def _on_scanned(self, rows):
+        self.store.put_many(rows)
+        changed = []
+        for path, digest, _ in rows:
+            if self._digests.get(path) != digest:
+                self._digests.pop(path, None)
+                changed.append(path)
+        if changed:
+            self._dirty = True
+            self.changed.emit(changed)
+
+    def _on_finished(self):
+        self._thread.deleteLater()
+        self._start_next()
+
+    def prune(self):
+        """Delete thumbnails no track uses any more"""
+        self._dirty = False
+        used = self.store.digests()
+        try:
+            folders = os.listdir(ART_DIR)
+        except OSError:
+            return
+        for folder in folders:
+            directory = os.path.join(ART_DIR, folder)
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.split("-", 1)[0] not in used:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
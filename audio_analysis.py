@@ -0,0 +1,240 @@
+# audio_analysis.py
+"""
+Real-time analysis of the playing audio, for the dock.
+
+QAudioProbe hands over every decoded buffer on the GUI thread, where it
+is only copied into a ring of slots allocated up front. A worker thread
+turns each slot into loudness and onset strength, and optionally a
+spectrum, using views and in-place NumPy operations on preallocated
+arrays; the FFT's output and the copy of the bars handed to the GUI are
+the only arrays made per spectrum frame.
+If the worker falls behind, stale buffers are skipped instead of queued,
+which keeps the latency bounded.
+"""
+import math
+import threading
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtMultimedia import QAudioFormat, QAudioProbe, QMediaObject
+
+try:
+    import numpy        # optional: without it the dock does not react to the music
+except ImportError:
+    numpy = None
+
+SLOTS = 8                                   # buffers waiting for the worker at most
+SLOT_BYTES = 64 * 1024                      # longer buffers are cut to this
+MAX_BACKLOG = 2                             # older buffers are skipped when behind
+ATTACK = 0.05                               # s; how fast the level follows a rise
+RELEASE = 0.4                               # s; ... and a fall
+PEAK_DECAY = 8.0                            # s; auto gain forgets loud passages this slowly
+FFT_SIZE = 2048
+SPECTRUM_RANGE = (40.0, 16000.0)            # Hz covered by the bars, spaced logarithmically
+SPECTRUM_FLOOR_DB = -60.0                   # bars are empty at this level, full at 0 dBFS
+SPECTRUM_FALL = 0.85                        # bars sink to this fraction per frame at most
+
+# (sample type, bits) -> (numpy dtype, scale to -1..1, zero level)
+SAMPLE_FORMATS = {
+    (QAudioFormat.SignedInt, 16): ("<i2", 1 / 32768, 0),
+    (QAudioFormat.SignedInt, 32): ("<i4", 1 / 2147483648, 0),
+    (QAudioFormat.UnSignedInt, 8): ("u1", 1 / 128, 128),
+    (QAudioFormat.Float, 32): ("<f4", 1.0, 0),
+}
+
+def speed_for(level, onset):
+    """Dock playback speed for a loudness and onset strength (both 0..1)"""
+    return max(0.25, min(3.0, 0.5 + level + 0.75 * onset))
+
+
+class AudioAnalyzer(QThread):
+    """Loudness and onsets of what the player is playing"""
+    levels = pyqtSignal(float, float)       # emits (smoothed loudness, onset strength), both 0..1
+    spectrum = pyqtSignal(object)           # emits a float32 array of bar heights 0..1
+
+    def __init__(self, media_player, parent=None):
+        super().__init__(parent)
+        self.probe = QAudioProbe(self)
+        self.probe.audioBufferProbed.connect(self.feed)
+        if isinstance(media_player, QMediaObject):
+            probed = self.probe.setSource(media_player)
+        else:
+            # The PCM engine hands over its processed blocks itself
+            media_player.audioBufferProbed.connect(self.feed)
+            probed = True
+        self.available = numpy is not None and probed
+        self.dropped = 0                    # buffers skipped because the worker was behind
+
+        self._cond = threading.Condition()
+        self._head = 0                      # buffers written
+        self._tail = 0                      # buffers analyzed or skipped
+        self._running = False
+        self._info = [None] * SLOTS         # slot -> (byte count, sample format, channels, rate)
+        if numpy is None:
+            return
+        self._raw = numpy.zeros((SLOTS, SLOT_BYTES), numpy.uint8)
+        self._mono = numpy.zeros(SLOT_BYTES, numpy.float32)
+
+        # Spectrum settings, set from the GUI thread (0 bins = off)
+        self._bins = 0
+        self._interval = 1 / 30
+        # ... and the worker's arrays for them
+        self._history = numpy.zeros(FFT_SIZE, numpy.float32)   # last samples, circular
+        self._history_pos = 0
+        self._window = numpy.hanning(FFT_SIZE).astype(numpy.float32)
+        self._fft_in = numpy.zeros(FFT_SIZE, numpy.float32)
+        self._magnitudes = numpy.zeros(FFT_SIZE // 2 + 1, numpy.float32)
+        self._layout = None                 # (bins, rate) the arrays below are for
+        self._edges = None
+        self._bars = None
+        self._falling = None                # bar heights as last emitted, falling
+        self._last_spectrum = 0.0
+
+        # Worker state
+        self.level = 0.0
+        self._average = 0.0                 # slow loudness, for onsets
+        self._peak = 1e-4                   # recent loudest buffer, for auto gain
+
+    # ---------- GUI thread ----------
+    def feed(self, buffer):
+        fmt = buffer.format()
+        key = (fmt.sampleType(), fmt.sampleSize())
+        if key not in SAMPLE_FORMATS or fmt.channelCount() < 1 or fmt.sampleRate() < 1:
+            return
+        size = min(buffer.byteCount(), SLOT_BYTES)
+        with self._cond:
+            if self._head - self._tail >= SLOTS:
+                self.dropped += 1
+                return
+            slot = self._head % SLOTS
+        data = buffer.constData()
+        data.setsize(size)
+        self._raw[slot, :size] = numpy.frombuffer(data, numpy.uint8)
+        self._info[slot] = (size, key, fmt.channelCount(), fmt.sampleRate())
+        with self._cond:
+            self._head += 1
+            self._cond.notify()
+
+    def set_spectrum(self, bins, fps=30):
+        """Emit `spectrum` with this many bars at most fps times a second; 0 bins turns it off"""
+        with self._cond:
+            self._bins = max(0, int(bins))
+            self._interval = 1 / max(1, fps)
+
+    def start(self):
+        if not self.available or self.isRunning():
+            return
+        self._running = True
+        super().start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    # ---------- Worker thread ----------
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and self._head == self._tail:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                if self._head - self._tail > MAX_BACKLOG:
+                    self._tail = self._head - MAX_BACKLOG
+                slot = self._tail % SLOTS
+            self._analyze(slot)
+            with self._cond:
+                self._tail += 1
+
+    def _mono_samples(self, slot):
+        """Average the channels of a slot into self._mono; returns (samples, rate)"""
+        size, key, channels, rate = self._info[slot]
+        dtype, scale, zero = SAMPLE_FORMATS[key]
+        width = int(dtype[-1])
+        frames = size // (width * channels)
+        samples = self._raw[slot, :frames * width * channels].view(dtype).reshape(frames, channels)
+        mono = self._mono[:frames]
+        numpy.sum(samples, axis=1, dtype=numpy.float32, out=mono)
+        if zero:
+            mono -= zero * channels
+        mono *= scale / channels
+        return mono, rate
+
+    def _analyze(self, slot):
+        mono, rate = self._mono_samples(slot)
+        if not len(mono):
+            return
+        duration = len(mono) / rate
+        rms = math.sqrt(float(numpy.dot(mono, mono)) / len(mono))
+
+        # Auto gain: loudness relative to the recent peak, so quiet and
+        # loud songs both use the whole range
+        self._peak = max(rms, self._peak * math.exp(-duration / PEAK_DECAY), 1e-4)
+        target = rms / self._peak
+        tau = ATTACK if target > self.level else RELEASE
+        self.level += (target - self.level) * (1 - math.exp(-duration / tau))
+
+        # Onset: how far this buffer jumps above the slow average
+        onset = max(0.0, min(1.0, (rms - self._average) / (self._average + 1e-4)))
+        self._average += (rms - self._average) * (1 - math.exp(-duration / RELEASE))
+
+        self.levels.emit(self.level, onset)
+
+        with self._cond:
+            bins, interval = self._bins, self._interval
+        if bins:
+            self._remember(mono)
+            now = time.monotonic()
+            if now - self._last_spectrum >= interval:
+                self._last_spectrum = now
+                self._emit_spectrum(bins, rate)
+
+    def _remember(self, mono):
+        """Keep the last FFT_SIZE samples in the circular history"""
+        history, pos = self._history, self._history_pos
+        if len(mono) >= FFT_SIZE:
+            history[:] = mono[-FFT_SIZE:]
+            self._history_pos = 0
+            return
+        first = min(len(mono), FFT_SIZE - pos)
+        history[pos:pos + first] = mono[:first]
+        history[:len(mono) - first] = mono[first:]
+        self._history_pos = (pos + len(mono)) % FFT_SIZE
+
+    def _prepare_spectrum(self, bins, rate):
+        """Band edges and output arrays for a bar count; only runs when settings change"""
+        low, high = SPECTRUM_RANGE[0], min(SPECTRUM_RANGE[1], rate / 2)
+        edges = numpy.round(numpy.geomspace(low, high, bins + 1) * FFT_SIZE / rate).astype(numpy.intp)
+        for i in range(1, len(edges)):
+            edges[i] = max(edges[i], edges[i - 1] + 1)      # every bar gets at least one FFT bin
+        self._edges = numpy.minimum(edges, len(self._magnitudes) - 1)
+        self._bars = numpy.zeros(bins, numpy.float32)
+        self._falling = numpy.zeros(bins, numpy.float32)
+        self._layout = (bins, rate)
+
+    def _emit_spectrum(self, bins, rate):
+        if self._layout != (bins, rate):
+            self._prepare_spectrum(bins, rate)
+        pos = self._history_pos
+        tail = FFT_SIZE - pos
+        numpy.multiply(self._history[pos:], self._window[:tail], out=self._fft_in[:tail])
+        numpy.multiply(self._history[:pos], self._window[tail:], out=self._fft_in[tail:])
+        numpy.abs(numpy.fft.rfft(self._fft_in), out=self._magnitudes)
+
+        bars = self._bars
+        numpy.maximum.reduceat(self._magnitudes, self._edges[:-1], out=bars)
+        # dB relative to a full scale sine (a Hann window halves its peak)
+        bars *= 4 / FFT_SIZE
+        numpy.maximum(bars, 1e-9, out=bars)
+        numpy.log10(bars, out=bars)
+        bars *= 20 / -SPECTRUM_FLOOR_DB
+        bars += 1
+        numpy.clip(bars, 0, 1, out=bars)
+
+        # Let bars fall smoothly instead of flickering
+        falling = self._falling
+        falling *= SPECTRUM_FALL
+        numpy.maximum(falling, bars, out=falling)
+        # A copy (only a few dozen floats), as the receiver keeps it to paint later
+        self.spectrum.emit(falling.copy())
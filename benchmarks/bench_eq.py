@@ -0,0 +1,87 @@
+# bench_eq.py
+"""
+CPU cost of the 10-band equalizer on 48 kHz stereo, as a share of one
+core: time spent filtering divided by the duration of the audio. Every
+band is set to a non-zero gain so no filter is skipped. Runs the scipy
+path when scipy is installed and the FFT fallback always, and checks the
+fallback against a plain sample-by-sample biquad.
+
+    python benchmarks/bench_eq.py [seconds of audio] [block frames]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy
+import dsp
+
+RATE = 48000
+CHANNELS = 2
+GAINS = [6, -4, 3, -2, 5, -3, 2, -5, 4, -6]
+
+def make_eq(use_scipy):
+    saved = dsp.sosfilt
+    if not use_scipy:
+        dsp.sosfilt = None
+    try:
+        eq = dsp.Equalizer(RATE, CHANNELS)
+        eq.set_gains(GAINS)
+    finally:
+        dsp.sosfilt = saved
+    return eq
+
+def run(eq, audio, block_frames, use_scipy):
+    saved = dsp.sosfilt
+    if not use_scipy:
+        dsp.sosfilt = None
+    try:
+        out = audio.copy()
+        start = time.perf_counter()
+        for i in range(0, len(out), block_frames):
+            eq.process(out[i:i + block_frames])
+        elapsed = time.perf_counter() - start
+    finally:
+        dsp.sosfilt = saved
+    return out, elapsed
+
+def reference(sos, samples):
+    """Direct form I, one sample at a time"""
+    out = samples.astype(numpy.float64)
+    for b0, b1, b2, _, a1, a2 in sos:
+        x1 = x2 = y1 = y2 = 0.0
+        result = numpy.empty_like(out)
+        for i, x in enumerate(out.tolist()):
+            y = b0 * x + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            x2, x1, y2, y1 = x1, x, y1, y
+            result[i] = y
+        out = result
+    return out
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    block_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    rng = numpy.random.default_rng(1)
+    audio = (rng.standard_normal((int(RATE * seconds), CHANNELS)) * 0.1).astype(numpy.float32)
+
+    print(f"{seconds:g} s of {RATE} Hz stereo, {block_frames}-frame blocks, {len(GAINS)} bands")
+    paths = [("scipy sosfilt", True)] if dsp.sosfilt is not None else []
+    paths.append(("FFT fallback", False))
+    for name, use_scipy in paths:
+        eq = make_eq(use_scipy)
+        _, elapsed = run(eq, audio, block_frames, use_scipy)
+        per_block = elapsed / (len(audio) / block_frames) * 1e6
+        print(f"{name:>14}: {elapsed / seconds * 100:5.2f}% of one core ({per_block:.0f} us per block)")
+    if dsp.sosfilt is None:
+        print("(scipy not installed; only the fallback was measured)")
+
+    # The fallback must sound like the real filters
+    eq = make_eq(False)
+    check = audio[:RATE // 4]
+    out, _ = run(eq, check, block_frames, False)
+    expected = reference(eq.sos, check[:, 0])
+    error = numpy.abs(out[:, 0] - expected).max()
+    print(f"FFT fallback vs. sample-by-sample biquads: max error {error:.2e}")
+
+if __name__ == "__main__":
+    main()
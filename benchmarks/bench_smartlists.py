@@ -0,0 +1,66 @@
+# bench_smartlists.py
+"""
+Time to index the library for smart playlists at 100k tracks: one
+update() per record against a single load(), then a batch of tag
+changes and play counts applied incrementally, and a range lookup.
+
+    python benchmarks/bench_smartlists.py [track count]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_tracks import synthetic_paths
+from metadata import TrackInfo
+from smartlists import LibraryIndex
+
+def synthetic_records(count):
+    rng = random.Random(1)
+    return [TrackInfo(path, title=f"Title {i}", artist=f"Artist {i // 48:05d}",
+                      genre=rng.choice(("Rock", "Jazz", "Ambient", "Folk", "Techno")),
+                      duration_ms=rng.randint(60_000, 600_000),
+                      added=1_600_000_000 + rng.random() * 1e8)
+            for i, path in enumerate(synthetic_paths(count))]
+
+def timed(action):
+    began = time.perf_counter()
+    result = action()
+    return time.perf_counter() - began, result
+
+def main(argv):
+    count = int(argv[0]) if argv else 100_000
+    records = synthetic_records(count)
+
+    def one_by_one():
+        index = LibraryIndex()
+        for record in records:
+            index.update(record)
+        return index
+
+    def bulk():
+        index = LibraryIndex()
+        index.load(records)
+        return index
+
+    slow, old = timed(one_by_one)
+    fast, index = timed(bulk)
+    assert index.durations.range(120_000, 240_000) == old.durations.range(120_000, 240_000)
+    print(f"{count} tracks")
+    print(f"  index:      update() each {slow:6.2f} s   load() {fast:6.2f} s")
+
+    rng = random.Random(2)
+    changed = rng.sample(records, min(count, 5000))
+    took, _ = timed(lambda: [index.update(TrackInfo(r.path, artist=r.artist, genre=r.genre,
+                                                    duration_ms=rng.randint(60_000, 600_000),
+                                                    added=r.added))
+                             for r in changed])
+    print(f"  {len(changed)} tag changes {took * 1000:6.1f} ms")
+    took, _ = timed(lambda: [index.set_plays(r.path, rng.randint(1, 50)) for r in changed])
+    print(f"  {len(changed)} plays       {took * 1000:6.1f} ms")
+    took, found = timed(lambda: index.durations.range(180_000, 300_000))
+    print(f"  3-5 min range {took * 1000:6.1f} ms for {len(found)} tracks")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,172 @@
+# bench_stream_cache.py
+"""
+The stream proxy against a local stand-in for a podcast host: a
+throttled HTTP server with Range support that can also drop connections
+every so often, and an endless "radio" URL without a length. Measures
+the time to the first byte with and without a prebuffer, checks that a
+replay comes entirely from the disk cache, also with the server offline,
+that a seek only downloads from the seek on, and that downloads survive
+dropped connections with every byte intact.
+
+    python benchmarks/bench_stream_cache.py [episode MB] [server KB/s]
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stream_cache
+
+class StandIn(BaseHTTPRequestHandler):
+    """/episode.mp3 with Range support, /flaky.mp3 that drops connections, /radio.mp3 without end"""
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/radio.mp3":
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.end_headers()
+            sent = 0
+            try:
+                while sent < server.drop_every:     # then the station "drops"
+                    self.wfile.write(server.body[:16 * 1024])
+                    sent += 16 * 1024
+            except OSError:
+                pass
+            return
+        if self.path not in ("/episode.mp3", "/flaky.mp3"):
+            self.send_error(404)
+            return
+        body, first, last = server.body, 0, len(server.body) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match:
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else last
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("ETag", '"episode-1"')
+        self.end_headers()
+        limit = server.drop_every if self.path == "/flaky.mp3" else None
+        pos, sent = first, 0
+        try:
+            while pos <= last and (limit is None or sent < limit):
+                chunk = body[pos:min(last + 1, pos + 16 * 1024)]
+                self.wfile.write(chunk)
+                pos += len(chunk)
+                sent += len(chunk)
+                server.sent += len(chunk)
+                time.sleep(len(chunk) / server.rate)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fetch(url, start=None, limit=None):
+    """(bytes, seconds to first byte, seconds in total) of one GET"""
+    headers = {"Range": f"bytes={start}-"} if start is not None else {}
+    began = time.perf_counter()
+    first = None
+    data = bytearray()
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60) as response:
+        while limit is None or len(data) < limit:
+            chunk = response.read(16 * 1024)
+            if not chunk:
+                break
+            if first is None:
+                first = time.perf_counter() - began
+            data += chunk
+    return bytes(data), first or 0.0, time.perf_counter() - began
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    rate_kb = float(sys.argv[2]) if len(sys.argv) > 2 else 4096.0
+    body = os.urandom(int(size_mb * 1024 * 1024))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    server.body, server.rate, server.sent = body, rate_kb * 1024, 0
+    server.drop_every = len(body) // 5
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{size_mb:g} MB episode from a stand-in serving {rate_kb:g} KB/s")
+
+    cache_dir = tempfile.mkdtemp(prefix="gifly-streams-")
+    try:
+        for prebuffer_kb in (0, 256):
+            shutil.rmtree(cache_dir)
+            proxy = stream_cache.StreamProxy(prebuffer_kb, 64, cache_dir)
+            url = proxy.url_for(origin + "/episode.mp3")
+
+            server.sent = 0
+            data, first, total = fetch(url)
+            assert data == body, "first play differs from the original"
+            print(f"prebuffer {prebuffer_kb:>3} KB: first byte after {first * 1000:6.1f} ms, "
+                  f"whole episode {total:5.2f} s, {server.sent / 1024:.0f} KB from the server")
+
+            server.sent = 0
+            data, first, total = fetch(url)
+            assert data == body, "replay differs from the original"
+            print(f"{'replay':>17}: first byte after {first * 1000:6.1f} ms, "
+                  f"whole episode {total:5.2f} s, {server.sent / 1024:.0f} KB from the server")
+            proxy.stop()
+
+        # A seek into an uncached episode fetches only from there on
+        shutil.rmtree(cache_dir)
+        proxy = stream_cache.StreamProxy(256, 64, cache_dir)
+        url = proxy.url_for(origin + "/episode.mp3")
+        seek = len(body) * 3 // 4
+        server.sent = 0
+        data, _, _ = fetch(url, start=seek)
+        assert data == body[seek:], "seek returned the wrong bytes"
+        print(f"seek to 75%: {server.sent / 1024:.0f} KB from the server "
+              f"for {len(data) / 1024:.0f} KB played")
+        server.sent = 0
+        data, _, _ = fetch(url)
+        assert data == body
+        print(f"then from the start: {server.sent / 1024:.0f} KB more, the rest came from disk")
+        proxy.stop()
+
+        # The flaky URL drops every connection after a fifth of the episode
+        url = proxy.url_for(origin + "/flaky.mp3")
+        data, _, total = fetch(url)
+        assert data == body, "bytes lost or garbled over reconnects"
+        print(f"connection dropped every {server.drop_every / 1024:.0f} KB: "
+              f"all {len(data) / 1024:.0f} KB intact after {total:.2f} s")
+
+        # Radio has no length; it is relayed and reconnected but not cached
+        url = proxy.url_for(origin + "/radio.mp3")
+        data, first, total = fetch(url, limit=server.drop_every * 2)
+        print(f"radio: {len(data) / 1024:.0f} KB across a dropped connection in {total:.2f} s, "
+              f"first byte after {first * 1000:.1f} ms")
+        proxy.stop()
+
+        # With the server gone, a new session still plays what is cached
+        server.shutdown()
+        server.server_close()
+        proxy = stream_cache.StreamProxy(256, 64, cache_dir)
+        data, first, _ = fetch(proxy.url_for(origin + "/episode.mp3"))
+        assert data == body, "cached episode did not play offline"
+        print(f"server offline: cached episode plays from disk, first byte after {first * 1000:.1f} ms")
+        proxy.stop()
+
+        cached = sum(os.path.getsize(os.path.join(cache_dir, n)) for n in os.listdir(cache_dir))
+        stream_cache.prune(cache_dir, 0)
+        print(f"cache held {cached / 1024:.0f} KB; prune to 0 leaves {len(os.listdir(cache_dir))} files")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
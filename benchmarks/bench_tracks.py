@@ -0,0 +1,93 @@
+# bench_tracks.py
+"""
+Memory footprint of the library at 100k tracks: the old representation
+(a list of full path strings plus a set for membership) against
+TrackTable + an array of track ids + a membership bytearray.
+
+The playlist is not all the app keeps per track, so the whole library
+state is measured too: the above plus the tag records loaded from the
+metadata cache, the smart playlist indexes built over them (keyed by
+path) and the songs view's title sort keys.
+
+    python benchmarks/bench_tracks.py [track count]
+"""
+import json
+import os
+import sys
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from library_model import natural_key
+from metadata import TrackInfo
+from smartlists import LibraryIndex
+from tracks import TrackTable, dump_tracks
+
+def synthetic_paths(count, per_album=12):
+    """Paths shaped like a real library: root/artist/album/NN - title.ext"""
+    root = "/home/user/Music/Library"
+    for i in range(count):
+        album = i // per_album
+        artist = album // 4
+        yield (f"{root}/Artist {artist:05d}/Album {album:06d} (Deluxe Edition)/"
+               f"{i % per_album + 1:02d} - Some Track Title Number {i:06d}.flac")
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, kept
+
+def build_old(count):
+    playlist = list(synthetic_paths(count))
+    known = set(playlist)
+    return playlist, known
+
+def build_new(count):
+    table = TrackTable()
+    order = array("I")
+    member = bytearray()
+    for path in synthetic_paths(count):
+        track_id = table.intern(path)
+        if track_id >= len(member):
+            member.extend(bytes(track_id + 1 - len(member)))
+        member[track_id] = 1
+        order.append(track_id)
+    return table, order, member
+
+def build_state(playlist_state, count):
+    """The playlist plus everything indexed per track on top of it"""
+    index = LibraryIndex()
+    # Records come from sqlite rows, so each holds its own path string
+    index.load(TrackInfo("".join(path), title=f"Some Track Title Number {i:06d}",
+                         artist=f"Artist {i // 48:05d}", album=f"Album {i // 12:06d}",
+                         genre="Rock", duration_ms=240_000 + i % 1000, added=1.6e9 + i)
+               for i, path in enumerate(synthetic_paths(count)))
+    sort_keys = {i: natural_key(record.title) for i, record in enumerate(index.records.values())}
+    return playlist_state, index, sort_keys
+
+def main(argv):
+    count = int(argv[0]) if argv else 100_000
+
+    old_bytes, (playlist, _) = measure(lambda: build_old(count))
+    new_bytes, (table, order, _) = measure(lambda: build_new(count))
+    assert list(map(table.path, order)) == playlist
+
+    old_json = len(json.dumps({"playlist": playlist}, indent=4, ensure_ascii=False))
+    new_json = len(json.dumps(dump_tracks(table, order), ensure_ascii=False))
+
+    old_state, _ = measure(lambda: build_state(build_old(count), count))
+    new_state, _ = measure(lambda: build_state(build_new(count), count))
+
+    print(f"{count} tracks in {len(table.dirs)} directories")
+    print(f"  in memory:  paths + set {old_bytes / 2**20:8.1f} MiB   "
+          f"track table {new_bytes / 2**20:8.1f} MiB   ({new_bytes / old_bytes:.0%})")
+    print(f"  with index: paths + set {old_state / 2**20:8.1f} MiB   "
+          f"track table {new_state / 2**20:8.1f} MiB   ({new_state / old_state:.0%})")
+    print(f"  on disk:    settings    {old_json / 2**20:8.1f} MiB   "
+          f"tracks.json {new_json / 2**20:8.1f} MiB   ({new_json / old_json:.0%})")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
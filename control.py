@@ -0,0 +1,99 @@
+# control.py
+import json
+from PyQt5.QtCore import QObject
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+import utils
+
+MAX_LINE = 64 * 1024        # longest request line accepted, in bytes
+
+class ControlServer(QObject):
+    """
+    Local control socket for a running Gifly (see giflyctl.py).
+
+    Wire protocol, one request per line (UTF-8, newline terminated):
+        <command>[ <argument>]
+    and one reply line per request:
+        OK[ <payload>]    or    ERR <message>
+    Payloads that are not plain strings are sent as compact JSON.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.handlers = {}
+        self._buffers = {}
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+
+    def register(self, command, handler):
+        """Register handler(arg) for a command. It may return a payload or
+        raise ValueError to send an error reply."""
+        self.handlers[command.lower()] = handler
+
+    def start(self):
+        name = utils.get_control_address()
+        # Qt may bind over an existing socket file, so check first that
+        # nobody answers there; a live instance is never taken over
+        probe = QLocalSocket()
+        probe.connectToServer(name)
+        if probe.waitForConnected(500):
+            probe.disconnectFromServer()
+            print("Warning: Could not start control server: another instance is running")
+            return False
+        if self.server.listen(name):
+            return True
+        # Left over from an instance that did not shut down cleanly
+        QLocalServer.removeServer(name)
+        if self.server.listen(name):
+            return True
+        print(f"Warning: Could not start control server: {self.server.errorString()}")
+        return False
+
+    def stop(self):
+        self.server.close()
+
+    # ---------- Connections ----------
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            self._buffers[sock] = b""
+            sock.readyRead.connect(lambda s=sock: self._on_ready_read(s))
+            sock.disconnected.connect(lambda s=sock: self._on_disconnected(s))
+
+    def _on_disconnected(self, sock):
+        self._buffers.pop(sock, None)
+        sock.deleteLater()
+
+    def _on_ready_read(self, sock):
+        data = self._buffers.get(sock, b"") + bytes(sock.readAll())
+        *lines, rest = data.split(b"\n")
+        if len(rest) > MAX_LINE:
+            sock.write(b"ERR request too long\n")
+            sock.disconnectFromServer()
+            return
+        self._buffers[sock] = rest
+        for line in lines:
+            reply = self.dispatch(line.decode("utf-8", "replace").rstrip("\r"))
+            sock.write(reply.encode("utf-8") + b"\n")
+        sock.flush()
+
+    def dispatch(self, line):
+        """Run one request line and return the reply line"""
+        command, _, arg = line.strip().partition(" ")
+        if not command:
+            return "ERR empty request"
+        handler = self.handlers.get(command.lower())
+        if handler is None:
+            return f"ERR unknown command: {command}"
+        try:
+            result = handler(arg.strip())
+        except ValueError as e:
+            return f"ERR {e}"
+        except Exception as e:
+            print(f"Warning: Control command '{command}' failed: {e}")
+            return f"ERR {command} failed"
+        if result is None:
+            return "OK"
+        if not isinstance(result, str):
+            result = json.dumps(result, separators=(",", ":"), ensure_ascii=False)
+        return f"OK {result}"
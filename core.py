@@ -0,0 +1,600 @@
+# core.py
+import os
+from PyQt5.QtCore import QObject, QTimer, QCoreApplication, pyqtSignal
+from PyQt5.QtMultimedia import QMediaPlayer
+from player import MusicPlayer
+from watcher import LibraryWatcher
+from control import ControlServer
+from history import HistoryStore, PlayTracker
+from metadata import MetadataStore, MetadataScanner, placeholder_info
+from smartlists import LibraryIndex, SmartPlaylists
+from tracks import load_tracks_file, save_tracks_file
+from playlist_io import PlaylistImport, write_playlist
+from gif_rules import GifAssigner
+from artwork import AlbumArt
+from stream_cache import StreamProxy
+import cue
+import utils
+
+class GiflyCore(QObject):
+    """
+    Everything Gifly needs to play music, without any widgets: the player
+    and its queue, the song/GIF library, settings persistence, folder
+    watching and the control socket. The main window is a view on top of
+    this and can be attached or closed while the core keeps running.
+    """
+    library_changed = pyqtSignal()          # playlist contents changed
+    tracks_changed = pyqtSignal(list)       # metadata or play counts of these paths changed
+    playlists_changed = pyqtSignal()        # saved or smart playlists changed
+    gifs_changed = pyqtSignal()             # GIF collection changed
+    assignments_changed = pyqtSignal()      # which GIFs go with which songs changed
+    volume_changed = pyqtSignal(int)        # volume set from outside the UI
+    message = pyqtSignal(str, int)          # status text, timeout in ms (0 = sticky)
+    saving = pyqtSignal(object)             # emits the settings dict right before a save
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # Load settings first
+        self.settings = utils.load_settings()
+
+        # Player
+        self.streams = StreamProxy(self.settings["stream_prebuffer_kb"], self.settings["stream_cache_mb"])
+        self.music_player = MusicPlayer(self.settings["audio_engine"], self.streams)
+        self.music_player.song_changed.connect(self._on_song_changed)
+        self.music_player.finished.connect(self._on_song_finished)
+        self.volume = self.settings.get("volume", 70)
+        if self.settings["eq_enabled"]:
+            self.music_player.set_equalizer(self.settings["eq_gains"])
+
+        # Play history and statistics
+        self.history = HistoryStore()
+        self.play_tracker = PlayTracker(self.music_player, self.history, self)
+
+        # Data
+        self.song_gifs = self.settings.get("song_gifs", {})
+        self.gif_list = list(dict.fromkeys(self.settings.get("gifs", [])))
+        self._gif_index = set(self.gif_list)
+
+        # Watched library folders
+        self.library_watcher = LibraryWatcher()
+        self.library_watcher.changes.connect(self.on_library_changed)
+
+        # Local control socket (see giflyctl.py)
+        self.attach_handler = None          # called for "show"; set by whoever owns a window
+        self.control_server = ControlServer(self)
+        self.register_control_commands()
+
+        # Track metadata, indexes over it, and smart playlists built on them
+        self.metadata = MetadataStore()
+        self.metadata_scanner = MetadataScanner(self.metadata, self)
+        self.metadata_scanner.updated.connect(self._on_metadata_updated)
+        self.library_index = LibraryIndex()
+        self.art = AlbumArt(parent=self)
+        self.smart_playlists = SmartPlaylists(self.library_index, self)
+
+        # GIF assignment rules, resolved for the whole library ahead of time
+        self.gif_rules = GifAssigner(self.music_player, self.library_index, self)
+
+        # Saves requested while handling one event are written once
+        self.pending_save = QTimer(self)
+        self.pending_save.setSingleShot(True)
+        self.pending_save.setInterval(0)
+        self.pending_save.timeout.connect(self.save_state)
+
+        self._saved_generation = -1         # playlist generation last written to disk
+        self._import = None                 # running PlaylistImport, if any
+        self.restore_state()
+        self.load_library_metadata()
+        self.gif_rules.set_rules(self.settings.get("gif_rules", []))
+
+        # From here on the indexes follow every playlist change
+        self.music_player.tracks_added.connect(self._on_tracks_added)
+        self.music_player.tracks_removed.connect(self._on_tracks_removed)
+        self.play_tracker.played.connect(self._on_track_played)
+
+        # Auto-save timer
+        self.save_timer = QTimer(self)
+        self.save_timer.timeout.connect(self.save_state)
+        self.save_timer.start(10000)  # Save every 10 seconds
+
+    def start_control_server(self):
+        return self.control_server.start()
+
+    def shutdown(self):
+        """Save everything and stop listening for remote commands"""
+        if self._import is not None:
+            self._import.cancel()
+        self.save_state()
+        self.save_timer.stop()
+        self.gif_rules.stop()
+        self.control_server.stop()
+        self.metadata_scanner.stop()
+        self.metadata.close()
+        self.art.close()
+        self.history.close()
+        self.streams.stop()
+
+    # ============ Library ============
+    def add_songs(self, files):
+        """Add songs to the library. Returns the ones that were new."""
+        added = self.music_player.load_songs(files)
+        if added:
+            self.library_changed.emit()
+        self.save_state()
+        self.message.emit(f"Added {len(added)} song(s)", 3000)
+        return added
+
+    def add_folder(self, folder):
+        """Add a folder to the library and watch it for changes"""
+        found = self.library_watcher.add_root(folder)
+        self.settings["library_roots"] = self.library_watcher.roots[:]
+        new_files = self.music_player.load_songs(sorted(found))
+        if new_files:
+            self.library_changed.emit()
+        self.save_state()
+        self.message.emit(f"Added {len(new_files)} song(s) from folder", 3000)
+        return new_files
+
+    def on_library_changed(self, added, removed):
+        """Apply a batch of file changes from watched folders"""
+        if removed:
+            removed = self.music_player.remove_paths(removed)
+            for song_path in removed:
+                self.song_gifs.pop(song_path, None)
+        if added:
+            added = self.music_player.load_songs(sorted(added))
+        if added or removed:
+            self.library_changed.emit()
+            self.save_state()
+            self.message.emit(f"Library updated: {len(added)} added, {len(removed)} removed", 3000)
+
+    def remove_song(self, index):
+        """Remove one song by playlist index"""
+        song_path = self.music_player.remove_song(index)
+        if song_path is None:
+            return None
+        self.song_gifs.pop(song_path, None)
+        self.library_changed.emit()
+        self.save_state()
+        self.message.emit("Song removed", 2000)
+        return song_path
+
+    def remove_songs(self, paths):
+        """Remove songs by path in one pass"""
+        removed = self.music_player.remove_paths(paths)
+        for song_path in removed:
+            self.song_gifs.pop(song_path, None)
+        if removed:
+            self.library_changed.emit()
+            self.save_state()
+        return removed
+
+    def remove_indexes(self, indexes):
+        """Remove the songs at the given playlist positions in one pass"""
+        removed = self.music_player.remove_indexes(indexes)
+        for song_path in removed:
+            self.song_gifs.pop(song_path, None)
+        if removed:
+            self.library_changed.emit()
+            self.schedule_save()
+            self.message.emit(f"Removed {len(removed)} song(s)", 2000)
+        return removed
+
+    def move_songs(self, indexes, destination):
+        """Move songs to a new position; returns where the first one landed"""
+        first = self.music_player.move_indexes(indexes, destination)
+        if first != -1:
+            self.library_changed.emit()
+            self.schedule_save()
+        return first
+
+    def enqueue_indexes(self, indexes):
+        """Queue library songs to play next"""
+        count = self.music_player.enqueue_indexes(indexes)
+        if count:
+            self.message.emit(f"Queued {count} song(s)", 3000)
+        return count
+
+    def clear_songs(self):
+        self.library_watcher.clear()
+        self.settings["library_roots"] = []
+        self.music_player.clear_playlist()
+        self.song_gifs.clear()
+        self.library_changed.emit()
+        self.save_state()
+
+    def enqueue_files(self, files):
+        """Queue files to play next, adding new ones to the library"""
+        if self.music_player.enqueue(files):
+            self.library_changed.emit()
+        self.save_state()
+        self.message.emit(f"Queued {len(files)} song(s)", 3000)
+
+    # ============ Metadata & Smart Playlists ============
+    def load_library_metadata(self):
+        """Index cached tags for the library and rescan files that changed"""
+        playlist = self.music_player.playlist
+        records = self.metadata.load(playlist)
+        self.library_index.plays = self.history.play_counts()
+        missing = [placeholder_info(p) for p in playlist if p not in records]
+        self.library_index.load(list(records.values()) + missing)
+        self.smart_playlists.set_definitions(self.settings.get("smart_playlists", {}))
+        # Cached records are only re-read if their file changed
+        self.metadata_scanner.request(list(records.values()) + missing)
+        self.art.request(list(playlist))
+
+    def _on_tracks_added(self, paths):
+        records = [placeholder_info(p) for p in paths]
+        for record in records:
+            self.library_index.update(record)
+            self.smart_playlists.track_updated(record.path)
+        self.metadata_scanner.request(records)
+        self.art.request(paths)
+        self.gif_rules.resume()
+
+    def _on_tracks_removed(self, paths):
+        for path in paths:
+            self.library_index.remove(path)
+            self.smart_playlists.track_removed(path)
+        self.metadata.remove_many(paths)
+        self.art.forget(paths)
+        self.gif_rules.invalidate(paths)
+
+    def _on_metadata_updated(self, records):
+        changed = []
+        for record in records:
+            if self.music_player.contains(record.path):
+                self.library_index.update(record)
+                self.smart_playlists.track_updated(record.path)
+                changed.append(record.path)
+        if changed:
+            self.gif_rules.invalidate(changed)
+            self.tracks_changed.emit(changed)
+
+    def _on_track_played(self, path):
+        self.library_index.set_plays(path, self.library_index.plays.get(path, 0) + 1)
+        self.smart_playlists.track_updated(path)
+        self.tracks_changed.emit([path])
+
+    def save_smart_playlist(self, name, rules, match="all"):
+        self.smart_playlists.define(name, rules, match)
+        self.settings["smart_playlists"] = self.smart_playlists.definitions
+        self.playlists_changed.emit()
+        self.save_state()
+
+    def delete_playlist(self, kind, name):
+        if kind == "smart":
+            self.smart_playlists.remove(name)
+            self.settings["smart_playlists"] = self.smart_playlists.definitions
+        else:
+            self.settings["playlists"].pop(name, None)
+        self.playlists_changed.emit()
+        self.save_state()
+
+    def playlist_tracks(self, kind, name):
+        if kind == "smart":
+            return self.smart_playlists.tracks(name)
+        return [p for p in self.settings["playlists"].get(name, [])
+                if utils.is_stream_url(p) or os.path.isfile(cue.source_file(p))]
+
+    def play_playlist(self, kind, name):
+        """Queue a playlist and start playing it"""
+        tracks = self.playlist_tracks(kind, name)
+        if not tracks:
+            self.message.emit(f"Playlist '{name}' is empty", 3000)
+            return
+        self.music_player.queue = []
+        self.enqueue_files(tracks)
+        if self.music_player.current_path() != tracks[0]:
+            self.play_next()
+        else:
+            self.music_player.play()
+
+    def import_playlist(self, path):
+        """Add the songs of an M3U/M3U8/PLS file to the library in batches"""
+        if self._import is not None:
+            self._import.cancel()
+            self._import.deleteLater()
+        self._import = PlaylistImport(path, self.music_player, self)
+        self._import.progress.connect(self._on_import_progress)
+        self._import.done.connect(self._on_import_done)
+        self._import.start()
+
+    def _on_import_progress(self, added):
+        # The library view is refreshed once, when the import is done
+        self.message.emit(f"Importing playlist... {added} song(s) added", 0)
+
+    def _on_import_done(self, added, skipped):
+        self._import.deleteLater()
+        self._import = None
+        self.library_changed.emit()
+        self.schedule_save()
+        note = f", {skipped} missing or unsupported" if skipped else ""
+        self.message.emit(f"Imported {added} song(s){note}", 5000)
+
+    def export_playlist(self, path, kind=None, name=None):
+        """Write a playlist, or the whole library, to an M3U/M3U8/PLS file"""
+        tracks = self.playlist_tracks(kind, name) if kind else self.music_player.playlist
+        records = self.library_index.records
+
+        def info(track):
+            record = records.get(track)
+            if record is None:
+                return None
+            title = f"{record.artist} - {record.title}" if record.artist else record.title
+            return (record.duration_ms // 1000 if record.duration_ms else -1, title)
+
+        try:
+            count = write_playlist(path, tracks, info)
+        except OSError as e:
+            print(f"Warning: Could not export playlist: {e}")
+            self.message.emit(f"Could not export playlist: {e}", 5000)
+            return 0
+        self.message.emit(f"Exported {count} song(s) to {os.path.basename(path)}", 3000)
+        return count
+
+    # ============ GIFs ============
+    def add_gifs(self, files):
+        added = 0
+        for gif in files:
+            if gif not in self._gif_index:
+                self._gif_index.add(gif)
+                self.gif_list.append(gif)
+                added += 1
+        self.gifs_changed.emit()
+        self.save_state()
+        self.message.emit(f"Added {added} GIF(s)", 3000)
+
+    def remove_gif(self, index):
+        if 0 <= index < len(self.gif_list):
+            self._gif_index.discard(self.gif_list.pop(index))
+            self.gifs_changed.emit()
+            self.save_state()
+
+    def remove_gifs(self, paths):
+        doomed = set(paths)
+        self.gif_list[:] = [g for g in self.gif_list if g not in doomed]
+        self._gif_index -= doomed
+        self.gifs_changed.emit()
+        self.save_state()
+
+    def clear_gifs(self):
+        self.gif_list.clear()
+        self._gif_index.clear()
+        self.gifs_changed.emit()
+        self.save_state()
+
+    def gifs_for_song(self, song_path):
+        """GIFs assigned to a song, else those its rules give it,
+        or an empty list for the defaults"""
+        if song_path and self.song_gifs.get(song_path):
+            return self.song_gifs[song_path]
+        return self.gif_rules.gifs_for(song_path)
+
+    def assign_gifs(self, song_paths, gifs):
+        """Give songs their own GIFs; an empty list goes back to the rules"""
+        for song_path in song_paths:
+            if gifs:
+                self.song_gifs[song_path] = list(gifs)
+            else:
+                self.song_gifs.pop(song_path, None)
+        self.assignments_changed.emit()
+        self.save_state()
+
+    def set_gif_rules(self, rules):
+        self.gif_rules.set_rules(rules)
+        self.settings["gif_rules"] = self.gif_rules.rules
+        self.assignments_changed.emit()
+        self.save_state()
+
+    # ============ Playback ============
+    def play_index(self, index):
+        if 0 <= index < len(self.music_player.playlist):
+            self.music_player.current_index = index
+            self.music_player.load_current()
+            self.music_player.play()
+            self.save_state()
+
+    def toggle(self):
+        self.music_player.toggle()
+        self.save_state()
+
+    def play_next(self):
+        if self.music_player.playlist:
+            self.music_player.next_song()
+            self.save_state()
+
+    def play_prev(self):
+        if self.music_player.playlist:
+            self.music_player.prev_song()
+            self.save_state()
+
+    def set_volume(self, value):
+        self.volume = max(0, min(100, int(value)))
+        self.music_player.set_volume(self.volume)
+        self.settings["volume"] = self.volume
+        self.save_state()
+
+    def set_shuffle(self, enabled):
+        self.music_player.set_shuffle(enabled)
+        self.settings["shuffle"] = self.music_player.shuffle
+        self.save_state()
+
+    def set_repeat_mode(self, mode):
+        self.music_player.set_repeat_mode(mode)
+        self.settings["repeat_mode"] = self.music_player.repeat_mode
+        self.save_state()
+
+    def set_equalizer(self, enabled, gains):
+        self.settings["eq_enabled"] = bool(enabled)
+        self.settings["eq_gains"] = list(gains)
+        self.music_player.set_equalizer(gains if enabled else None)
+        self.schedule_save()
+
+    def save_eq_preset(self, name, gains):
+        self.settings["eq_presets"][name] = list(gains)
+        self.schedule_save()
+
+    def delete_eq_preset(self, name):
+        if self.settings["eq_presets"].pop(name, None) is not None:
+            self.schedule_save()
+
+    def playback_status(self):
+        state = self.music_player.get_state()
+        if state == QMediaPlayer.PlayingState:
+            state_name = "playing"
+        elif state == QMediaPlayer.PausedState:
+            state_name = "paused"
+        else:
+            state_name = "stopped"
+        return {
+            "state": state_name,
+            "index": self.music_player.current_index,
+            "path": self.music_player.current_path(),
+            "position": self.music_player.get_position(),
+            "duration": self.music_player.get_duration(),
+            "count": len(self.music_player.playlist),
+            "queue": len(self.music_player.queue),
+            "volume": self.volume,
+            "shuffle": self.music_player.shuffle,
+            "repeat": self.music_player.repeat_mode,
+        }
+
+    def _on_song_changed(self, file_path):
+        self.schedule_save()
+
+    def _on_song_finished(self):
+        self.schedule_save()
+
+    # ============ Remote Control ============
+    def register_control_commands(self):
+        """Expose playback commands on the control socket"""
+        server = self.control_server
+        server.register("ping", lambda arg: "pong")
+        server.register("play", lambda arg: self.music_player.play())
+        server.register("pause", lambda arg: self.music_player.pause())
+        server.register("toggle", lambda arg: self.toggle())
+        server.register("stop", lambda arg: self.music_player.stop())
+        server.register("next", lambda arg: self.play_next())
+        server.register("prev", lambda arg: self.play_prev())
+        server.register("enqueue", self.control_enqueue)
+        server.register("volume", self.control_volume)
+        server.register("status", lambda arg: self.playback_status())
+        server.register("top", self.control_top)
+        server.register("show", self.control_show)
+        server.register("quit", self.control_quit)
+
+    def control_enqueue(self, path):
+        if utils.is_stream_url(path):
+            self.enqueue_files([path])
+            return
+        if not path or not os.path.isfile(path):
+            raise ValueError(f"no such file: {path}")
+        if not utils.is_audio_file(path):
+            raise ValueError(f"not an audio file: {path}")
+        self.enqueue_files([path])
+
+    def control_volume(self, value):
+        try:
+            volume = int(value)
+        except ValueError:
+            raise ValueError("volume must be a number from 0 to 100")
+        self.set_volume(volume)
+        self.volume_changed.emit(self.volume)
+
+    def control_top(self, arg):
+        try:
+            limit = int(arg) if arg else 10
+        except ValueError:
+            raise ValueError("top takes the number of tracks to list")
+        return [[s["plays"], s["path"]] for s in self.history.most_played(limit)]
+
+    def control_show(self, arg):
+        if self.attach_handler is None:
+            raise ValueError("this instance is running without a window")
+        self.attach_handler()
+
+    def control_quit(self, arg):
+        self.save_state()
+        QTimer.singleShot(0, QCoreApplication.instance().quit)
+
+    # ============ State Management ============
+    def restore_state(self):
+        """Restore library and playback state"""
+        # Loading the playlist triggers a save, so read the saved position first
+        last_index = self.settings.get("last_index", -1)
+        last_position = self.settings.get("last_position", 0)
+
+        # Restore playlist (older versions kept it as full paths in settings)
+        playlist = load_tracks_file()
+        if playlist is None:
+            playlist = self.settings.get("playlist", [])
+        if playlist:
+            self.music_player.load_songs(playlist)
+        self.settings.pop("playlist", None)
+
+        # Watch library folders and pick up changes made while closed
+        self.restore_library_roots()
+
+        # Restore playback position
+        if last_index is not None and 0 <= last_index < len(self.music_player.playlist):
+            self.music_player.current_index = last_index
+            self.music_player.load_current()
+            QTimer.singleShot(300, lambda: self.music_player.set_position(last_position))
+
+        # Restore volume, shuffle and repeat
+        self.music_player.set_volume(self.volume)
+        self.music_player.set_shuffle(self.settings.get("shuffle", False))
+        self.music_player.set_repeat_mode(self.settings.get("repeat_mode", "none"))
+
+    def restore_library_roots(self):
+        """Start watching saved library folders and sync them with the playlist"""
+        roots = self.settings.get("library_roots", [])
+        if not roots:
+            return
+        found = []
+        for root in roots:
+            found.extend(self.library_watcher.add_root(root))
+        on_disk = set(found)
+
+        # Anything under a watched root that is no longer on disk is gone
+        watched = self.library_watcher.roots
+        missing = [p for p in self.music_player.playlist
+                   if cue.source_file(p) not in on_disk
+                   and self.library_watcher.covers(p)]
+        if missing:
+            self.music_player.remove_paths(missing)
+        self.music_player.load_songs(sorted(found))
+        self.settings["library_roots"] = watched[:]
+
+    def schedule_save(self):
+        """Save once control returns to the event loop"""
+        self.pending_save.start()
+
+    def save_state(self):
+        """Save current state to settings"""
+        self.pending_save.stop()
+        # The playlist has its own compact file, rewritten only when it changed
+        if self.music_player.generation != self._saved_generation:
+            save_tracks_file(self.music_player.tracks, self.music_player.order)
+            self._saved_generation = self.music_player.generation
+        self.settings["last_index"] = self.music_player.current_index
+
+        try:
+            self.settings["last_position"] = int(self.music_player.get_position())
+        except:
+            self.settings["last_position"] = 0
+
+        self.settings["volume"] = self.volume
+        self.settings["gifs"] = self.gif_list
+        self.settings["song_gifs"] = self.song_gifs
+        self.settings["shuffle"] = self.music_player.shuffle
+        self.settings["repeat_mode"] = self.music_player.repeat_mode
+        self.settings["library_roots"] = self.library_watcher.roots[:]
+
+        # Let an attached window add its geometry
+        self.saving.emit(self.settings)
+
+        utils.save_settings(self.settings)
+        self.history.flush()
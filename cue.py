@@ -0,0 +1,157 @@
+# cue.py
+"""
+CUE sheets: single-file album rips split into virtual tracks.
+
+A virtual track is named after its sheet and number ("Album.cue#3"), so
+it goes through the track table, playlists and the library like any
+other path. Where it actually plays from - the audio file and the span
+within it - comes from the sheet, parsed once per modification.
+"""
+import os
+import re
+from functools import lru_cache
+import utils
+
+FRAMES_PER_SECOND = 75                      # CUE time is mm:ss:ff with 75 frames a second
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_TIME = re.compile(r"^(\d+):(\d{1,2}):(\d{1,2})$")
+
+class CueTrack:
+    """One track of a sheet; end_ms 0 means it runs to the end of its file"""
+    __slots__ = ("number", "file", "title", "performer", "start_ms", "end_ms")
+
+    def __init__(self, number, file, title="", performer="", start_ms=0, end_ms=0):
+        self.number = number
+        self.file = file
+        self.title = title
+        self.performer = performer
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+
+class CueSheet:
+    def __init__(self, path, title="", performer="", genre="", tracks=None):
+        self.path = path
+        self.title = title
+        self.performer = performer
+        self.genre = genre
+        self.tracks = tracks or []
+
+    def track(self, number):
+        return next((t for t in self.tracks if t.number == number), None)
+
+
+def virtual_path(cue_path, number):
+    return f"{cue_path}#{number}"
+
+def split_virtual(path):
+    """(sheet path, track number) of a virtual track, or None for a plain file"""
+    head, sep, number = path.rpartition("#")
+    if sep and number.isdigit() and utils.is_cue_file(head):
+        return head, int(number)
+    return None
+
+def source_file(path):
+    """The file on disk a library entry comes from: the sheet of a virtual track, else itself"""
+    virtual = split_virtual(path)
+    return virtual[0] if virtual else path
+
+def track_for(path):
+    """The CueTrack behind a virtual track, or None"""
+    virtual = split_virtual(path)
+    if virtual is None:
+        return None
+    sheet = load_sheet(virtual[0])
+    return sheet.track(virtual[1]) if sheet else None
+
+def media_file(path):
+    """The audio file a library entry plays"""
+    track = track_for(path)
+    return track.file if track else path
+
+def load_sheet(path):
+    """Parse a sheet, reusing the result until the file changes; None if unreadable"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _load_sheet(path, mtime)
+
+@lru_cache(maxsize=64)
+def _load_sheet(path, _mtime):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        print(f"Warning: Could not read CUE sheet {path}: {e}")
+        return None
+    # Older rippers wrote the system code page, mostly Windows-1252
+    for encoding in ("utf-8-sig", "cp1252", "latin-1"):
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    sheet = parse_cue(text, path)
+    if not sheet.tracks:
+        print(f"Warning: No audio tracks in CUE sheet {path}")
+        return None
+    return sheet
+
+def _ms(value):
+    match = _TIME.match(value)
+    if not match:
+        return None
+    minutes, seconds, frames = map(int, match.groups())
+    return (minutes * 60 + seconds) * 1000 + frames * 1000 // FRAMES_PER_SECOND
+
+def _resolve_file(directory, name):
+    """The audio file a FILE line means; rips are often re-encoded
+    without fixing the sheet, so try the same name with other extensions"""
+    path = os.path.join(directory, name.replace("\\", os.sep))
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for ext in utils.AUDIO_EXTENSIONS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+    return path
+
+def parse_cue(text, path):
+    """Parse sheet text. Each track starts at its INDEX 01 and ends where the
+    next one in the same file starts, so pregaps stay with the track before."""
+    directory = os.path.dirname(path)
+    sheet = CueSheet(path)
+    current_file = None
+    track = None
+    for line in text.splitlines():
+        tokens = [bare or quoted for quoted, bare in _TOKEN.findall(line)]
+        if not tokens:
+            continue
+        command, args = tokens[0].upper(), tokens[1:]
+        if command == "FILE" and args:
+            current_file = _resolve_file(directory, args[0])
+            track = None
+        elif command == "TRACK" and len(args) >= 2 and current_file:
+            # Data tracks still get an entry, so their TITLE is not taken for the album's
+            number = int(args[0]) if args[0].isdigit() else 0
+            track = CueTrack(number, current_file, start_ms=-1)
+            if number and args[1].upper() == "AUDIO":
+                sheet.tracks.append(track)
+        elif command == "INDEX" and len(args) >= 2 and track is not None:
+            start = _ms(args[1])
+            if start is not None and args[0].isdigit() and int(args[0]) == 1:
+                track.start_ms = start
+        elif command in ("TITLE", "PERFORMER") and args:
+            target = track if track is not None else sheet
+            setattr(target, command.lower(), args[0])
+        elif command == "REM" and len(args) >= 2 and args[0].upper() == "GENRE" and track is None:
+            sheet.genre = args[1]
+
+    sheet.tracks = [t for t in sheet.tracks if t.start_ms >= 0]
+    for track, following in zip(sheet.tracks, sheet.tracks[1:]):
+        if following.file == track.file and following.start_ms > track.start_ms:
+            track.end_ms = following.start_ms
+    for track in sheet.tracks:
+        track.performer = track.performer or sheet.performer
+    return sheet
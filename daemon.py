@@ -0,0 +1,75 @@
+# daemon.py
+"""
+Run Gifly as a background service, without a window.
+
+    python daemon.py                    # audio only, no display needed
+    python daemon.py --gui-on-demand    # open the window when asked to
+
+Control it with giflyctl.py. With --gui-on-demand, `python main.py` or
+`python giflyctl.py show` opens the main window on top of the running
+service; closing the window frees it again while playback continues.
+"""
+import signal
+import sys
+from PyQt5.QtCore import Qt, QTimer, QCoreApplication
+from core import GiflyCore
+import giflyctl
+import utils
+
+class WindowHost:
+    """Creates the main window on request and drops it when it is closed"""
+
+    def __init__(self, core):
+        self.core = core
+        self.window = None
+        self.core.attach_handler = self.show
+
+    def show(self):
+        if self.window is not None:
+            self.window.bring_to_front()
+            return
+        from main import GiflyPlayer     # widgets are only loaded when needed
+        self.window = GiflyPlayer(core=self.core)
+        self.window.setAttribute(Qt.WA_DeleteOnClose)
+        self.window.destroyed.connect(self._on_window_destroyed)
+        self.window.show()
+
+    def _on_window_destroyed(self):
+        self.window = None
+        self.core.attach_handler = self.show
+
+def main(argv):
+    if giflyctl.send_commands(["ping"]) is not None:
+        print("Gifly is already running", file=sys.stderr)
+        return 1
+
+    gui_on_demand = "--gui-on-demand" in argv
+    if gui_on_demand:
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication(sys.argv)
+        app.setQuitOnLastWindowClosed(False)
+    else:
+        app = QCoreApplication(sys.argv)
+    app.setApplicationName("Gifly")
+    app.setOrganizationName("Gifly")
+
+    core = GiflyCore()
+    host = WindowHost(core) if gui_on_demand else None
+    if not core.start_control_server():
+        return 1
+    app.aboutToQuit.connect(core.shutdown)
+
+    # Let Python see Ctrl+C / SIGTERM while Qt's event loop is running
+    signal.signal(signal.SIGINT, lambda *args: app.quit())
+    signal.signal(signal.SIGTERM, lambda *args: app.quit())
+    wakeup = QTimer()
+    wakeup.timeout.connect(lambda: None)
+    wakeup.start(500)
+
+    print(f"Gifly running headless; control socket: {utils.get_control_address()}")
+    status = app.exec_()
+    del host
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
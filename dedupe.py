@@ -0,0 +1,127 @@
+# dedupe.py
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QThread, pyqtSignal
+
+CHUNK_SIZE = 64 * 1024      # bytes hashed from each end in the quick pass
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return st.st_size, (st.st_dev, st.st_ino)
+    except OSError:
+        return None
+
+def _partial_hash(path, size):
+    """Hash the first and last CHUNK_SIZE bytes (the whole file if small)"""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            h.update(f.read(CHUNK_SIZE))
+            if size > 2 * CHUNK_SIZE:
+                f.seek(-CHUNK_SIZE, os.SEEK_END)
+                h.update(f.read(CHUNK_SIZE))
+            elif size > CHUNK_SIZE:
+                h.update(f.read())
+    except OSError:
+        return None
+    return h.digest()
+
+def _full_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    except OSError:
+        return None
+    return h.digest()
+
+def _regroup(groups, key_func, pool):
+    """Split each group by key_func(path), keeping only keys shared by 2+ paths"""
+    paths = [p for group in groups for p in group]
+    keys = pool.map(key_func, paths)
+    result = defaultdict(list)
+    for group_id, group in enumerate(groups):
+        for path in group:
+            key = next(keys)
+            if key is not None:
+                result[(group_id, key)].append(path)
+    return [g for g in result.values() if len(g) > 1]
+
+def find_duplicates(paths, workers=4):
+    """
+    Return groups of paths whose files have identical content.
+
+    Files are grouped by size first; only same-size files get their head
+    and tail hashed, and only files that still collide are hashed in full.
+    Each group keeps the input order, so group[0] is the copy to keep.
+    """
+    ordered = list(dict.fromkeys(paths))
+    if len(ordered) < 2:
+        return []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Pass 1: size (and inode, so hard links are caught without reading)
+        by_size = defaultdict(list)
+        for path, info in zip(ordered, pool.map(_stat, ordered)):
+            if info is not None:
+                by_size[info[0]].append((path, info[1]))
+
+        groups = []
+        candidates = []
+        for size, entries in by_size.items():
+            if len(entries) < 2:
+                continue
+            by_inode = defaultdict(list)
+            for path, inode in entries:
+                by_inode[inode].append(path)
+            # Same file reached through different paths
+            groups.extend(g for g in by_inode.values() if len(g) > 1)
+            distinct = [g[0] for g in by_inode.values()]
+            if len(distinct) > 1:
+                candidates.append((size, distinct))
+
+        # Pass 2: head/tail hash within each size group
+        sizes = {p: size for size, group in candidates for p in group}
+        partial = _regroup([g for _, g in candidates],
+                           lambda p: _partial_hash(p, sizes[p]), pool)
+
+        # Pass 3: full hash, only where head/tail did not cover the whole file
+        small = [g for g in partial if sizes[g[0]] <= 2 * CHUNK_SIZE]
+        large = [g for g in partial if sizes[g[0]] > 2 * CHUNK_SIZE]
+        groups.extend(small)
+        groups.extend(_regroup(large, _full_hash, pool))
+
+    # Merge inode groups with content groups that share a representative
+    position = {p: i for i, p in enumerate(ordered)}
+    merged = {}
+    for group in groups:
+        members = set(group)
+        for key in [k for k, m in merged.items() if m & members]:
+            members |= merged.pop(key)
+        merged[min(members, key=position.get)] = members
+    return [sorted(m, key=position.get) for m in merged.values()]
+
+def duplicate_extras(groups):
+    """Return every path except the first one of each duplicate group"""
+    return [p for group in groups for p in group[1:]]
+
+
+class DuplicateScanThread(QThread):
+    """Run find_duplicates off the GUI thread"""
+    found = pyqtSignal(list)                # emits list of duplicate groups
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.paths = list(paths)
+
+    def run(self):
+        try:
+            groups = find_duplicates(self.paths)
+        except Exception as e:
+            print(f"Warning: Duplicate scan failed: {e}")
+            groups = []
+        self.found.emit(groups)
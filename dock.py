@@ -1,12 +1,22 @@
 # dock.py
 from PyQt5.QtWidgets import QWidget, QLabel, QPushButton
-from PyQt5.QtGui import QMovie
+from PyQt5.QtGui import QMovie, QPixmap
 from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QRect, QTimer, QPropertyAnimation, QEasingCurve
+import frame_cache
+import transitions
+import utils
+from dock_hub import DockHub
+from spectrum_overlay import SpectrumOverlay
 
 class GifDock(QWidget):
     closed = pyqtSignal()
+
+    TRANSITION_STEPS = 8
+    TRANSITION_MS = 240
+    ROTATE_MODES = ("off", "seconds", "loops", "beats")
+    DEFAULT_BPM = 120                       # beat length for songs without a BPM tag
     
-    def __init__(self, default_gifs=None):
+    def __init__(self, default_gifs=None, hub=None):
         super().__init__()
         self.setWindowTitle("GIF Dock")
 
@@ -21,6 +31,8 @@ class GifDock(QWidget):
         # QLabel for GIF
         self.label = QLabel(self)
         self.label.setScaledContents(True)
+        self.spectrum = SpectrumOverlay(self)
+        self.spectrum.hide()
         self.setGeometry(100, 100, 300, 300)
 
         # GIF storage
@@ -29,6 +41,47 @@ class GifDock(QWidget):
         self.gifs = self.default_gifs[:]
         self.current_index = 0
         self.movie = None
+        self.video = None
+        self.cover = None                   # the song's album art, shown when there are no GIFs
+        self.follows_song = True            # False: keeps to its own GIFs whatever plays
+
+        # Cached playback: animations shared with the other docks, run by the hub's clock
+        self.hub = hub or DockHub(parent=self)
+        self.hub.built.connect(self.on_frames_built)
+        self.frame_store = self.hub.frame_store
+        self.current_gif = None
+        self.animation = None
+        self.watching = False               # counted as a viewer of the animation
+        self.cache_side = frame_cache.bucket_side(self.width(), self.height())
+        self.cache_side_timer = QTimer(self)
+        self.cache_side_timer.setSingleShot(True)
+        self.cache_side_timer.setInterval(300)
+        self.cache_side_timer.timeout.connect(self.update_cache_side)
+
+        # Transitions between GIFs: in-between frames rendered in a worker, then shown in turn
+        self.transition = "crossfade"
+        self.transition_frames = []         # QImages still to show
+        self.transition_timer = QTimer(self)
+        self.transition_timer.setInterval(self.TRANSITION_MS // self.TRANSITION_STEPS)
+        self.transition_timer.timeout.connect(self.next_transition_frame)
+        self.transition_wait = None         # tag of the switch whose frames are being rendered
+        self.prerendered = None             # (tag, QImages) of the last rotation rendered ahead
+        self.renderers = []                 # transitions.Renderer threads still running
+
+        # Auto-rotation: the next GIF is decoded and mapped while the current one plays
+        self.rotate_mode = "off"
+        self.rotate_every = 10
+        self.tempo = 0
+        self.loops_played = 0
+        self.movie_started = False
+        self.rotate_timer = QTimer(self)
+        self.rotate_timer.setSingleShot(True)
+        self.rotate_timer.timeout.connect(self.rotate)
+        self.preloaded = None               # Animation of the next GIF, not yet playing
+        self.preload_step = 0               # next of its frames to convert
+
+        # Playback speed, e.g. driven by the music
+        self.speed = 1.0
 
         # Control buttons style - modern minimal
         button_style = """
@@ -108,8 +161,10 @@ class GifDock(QWidget):
         self.closed.emit()
         self.close()
 
-    def update_for_song(self, song_path: str, song_gifs: list):
-        """Set GIFs assigned to the current song."""
+    def update_for_song(self, song_path: str, song_gifs: list, cover=None):
+        """Set GIFs assigned to the current song, and its cover (a QPixmap)
+        to show if there are no GIFs at all."""
+        self.cover = cover
         self.current_song_gifs = song_gifs[:] if song_gifs else []
         if self.current_song_gifs:
             self.gifs = self.current_song_gifs[:]
@@ -119,11 +174,7 @@ class GifDock(QWidget):
         if self.gifs:
             self.play_gif(self.gifs[self.current_index])
         else:
-            if self.movie:
-                self.movie.stop()
-                self.movie.deleteLater()
-                self.movie = None
-            self.label.clear()
+            self.show_cover()
 
     def update_default_gifs(self, default_gifs: list):
         self.default_gifs = default_gifs[:] if default_gifs else []
@@ -132,6 +183,16 @@ class GifDock(QWidget):
             self.current_index = 0
             if self.gifs:
                 self.play_gif(self.gifs[self.current_index])
+            else:
+                self.show_cover()
+
+    def show_cover(self):
+        """Show the song's cover, or nothing, in place of GIFs"""
+        self.stop_gif()
+        if self.cover is not None:
+            self.label.setPixmap(self.cover)
+        else:
+            self.label.clear()
 
     def next_gif(self):
         if not self.gifs:
@@ -143,22 +204,284 @@ class GifDock(QWidget):
         if not self.gifs:
             return
         self.current_index = (self.current_index - 1) % len(self.gifs)
-        self.play_gif(self.gifs[self.current_index])
+        self.play_gif(self.gifs[self.current_index], backwards=True)
 
-    def play_gif(self, path):
+    def current_image(self):
+        """Copy of the picture on screen, or None"""
+        if self.animation:
+            return self.animation.image()
+        if self.movie:
+            return self.movie.currentImage()
+        pixmap = self.label.pixmap()
+        return pixmap.toImage() if pixmap is not None and not pixmap.isNull() else None
+
+    def stop_gif(self):
+        self.transition_timer.stop()
+        self.transition_frames = []
+        self.transition_wait = None
+        if self.animation:
+            self.set_watching(False)
+            self.animation.frame_changed.disconnect(self.show_frame)
+            self.animation.looped.disconnect(self.loop_finished)
+            self.hub.release(self.animation)
+            self.animation = None
         if self.movie:
             try:
                 self.movie.stop()
                 self.movie.deleteLater()
             except Exception:
                 pass
+            self.movie = None
+        if self.video:
+            self.video.frame_ready.disconnect(self.show_video_frame)
+            self.video.looped.disconnect(self.loop_finished)
+            self.hub.release_video(self.video)
+            self.video = None
+        self.current_gif = None
+
+    def play_gif(self, path, backwards=False):
+        """Play from the frame cache when possible, else decode with QMovie
+        and cache the frames in the background for next time"""
+        previous = leaving = None
+        if self.transition != "none" and path != self.current_gif and self.isVisible():
+            previous = self.current_image()
+            if self.animation:
+                leaving = (self.animation.key, self.animation.index)
+        self.stop_gif()
+        self.current_gif = path
+        if self.preloaded and self.preloaded.source == path:
+            self.animation, self.preloaded = self.preloaded, None
+        if utils.is_video_loop(path):
+            self.video = self.hub.acquire_video(path)
+            self.video.frame_ready.connect(self.show_video_frame)
+            self.video.looped.connect(self.loop_finished)
+            self.schedule_rotation()
+            return
+        if self.animation is None:
+            self.animation = self.hub.acquire(path, self.cache_side)
+        # With the animation set, the preload can render the next rotation too
+        self.schedule_rotation()
+        if self.animation:
+            # Another dock may already be playing it; this one joins at the same frame
+            self.animation.frame_changed.connect(self.show_frame)
+            self.animation.looped.connect(self.loop_finished)
+            self.set_watching(self.isVisible())
+            if previous is None or previous.isNull():
+                self.label.setPixmap(self.animation.pixmap())
+            else:
+                arriving = (self.animation.key, self.animation.index)
+                tag = (leaving, arriving, self.transition, backwards)
+                self.start_transition(previous, self.animation.image(), backwards, tag)
+            return
         try:
             self.movie = QMovie(path)
+            self.movie.frameChanged.connect(self.on_movie_frame)
+            self.movie_started = False
+            self.movie.setSpeed(int(100 * self.speed))
             self.label.setMovie(self.movie)
             self.movie.start()
         except Exception:
             self.label.clear()
             self.movie = None
+            return
+        self.hub.queue_cache_build(path, self.cache_side)
+
+    def set_watching(self, watching):
+        """Have the hub advance the animation for this dock, or stop counting it"""
+        if self.animation is None or watching == self.watching:
+            return
+        self.watching = watching
+        if watching:
+            self.hub.play(self.animation)
+        else:
+            self.hub.stop(self.animation)
+
+    def show_frame(self, pixmap):
+        # Pixmaps are copies, so the mapping can be closed at any time
+        if not self.in_transition():
+            self.label.setPixmap(pixmap)
+        if self.preloaded and self.preload_step < len(self.preloaded.frames):
+            # Spread converting the next GIF over the frames of this one
+            self.frame_store.pixmap(self.preloaded.frames, self.preload_step)
+            self.preload_step += 1
+
+    def in_transition(self):
+        return self.transition_timer.isActive() or self.transition_wait is not None
+
+    def start_transition(self, start, end, backwards=False, tag=None):
+        """Move from the old GIF's last picture to the new GIF's first frame.
+        A rotation the preload already rendered starts at once; any other
+        switch is rendered in a worker while the old picture stays up."""
+        if tag is not None and self.prerendered and self.prerendered[0] == tag:
+            frames, self.prerendered = self.prerendered[1], None
+            self.play_transition(frames)
+            return
+        self.transition_wait = tag = tag or object()
+        self.render_transition(tag, start, end, backwards)
+
+    def render_transition(self, tag, start, end, backwards=False):
+        renderer = transitions.Renderer(tag, self.transition, start, end,
+                                        self.TRANSITION_STEPS, backwards)
+        renderer.rendered.connect(self.on_transition_rendered)
+        renderer.finished.connect(self.on_renderer_finished)
+        self.renderers.append(renderer)
+        renderer.start()
+
+    def on_transition_rendered(self, tag, frames):
+        if tag is self.transition_wait:
+            self.transition_wait = None
+            self.play_transition(frames)
+        elif tag == self.prerender_tag():
+            self.prerendered = (tag, frames)
+
+    def on_renderer_finished(self):
+        renderer = self.sender()
+        self.renderers.remove(renderer)
+        renderer.deleteLater()
+
+    def play_transition(self, frames):
+        self.transition_frames = list(frames)
+        self.next_transition_frame()
+        self.transition_timer.start()
+
+    def next_transition_frame(self):
+        if self.transition_frames:
+            self.label.setPixmap(QPixmap.fromImage(self.transition_frames.pop(0)))
+        else:
+            self.transition_timer.stop()
+            if self.animation:
+                self.label.setPixmap(self.animation.pixmap())
+
+    def set_transition(self, kind):
+        self.transition = kind if kind in transitions.KINDS else "none"
+        if self.transition == "none":
+            self.prerendered = None
+        self.prerender_transition()
+
+    def show_video_frame(self, image):
+        self.label.setPixmap(QPixmap.fromImage(image))
+
+    def on_movie_frame(self, number):
+        if number == 0:
+            if self.movie_started:
+                self.loop_finished()
+            self.movie_started = True
+
+    def set_speed(self, factor):
+        """Play GIFs faster or slower; takes effect from the next frame.
+        Cached GIFs run on the hub's clock, so this sets the speed of every
+        dock sharing it. Video loops keep their speed, as rate changes make
+        them stutter."""
+        self.speed = max(0.1, factor)
+        self.hub.set_speed(self.speed)
+        if self.movie and abs(self.movie.speed() - 100 * self.speed) >= 5:
+            self.movie.setSpeed(int(100 * self.speed))
+
+    def show_spectrum(self, enabled):
+        self.spectrum.setVisible(enabled)
+        if not enabled:
+            self.spectrum.clear()
+
+    # -------------- Auto-rotation --------------
+    def set_rotation(self, mode, every):
+        self.rotate_mode = mode if mode in self.ROTATE_MODES else "off"
+        self.rotate_every = max(1, int(every))
+        self.schedule_rotation()
+
+    def set_tempo(self, bpm):
+        self.tempo = bpm if bpm and bpm > 0 else 0
+        if self.rotate_mode == "beats":
+            self.schedule_rotation()
+
+    def schedule_rotation(self):
+        """Restart the countdown to the next automatic GIF change"""
+        self.rotate_timer.stop()
+        self.loops_played = 0
+        if self.rotate_mode == "off" or len(self.gifs) < 2:
+            self.drop_preload()
+            self.prerendered = None
+            return
+        if self.rotate_mode == "seconds":
+            self.rotate_timer.start(self.rotate_every * 1000)
+        elif self.rotate_mode == "beats":
+            self.rotate_timer.start(int(self.rotate_every * 60000 / (self.tempo or self.DEFAULT_BPM)))
+        self.preload_next()
+
+    def loop_finished(self):
+        """Count a full loop of the GIF. Returns True if it rotated to the next one."""
+        if self.rotate_mode != "loops":
+            return False
+        self.loops_played += 1
+        if self.loops_played < self.rotate_every:
+            return False
+        self.rotate()
+        return True
+
+    def rotate(self):
+        if self.isVisible():
+            self.next_gif()
+        else:
+            self.schedule_rotation()
+
+    def preload_next(self):
+        """Have the next GIF decoded and mapped before it is due"""
+        path = self.gifs[(self.current_index + 1) % len(self.gifs)]
+        if self.preloaded and self.preloaded.source == path:
+            self.prerender_transition()
+            return
+        self.drop_preload()
+        if path == self.current_gif or utils.is_video_loop(path):
+            return
+        animation = self.hub.acquire(path, self.cache_side)
+        if animation is None:
+            # Decoded in the hub's worker; on_frames_built comes back here
+            self.hub.queue_cache_build(path, self.cache_side)
+            return
+        self.preloaded = animation
+        self.preload_step = 0
+        self.prerender_transition()
+
+    def drop_preload(self):
+        if self.preloaded:
+            self.hub.release(self.preloaded)
+            self.preloaded = None
+
+    def prerender_tag(self):
+        """The switch a rotation after a full loop makes: from the current
+        GIF's first frame to the preloaded GIF's first frame"""
+        if (self.transition == "none" or self.rotate_mode != "loops"
+                or not self.animation or not self.preloaded):
+            return None
+        return ((self.animation.key, 0), (self.preloaded.key, 0), self.transition, False)
+
+    def prerender_transition(self):
+        """Render the next rotation's transition in a worker, alongside the preload"""
+        tag = self.prerender_tag()
+        if tag is None or (self.prerendered and self.prerendered[0] == tag):
+            return
+        if any(renderer.tag == tag for renderer in self.renderers):
+            return
+        self.render_transition(tag, self.animation.frames.frame(0).copy(),
+                               self.preloaded.frames.frame(0).copy())
+
+    # -------------- Frame cache --------------
+    def on_frames_built(self, path, side):
+        """Switch the GIF on screen over to its cached frames"""
+        if side != self.cache_side:
+            return
+        if self.movie and path == self.current_gif:
+            self.play_gif(path)
+        elif self.rotate_mode != "off" and len(self.gifs) > 1:
+            self.preload_next()
+
+    def update_cache_side(self):
+        """Re-pick the cached frame size after the dock was resized"""
+        side = frame_cache.bucket_side(self.width(), self.height())
+        if side != self.cache_side:
+            self.cache_side = side
+            self.drop_preload()
+            if self.current_gif:
+                self.play_gif(self.current_gif)
 
     # -------------- Hover controls --------------
     def enterEvent(self, event):
@@ -190,6 +513,8 @@ class GifDock(QWidget):
     # -------------- window & interaction --------------
     def resizeEvent(self, event):
         self.label.setGeometry(0, 0, self.width(), self.height())
+        spectrum_height = self.height() // 3
+        self.spectrum.setGeometry(0, self.height() - spectrum_height, self.width(), spectrum_height)
 
         # Position buttons at top-right
         button_spacing = 4
@@ -200,6 +525,7 @@ class GifDock(QWidget):
         self.nextBtn.move(x_pos, y_pos + 36 + button_spacing)
         self.prevBtn.move(x_pos, y_pos + 72 + button_spacing * 2)
         self.resizeBtn.move(self.width() - 38, self.height() - 38)
+        self.cache_side_timer.start()
 
         super().resizeEvent(event)
 
@@ -238,4 +564,22 @@ class GifDock(QWidget):
     def resize_button_release(self, event):
         self.resize_active = False
         self.resize_start_pos = None
-        self.resize_start_geometry = None
\ No newline at end of file
+        self.resize_start_geometry = None
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.set_watching(True)
+        if self.animation and not self.in_transition():
+            self.label.setPixmap(self.animation.pixmap())
+
+    def hideEvent(self, event):
+        # A hidden dock stops counting, so nobody's animation runs just for it
+        self.set_watching(False)
+        super().hideEvent(event)
+
+    def closeEvent(self, event):
+        for renderer in self.renderers:
+            renderer.wait()
+        if self.hub.parent() is self:
+            self.hub.shutdown()
+        super().closeEvent(event)
\ No newline at end of file
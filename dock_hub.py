@@ -0,0 +1,194 @@
+# dock_hub.py
+"""
+What every open GIF dock shares.
+
+Docks showing the same GIF at the same cached size share one Animation:
+one memory mapping of its frames, one set of pixmaps in the frame store
+and one position, so each extra dock only costs a setPixmap per frame.
+All animations run off a single precise timer that wakes up for
+whichever frame is due next, instead of a timer per dock. Video loops
+are decoded once however many docks show them, and GIFs missing from the
+disk cache are built by one background builder, whichever dock asked.
+"""
+import math
+import time
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+import frame_cache
+from video_loop import VideoLoop
+
+class Animation(QObject):
+    """One cached GIF playing at one size; docks connect to its signals"""
+    frame_changed = pyqtSignal(object)      # emits the QPixmap now showing
+    looped = pyqtSignal()                   # emits when it starts over
+
+    def __init__(self, key, frames, frame_store, parent=None):
+        super().__init__(parent)
+        self.key = key                      # (path, cache side)
+        self.frames = frames
+        self.frame_store = frame_store
+        self.index = 0
+        self.due = 0.0                      # time.monotonic() when the next frame is due
+        self.users = 0                      # docks holding it (playing or preloaded)
+        self.viewers = 0                    # docks playing it
+        self._pixmap = None
+
+    @property
+    def source(self):
+        return self.key[0]
+
+    def pixmap(self):
+        if self._pixmap is None:
+            self._pixmap = self.frame_store.pixmap(self.frames, self.index)
+        return self._pixmap
+
+    def image(self):
+        return self.frames.frame(self.index).copy()
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self.frames)
+        self._pixmap = None
+        if self.index == 0:
+            self.looped.emit()
+        if self.viewers:
+            self.frame_changed.emit(self.pixmap())
+
+    def prepare_next(self):
+        """Convert the frame after this one while it is still showing"""
+        self.frame_store.pixmap(self.frames, (self.index + 1) % len(self.frames))
+
+
+class DockHub(QObject):
+    """Shared frames, animation clock, video loops and cache builder of all docks"""
+    built = pyqtSignal(str, int)            # frames of (path, side) are now in the disk cache
+    frames_changed = pyqtSignal()           # a GIF was loaded into the frame store
+
+    def __init__(self, frame_store=None, parent=None):
+        super().__init__(parent)
+        self.frame_store = frame_store or frame_cache.FrameStore()
+        self.speed = 1.0
+        self._animations = {}               # (path, side) -> Animation
+        self._videos = {}                   # path -> [VideoLoop, users]
+
+        self.clock = QTimer(self)
+        self.clock.setSingleShot(True)
+        self.clock.setTimerType(Qt.PreciseTimer)
+        self.clock.timeout.connect(self._tick)
+
+        self.build_queue = []
+        self.cache_builder = None
+
+    # ---------- Animations ----------
+    def acquire(self, path, side):
+        """The shared Animation of a cached GIF, or None if it is not cached yet"""
+        key = (path, side)
+        animation = self._animations.get(key)
+        if animation is None:
+            frames = frame_cache.open_frames(path, side)
+            if frames is None:
+                return None
+            animation = Animation(key, frames, self.frame_store, self)
+            self._animations[key] = animation
+            self.frame_store.register(frames)
+        animation.users += 1
+        return animation
+
+    def release(self, animation):
+        animation.users -= 1
+        if animation.users <= 0 and self._animations.get(animation.key) is animation:
+            del self._animations[animation.key]
+            animation.frames.close()
+            animation.deleteLater()
+
+    def play(self, animation):
+        """Start showing an animation; a second viewer joins it where it is"""
+        animation.viewers += 1
+        if animation.viewers == 1:
+            animation.index = 0
+            animation._pixmap = None
+            animation.due = time.monotonic() + self._delay(animation)
+            animation.prepare_next()
+            self._schedule()
+            self.frames_changed.emit()
+
+    def stop(self, animation):
+        animation.viewers = max(0, animation.viewers - 1)
+
+    def set_speed(self, factor):
+        """Play all GIFs faster or slower; takes effect from the next frame"""
+        self.speed = max(0.1, factor)
+
+    def _delay(self, animation):
+        return animation.frames.delay(animation.index) / 1000 / self.speed
+
+    def _tick(self):
+        now = time.monotonic()
+        for animation in list(self._animations.values()):
+            if not animation.viewers or len(animation.frames) < 2 or animation.due > now + 0.001:
+                continue
+            animation.advance()
+            if not animation.viewers:
+                continue                    # the last dock moved on to another GIF
+            # Keep the pace without drifting, but never try to catch up in a burst
+            animation.due = max(animation.due + self._delay(animation), now)
+            # Frames are converted one at a time, a frame ahead, so starting a
+            # GIF never converts all of them at once
+            animation.prepare_next()
+        self._schedule()
+
+    def _schedule(self):
+        due = [a.due for a in self._animations.values() if a.viewers and len(a.frames) > 1]
+        if due:
+            # Round up: waking early would only mean waking again
+            self.clock.start(max(0, math.ceil((min(due) - time.monotonic()) * 1000)))
+        else:
+            self.clock.stop()
+
+    # ---------- Video loops ----------
+    def acquire_video(self, path):
+        """The shared, playing VideoLoop of a video"""
+        entry = self._videos.get(path)
+        if entry is None:
+            video = VideoLoop(path, self)
+            entry = self._videos[path] = [video, 0]
+            video.start()
+        entry[1] += 1
+        return entry[0]
+
+    def release_video(self, video):
+        entry = self._videos.get(video.path)
+        if entry is None or entry[0] is not video:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._videos[video.path]
+            video.stop()
+            video.deleteLater()
+
+    # ---------- Frame cache ----------
+    def queue_cache_build(self, path, side):
+        job = (path, side)
+        if job not in self.build_queue:
+            self.build_queue.append(job)
+        if self.cache_builder is None:
+            self._start_cache_build()
+
+    def _start_cache_build(self):
+        if not self.build_queue:
+            return
+        self.cache_builder = frame_cache.FrameCacheBuilder(self.build_queue, self)
+        self.build_queue = []
+        self.cache_builder.built.connect(self.built)
+        self.cache_builder.finished.connect(self._on_cache_build_finished)
+        self.cache_builder.start()
+
+    def _on_cache_build_finished(self):
+        self.cache_builder.deleteLater()
+        self.cache_builder = None
+        self._start_cache_build()
+
+    def shutdown(self):
+        self.clock.stop()
+        self.build_queue = []
+        if self.cache_builder:
+            self.cache_builder.requestInterruption()
+            self.cache_builder.wait()
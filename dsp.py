@@ -0,0 +1,232 @@
+# dsp.py
+"""
+Block-based audio processing for the PCM engine.
+
+Every stage works in place on a float32 block of shape (frames, channels)
+using whole-block NumPy operations, and carries its state from one block
+to the next so blocks join seamlessly. Samples are in -1..1.
+
+IIR filters run through scipy's sosfilt when it is installed. Without it
+the cascade's impulse response is applied by FFT convolution
+(overlap-add) instead, which sounds the same and still costs only a few
+FFTs per block.
+"""
+import math
+
+try:
+    import numpy        # optional: required by the PCM engine only
+except ImportError:
+    numpy = None
+
+try:
+    from scipy.signal import sosfilt    # optional: runs IIR filters in C
+except ImportError:
+    sosfilt = None
+
+EQ_BANDS = (31, 62, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)   # Hz
+EQ_Q = 1.41                                 # one octave wide
+EQ_RANGE = 12.0                             # dB of boost or cut per band at most
+EQ_PRESETS = {
+    "Flat": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "Bass Boost": [6, 5, 4, 2, 0, 0, 0, 0, 0, 0],
+    "Treble Boost": [0, 0, 0, 0, 0, 0, 2, 4, 5, 6],
+    "Vocal": [-2, -2, -1, 1, 3, 3, 2, 1, 0, -1],
+    "Rock": [4, 3, 2, 0, -1, -1, 1, 2, 3, 4],
+    "Loudness": [5, 4, 2, 0, -1, -1, 0, 2, 4, 5],
+}
+IR_SIZE = 8192                              # taps of the FFT fallback; plenty for these filters to die out
+
+# ---------- Biquad design (RBJ audio EQ cookbook) ----------
+# Returns one second-order section [b0, b1, b2, 1, a1, a2]
+def _section(b0, b1, b2, a0, a1, a2):
+    return [b0 / a0, b1 / a0, b2 / a0, 1.0, a1 / a0, a2 / a0]
+
+def peaking(freq, gain_db, q, rate):
+    a = 10 ** (gain_db / 40)
+    w = 2 * math.pi * freq / rate
+    cos_w, alpha = math.cos(w), math.sin(w) / (2 * q)
+    return _section(1 + alpha * a, -2 * cos_w, 1 - alpha * a,
+                    1 + alpha / a, -2 * cos_w, 1 - alpha / a)
+
+def impulse_response(sos, size):
+    """The first `size` samples of a cascade's impulse response, from its
+    frequency response (anything longer wraps around)"""
+    z = numpy.exp(-2j * numpy.pi * numpy.arange(size // 2 + 1) / size)
+    response = numpy.ones(len(z), numpy.complex128)
+    for b0, b1, b2, _, a1, a2 in sos:
+        response *= (b0 + z * (b1 + z * b2)) / (1 + z * (a1 + z * a2))
+    return numpy.fft.irfft(response, size)
+
+
+# ---------- Stages ----------
+class Gain:
+    """Constant gain"""
+
+    def __init__(self, db=0.0):
+        self.factor = 1.0
+        self.set_db(db)
+
+    def set_db(self, db):
+        self.factor = 10 ** (db / 20)
+
+    def process(self, block):
+        if self.factor != 1.0:
+            block *= self.factor
+
+    def reset(self):
+        pass
+
+
+class BiquadCascade:
+    """Second-order sections run over every channel, with filter state
+    carried between blocks. No sections means bypass."""
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.sos = None
+        self.zi = None                      # sosfilt's state
+        self._ir = None                     # FFT fallback: impulse response,
+        self._spectra = {}                  # its spectrum per FFT size,
+        self._tail = None                   # and the overlap into the next block
+
+    def set_sections(self, sections):
+        if not sections:
+            self.sos = None
+            return
+        sos = numpy.array(sections, numpy.float64)
+        if sosfilt is not None:
+            if self.zi is None or len(self.zi) != len(sos):
+                self.zi = numpy.zeros((len(sos), 2, self.channels))
+        else:
+            self._ir = impulse_response(sos, IR_SIZE)
+            self._spectra = {}
+            if self._tail is None:
+                self._tail = numpy.zeros((IR_SIZE - 1, self.channels), numpy.float32)
+        self.sos = sos
+
+    def process(self, block):
+        if self.sos is None:
+            return
+        if sosfilt is not None:
+            block[:], self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        else:
+            self._convolve(block)
+
+    def _convolve(self, block):
+        frames = len(block)
+        size = 1 << (frames + IR_SIZE - 2).bit_length()    # room for the whole convolution
+        spectrum = self._spectra.get(size)
+        if spectrum is None:
+            spectrum = self._spectra[size] = numpy.fft.rfft(self._ir, size).astype(numpy.complex64)[:, None]
+        out = numpy.fft.irfft(numpy.fft.rfft(block, size, axis=0) * spectrum, size, axis=0)
+        out[:IR_SIZE - 1] += self._tail
+        block[:] = out[:frames]
+        self._tail = out[frames:frames + IR_SIZE - 1]
+
+    def reset(self):
+        if self.zi is not None:
+            self.zi.fill(0)
+        if self._tail is not None:
+            self._tail = numpy.zeros_like(self._tail)
+
+
+class Equalizer(BiquadCascade):
+    """Parametric equalizer with one peaking filter per band"""
+
+    def __init__(self, rate, channels, bands=EQ_BANDS, q=EQ_Q):
+        super().__init__(channels)
+        self.rate = rate
+        self.bands = [[freq, 0.0, q] for freq in bands]     # [center Hz, gain dB, Q]
+
+    def set_band(self, index, freq=None, gain_db=None, q=None):
+        band = self.bands[index]
+        for i, value in enumerate((freq, gain_db, q)):
+            if value is not None:
+                band[i] = float(value)
+        self._update()
+
+    def set_gains(self, gains):
+        for band, gain in zip(self.bands, gains):
+            band[1] = float(gain)
+        self._update()
+
+    def gains(self):
+        return [band[1] for band in self.bands]
+
+    def _update(self):
+        if not any(gain for _, gain, _ in self.bands):
+            self.set_sections([])
+            return
+        # Flat bands stay in the cascade too, so the section count (and
+        # with it the filter state) does not change while a slider moves
+        self.set_sections([peaking(freq, gain, q, self.rate) for freq, gain, q in self.bands
+                           if freq < self.rate / 2])
+
+
+class Limiter:
+    """
+    Peak limiter working at block rate: within a block the gain ramps down
+    to what the block's peak needs, and it recovers smoothly along a ramp
+    over following blocks, so it never needs a per-sample loop. A hard
+    clip at full scale catches anything left.
+    """
+
+    def __init__(self, rate, threshold_db=-1.0, attack=0.001, release=0.25):
+        self.rate = rate
+        self.threshold = 10 ** (threshold_db / 20)
+        self.attack = attack                # s the gain takes to drop at the least
+        self.release = release              # s to recover most of the way
+        self.gain = 1.0
+        self._steps = numpy.zeros(0, numpy.float32)    # 1, 2, ... n for ramps
+        self._ramp = numpy.zeros(0, numpy.float32)
+
+    def process(self, block):
+        frames = len(block)
+        if not frames:
+            return
+        peak = max(float(block.max()), -float(block.min()))
+        target = min(1.0, self.threshold / peak) if peak > 0 else 1.0
+        if target < self.gain:
+            # Reach the new gain by the first sample the old one would push
+            # over the threshold; the samples before it stay under at any
+            # gain in between. A ramp shorter than the attack would click,
+            # so the clip below takes whatever that lets through.
+            over = numpy.abs(block).max(axis=1) * self.gain > self.threshold
+            length = min(frames, max(int(over.argmax()) + 1, int(self.attack * self.rate)))
+            ramp = numpy.full(frames, target, numpy.float32)
+            ramp[:length] = numpy.linspace(self.gain, target, length + 1, dtype=numpy.float32)[1:]
+            block *= ramp[:, None]
+            self.gain = target
+        elif self.gain < 1.0:
+            if len(self._steps) < frames:
+                self._steps = numpy.arange(1, frames + 1, dtype=numpy.float32)
+                self._ramp = numpy.zeros(frames, numpy.float32)
+            new_gain = self.gain + (target - self.gain) * (1 - math.exp(-frames / (self.release * self.rate)))
+            ramp = self._ramp[:frames]
+            numpy.multiply(self._steps[:frames], (new_gain - self.gain) / frames, out=ramp)
+            ramp += self.gain
+            block *= ramp[:, None]
+            self.gain = new_gain
+        numpy.clip(block, -1.0, 1.0, out=block)
+
+    def reset(self):
+        self.gain = 1.0
+
+
+class DspChain:
+    """equalizer -> preamp -> limiter -> volume, applied to each block in place"""
+
+    def __init__(self, rate, channels):
+        self.eq = Equalizer(rate, channels)
+        self.preamp = Gain()
+        self.limiter = Limiter(rate)
+        self.volume = Gain()
+        self.stages = [self.eq, self.preamp, self.limiter, self.volume]
+
+    def process(self, block):
+        for stage in self.stages:
+            stage.process(block)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
@@ -0,0 +1,292 @@
+# frame_cache.py
+"""
+Disk cache of decoded GIF frames.
+
+Each GIF is decoded once per size bucket into a file of raw RGBA frames:
+
+    header | unique frames | frame digests | uses per frame | steps
+
+Identical frames are stored once: consecutive repeats become a single
+step with their delays added up, and frames that come back later (a
+loop played twice inside the GIF) are steps pointing at the same stored
+frame. A step is (stored frame, delay in ms).
+
+The header records the frame size and counts plus the source file's
+mtime and size, so an edited GIF is decoded again. Frames are
+memory-mapped and handed to Qt without copying, so showing a cached GIF
+costs no decoding, and the OS page cache decides what stays in memory.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from collections import OrderedDict
+from PyQt5 import sip
+from PyQt5.QtCore import QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+import utils
+
+CACHE_DIR = os.path.join(utils.get_config_dir(), "frames")
+
+MAGIC = b"GFC2"
+# magic, width, height, stored frames, steps, decoded frames, source mtime, source size
+HEADER = struct.Struct("<4sIIIIIdQ")
+DIGEST_SIZE = 16
+SIZE_STEP = 128                             # frames are cached per 128 px step of the dock size
+MIN_DELAY = 20                              # ms; shorter GIF delays are shown at 100 ms, like browsers do
+MAX_ENTRY_BYTES = 256 * 1024 * 1024         # larger animations keep decoding through QMovie
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+def bucket_side(width, height):
+    """Longest side to cache frames at for a dock of this size"""
+    side = max(width, height, 1)
+    return (side + SIZE_STEP - 1) // SIZE_STEP * SIZE_STEP
+
+def cache_path(source, side):
+    key = f"{os.path.abspath(source)}\0{side}".encode("utf-8", "surrogatepass")
+    return os.path.join(CACHE_DIR, hashlib.sha1(key).hexdigest() + ".rgba")
+
+def frame_digest(width, height, pixels):
+    return hashlib.blake2b(struct.pack("<II", width, height) + pixels,
+                           digest_size=DIGEST_SIZE).digest()
+
+
+class CachedFrames:
+    """The frames of one GIF, mapped from its cache file"""
+
+    def __init__(self, source, mm, width, height, stored, steps, decoded):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.stored = stored                # distinct frames in the file
+        self.decoded = decoded              # frames the GIF itself has
+        self.frame_bytes = width * height * 4
+        self._mm = mm
+        self._base = int(sip.voidptr(mm))
+        digests_at = HEADER.size + stored * self.frame_bytes
+        self.digests = [bytes(mm[digests_at + i * DIGEST_SIZE:digests_at + (i + 1) * DIGEST_SIZE])
+                        for i in range(stored)]
+        uses_at = digests_at + stored * DIGEST_SIZE
+        self.uses = array("I")
+        self.uses.frombytes(mm[uses_at:uses_at + stored * 4])
+        self.steps = array("I")             # stored frame, delay, stored frame, delay, ...
+        self.steps.frombytes(mm[uses_at + stored * 4:uses_at + stored * 4 + steps * 8])
+
+    def __len__(self):
+        return len(self.steps) // 2
+
+    def stored_index(self, step):
+        return self.steps[2 * step]
+
+    def delay(self, step):
+        return self.steps[2 * step + 1]
+
+    def frame_key(self, step):
+        """Content digest of the frame shown at a step"""
+        return self.digests[self.steps[2 * step]]
+
+    def image(self, stored_index):
+        """QImage of a stored frame; it points into the mapping, so convert
+        it (e.g. QPixmap.fromImage) before this object is closed"""
+        address = self._base + HEADER.size + stored_index * self.frame_bytes
+        return QImage(sip.voidptr(address), self.width, self.height,
+                      self.width * 4, QImage.Format_RGBA8888)
+
+    def frame(self, step):
+        return self.image(self.steps[2 * step])
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def open_frames(source, side):
+    """Map the cached frames of a GIF, or return None if they are missing or stale"""
+    path = cache_path(source, side)
+    try:
+        stat = os.stat(source)
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, width, height, stored, steps, decoded, mtime, size = HEADER.unpack_from(mm, 0)
+    except struct.error:
+        mm.close()
+        return None
+    expected = HEADER.size + stored * (width * height * 4 + DIGEST_SIZE + 4) + steps * 8
+    if (magic != MAGIC or stored == 0 or steps == 0 or mtime != stat.st_mtime
+            or size != stat.st_size or len(mm) != expected):
+        mm.close()
+        return None
+
+    try:
+        os.utime(path)                      # last use, for pruning
+    except OSError:
+        pass
+    return CachedFrames(source, mm, width, height, stored, steps, decoded)
+
+
+def build_frames(source, side):
+    """Decode a GIF into the cache. Returns True if an entry was written."""
+    try:
+        stat = os.stat(source)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+    except OSError:
+        return False
+    reader = QImageReader(source)
+    if not reader.canRead():
+        return False
+
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=CACHE_DIR)
+    try:
+        with os.fdopen(tmp_fd, "wb") as f:
+            f.write(bytes(HEADER.size))
+            index = {}                      # digest -> stored frame
+            uses = array("I")
+            steps = array("I")
+            decoded = 0
+            width = height = 0
+            written = HEADER.size
+            while reader.canRead():
+                image = reader.read()
+                if image.isNull():
+                    break
+                if not decoded:
+                    size = image.size()
+                    if max(size.width(), size.height()) > side:
+                        size = size.scaled(side, side, Qt.KeepAspectRatio)
+                    width, height = max(1, size.width()), max(1, size.height())
+                image = image.convertToFormat(QImage.Format_RGBA8888)
+                if image.width() != width or image.height() != height:
+                    image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                pixels = image.constBits().asstring(width * height * 4)
+                delay = reader.nextImageDelay()
+                delay = delay if delay >= MIN_DELAY else 100
+                decoded += 1
+
+                digest = frame_digest(width, height, pixels)
+                stored = index.get(digest)
+                if stored is None:
+                    written += len(pixels) + DIGEST_SIZE + 4
+                    if written > MAX_ENTRY_BYTES:
+                        return False
+                    stored = index[digest] = len(uses)
+                    uses.append(0)
+                    f.write(pixels)
+                uses[stored] += 1
+                if steps and steps[-2] == stored:
+                    steps[-1] += delay      # same picture again: just show it longer
+                else:
+                    steps.extend((stored, delay))
+            if not decoded:
+                return False
+            f.write(b"".join(index))        # digests, in stored frame order
+            f.write(uses.tobytes())
+            f.write(steps.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, width, height, len(uses), len(steps) // 2, decoded,
+                                stat.st_mtime, stat.st_size))
+        os.replace(tmp_path, cache_path(source, side))
+        return True
+    except OSError as e:
+        print(f"Warning: Could not cache frames of {source}: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune(max_bytes=MAX_CACHE_BYTES):
+    """Delete the least recently used entries until the cache fits"""
+    try:
+        entries = [e for e in os.scandir(CACHE_DIR) if e.name.endswith(".rgba")]
+    except OSError:
+        return
+    stats = []
+    for entry in entries:
+        try:
+            stats.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+        except OSError:
+            pass
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class FrameStore:
+    """
+    Frames ready to paint, shared by every GIF on screen.
+
+    Pixmaps are keyed by frame content, so a frame that appears in several
+    GIFs (or several times in one) is converted and held once. The least
+    recently shown frames are dropped once the memory budget is reached;
+    they come back from the mapped cache file without decoding.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_MEMORY_BUDGET):
+        self.budget_bytes = budget_bytes
+        self.stored_bytes = 0
+        self._pixmaps = OrderedDict()       # digest -> (QPixmap, bytes)
+        self._uses = {}                     # digest -> decoded frames it stands for
+        self._registered = set()            # (source, width, height) already counted
+
+    def register(self, frames):
+        """Count the frames of a GIF once, for the savings report"""
+        key = (frames.source, frames.width, frames.height)
+        if key not in self._registered:
+            self._registered.add(key)
+            for digest, uses in zip(frames.digests, frames.uses):
+                self._uses[digest] = self._uses.get(digest, 0) + uses
+
+    def pixmap(self, frames, step):
+        key = frames.frame_key(step)
+        entry = self._pixmaps.get(key)
+        if entry is not None:
+            self._pixmaps.move_to_end(key)
+            return entry[0]
+        pixmap = QPixmap.fromImage(frames.frame(step))
+        self._pixmaps[key] = (pixmap, frames.frame_bytes)
+        self.stored_bytes += frames.frame_bytes
+        while self.stored_bytes > self.budget_bytes and len(self._pixmaps) > 1:
+            _, (_, size) = self._pixmaps.popitem(last=False)
+            self.stored_bytes -= size
+        return pixmap
+
+    def saved_bytes(self):
+        """Memory the held frames would take if every decoded frame had its own copy"""
+        return sum((self._uses.get(digest, 1) - 1) * size
+                   for digest, (_, size) in self._pixmaps.items())
+
+    def describe(self):
+        mib = 1024 * 1024
+        return (f"Frame memory: {self.stored_bytes / mib:.1f} of {self.budget_bytes / mib:.0f} MB "
+                f"({self.saved_bytes() / mib:.1f} MB saved by sharing identical frames)")
+
+
+class FrameCacheBuilder(QThread):
+    """Decode GIFs into the cache in the background"""
+    built = pyqtSignal(str, int)            # emits (source, side) for each new entry
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = list(jobs)              # [(source, side)]
+
+    def run(self):
+        for source, side in self.jobs:
+            if self.isInterruptionRequested():
+                break
+            if build_frames(source, side):
+                self.built.emit(source, side)
+        prune()
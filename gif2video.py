@@ -0,0 +1,108 @@
+# gif2video.py
+"""
+Convert large GIFs into compact MP4/WebM loops with ffmpeg.
+
+A video of the same clip is usually a fraction of the GIF's size and far
+cheaper to decode. Each video is written next to its GIF and kept only
+if it is smaller; a GIF whose video name is already taken is skipped:
+
+    python gif2video.py                     # GIFs in the collection over 2 MB
+    python gif2video.py --min-size 0 a.gif  # specific files
+    python gif2video.py --update-settings   # also point Gifly at the videos
+
+--update-settings rewrites the GIF collection, song assignments and GIF
+rules in settings.json, so Gifly must not be running. Videos have no
+transparency, so transparent GIFs get a solid background.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import giflyctl
+import utils
+
+FORMATS = {
+    # Even dimensions and yuv420p keep H.264 playable on every decoder
+    ".mp4": ["-c:v", "libx264", "-crf", "23", "-preset", "slow", "-pix_fmt", "yuv420p",
+             "-movflags", "+faststart"],
+    ".webm": ["-c:v", "libvpx-vp9", "-crf", "35", "-b:v", "0", "-pix_fmt", "yuv420p"],
+}
+SCALE_EVEN = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+def convert(ffmpeg, gif, extension):
+    """Convert one GIF. Returns (video path, None), or (None, why it was kept)."""
+    target = os.path.splitext(gif)[0] + extension
+    if os.path.exists(target):
+        return None, f"{os.path.basename(target)} already exists"
+    tmp = target + ".part" + extension
+    command = [ffmpeg, "-v", "error", "-y", "-i", gif, "-an", "-vf", SCALE_EVEN,
+               *FORMATS[extension], tmp]
+    try:
+        subprocess.run(command, check=True, stdin=subprocess.DEVNULL)
+        if os.path.getsize(tmp) >= os.path.getsize(gif):
+            return None, "the video was not smaller"
+        os.replace(tmp, target)
+        return target, None
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Warning: Could not convert {gif}: {e}", file=sys.stderr)
+        return None, "the conversion failed"
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def replace_paths(settings, converted):
+    """Point every GIF reference in the settings at its video"""
+    swap = lambda gifs: list(dict.fromkeys(converted.get(g, g) for g in gifs))
+    settings["gifs"] = swap(settings["gifs"])
+    settings["song_gifs"] = {song: swap(gifs) for song, gifs in settings["song_gifs"].items()}
+    for rule in settings["gif_rules"]:
+        if isinstance(rule, dict) and isinstance(rule.get("gifs"), list):
+            rule["gifs"] = swap(rule["gifs"])
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Convert large GIFs into video loops.")
+    parser.add_argument("gifs", nargs="*", help="GIFs to convert (default: the Gifly collection)")
+    parser.add_argument("--min-size", type=float, default=2.0,
+                        help="only convert GIFs of at least this many MB (default 2)")
+    parser.add_argument("--format", choices=("mp4", "webm"), default="mp4")
+    parser.add_argument("--update-settings", action="store_true",
+                        help="use the videos in place of the GIFs in Gifly's settings")
+    args = parser.parse_args(argv)
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        print("ffmpeg was not found on PATH", file=sys.stderr)
+        return 1
+    if args.update_settings:
+        conn = giflyctl.connect()
+        if conn is not None:
+            conn.close()
+            print("Close Gifly before updating its settings", file=sys.stderr)
+            return 1
+
+    settings = utils.load_settings()
+    gifs = [os.path.abspath(g) for g in args.gifs] if args.gifs else settings["gifs"]
+    min_bytes = args.min_size * 1024 * 1024
+    converted = {}
+    for gif in gifs:
+        if not gif.lower().endswith(".gif") or not os.path.isfile(gif):
+            continue
+        size = os.path.getsize(gif)
+        if size < min_bytes:
+            continue
+        video, reason = convert(ffmpeg, gif, "." + args.format)
+        if video:
+            converted[gif] = video
+            print(f"{gif}: {size / 2**20:.1f} MB -> {os.path.getsize(video) / 2**20:.1f} MB")
+        else:
+            print(f"{gif}: kept, {reason}")
+
+    if args.update_settings and converted:
+        replace_paths(settings, converted)
+        utils.save_settings(settings)
+        print(f"Updated settings for {len(converted)} GIF(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,251 @@
+# gif_grid.py
+"""
+Thumbnail grid for the GIFs tab.
+
+The model asks for a thumbnail only when the view paints an item, so
+only visible GIFs are ever thumbnailed. Thumbnails are made in a thread
+pool from the first frame and kept on disk, named after the GIF's path,
+size and modification time, so a later session just loads small PNGs;
+the GUI thread never reads a GIF for the grid. The newest requests run
+first, so scrolling quickly does not leave the visible items waiting
+behind ones that scrolled past. Hovering an item plays it in place.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from PyQt5.QtCore import (QAbstractListModel, QModelIndex, QObject, QRunnable, QSize, Qt,
+                          QThreadPool, QTimer, pyqtSignal)
+from PyQt5.QtGui import QColor, QImage, QImageReader, QMovie, QPixmap
+from PyQt5.QtWidgets import QListView
+import utils
+
+THUMB_DIR = os.path.join(utils.get_config_dir(), "gif_thumbs")
+THUMB_SIZE = 96                             # px, longest side
+MAX_PIXMAPS = 400                           # thumbnails kept in memory
+HOVER_DELAY = 250                           # ms before a hovered GIF starts playing
+
+def thumb_path(path):
+    """Cache file for a GIF's thumbnail, or None if the GIF is gone"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}\0{THUMB_SIZE}"
+    return os.path.join(THUMB_DIR, hashlib.sha1(key.encode("utf-8", "surrogatepass")).hexdigest() + ".png")
+
+def make_thumbnail(path):
+    """First frame scaled to THUMB_SIZE, from the disk cache when possible; null QImage on failure"""
+    cached = thumb_path(path)
+    if cached is None:
+        return QImage()
+    image = QImage(cached)
+    if not image.isNull():
+        return image
+    reader = QImageReader(path)
+    size = reader.size()
+    if size.isValid() and max(size.width(), size.height()) > THUMB_SIZE:
+        # Some formats decode straight at the smaller size
+        reader.setScaledSize(size.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image
+    if max(image.width(), image.height()) > THUMB_SIZE:
+        image = image.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    try:
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        tmp = cached + ".part"
+        if image.save(tmp, "PNG"):
+            os.replace(tmp, cached)
+    except OSError as e:
+        print(f"Warning: Could not cache GIF thumbnail: {e}")
+    return image
+
+def prune(paths):
+    """Delete cached thumbnails that belong to none of these GIFs"""
+    keep = {os.path.basename(p) for p in map(thumb_path, paths) if p}
+    try:
+        names = os.listdir(THUMB_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name not in keep:
+            try:
+                os.remove(os.path.join(THUMB_DIR, name))
+            except OSError:
+                pass
+
+
+class ThumbnailSignals(QObject):
+    done = pyqtSignal(str, QImage)
+
+
+class ThumbnailJob(QRunnable):
+    """Make one thumbnail in the thread pool"""
+
+    def __init__(self, path, signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        self.signals.done.emit(self.path, make_thumbnail(self.path))
+
+
+class PruneJob(QRunnable):
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+
+    def run(self):
+        prune(self.paths)
+
+
+class GifGridModel(QAbstractListModel):
+    """GIF paths with lazily made thumbnails"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.gifs = []
+        self._rows = {}                     # path -> row
+        self._pixmaps = OrderedDict()       # path -> QPixmap (None = no thumbnail possible)
+        self._requested = set()
+        self._priority = 0                  # grows with each request, so newer ones run first
+        self._pruned = False
+        self.preview = None                 # (row, QPixmap) of the GIF playing under the mouse
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, QThreadPool.globalInstance().maxThreadCount() - 1))
+        self.signals = ThumbnailSignals(self)
+        self.signals.done.connect(self._on_thumbnail)
+
+        self.placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+        self.placeholder.fill(QColor(45, 45, 45))
+
+    def set_gifs(self, gifs):
+        self.beginResetModel()
+        self.gifs = list(gifs)
+        self._rows = {path: row for row, path in enumerate(self.gifs)}
+        self.preview = None
+        self.endResetModel()
+        if not self._pruned and self.gifs:
+            # Once per session, drop thumbnails of GIFs removed or changed since
+            self._pruned = True
+            self.pool.start(PruneJob(self.gifs), -1)
+
+    def stop(self):
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    # ---------- Qt model interface ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.gifs)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.gifs[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole:
+            return path
+        if role == Qt.DecorationRole:
+            if self.preview is not None and self.preview[0] == index.row():
+                return self.preview[1]
+            return self._thumbnail(path)
+        return None
+
+    # ---------- Thumbnails ----------
+    def _thumbnail(self, path):
+        if path in self._pixmaps:
+            self._pixmaps.move_to_end(path)
+            return self._pixmaps[path] or self.placeholder
+        if path not in self._requested:
+            self._requested.add(path)
+            self._priority += 1
+            self.pool.start(ThumbnailJob(path, self.signals), self._priority)
+        return self.placeholder
+
+    def _on_thumbnail(self, path, image):
+        self._requested.discard(path)
+        self._pixmaps[path] = None if image.isNull() else QPixmap.fromImage(image)
+        if len(self._pixmaps) > MAX_PIXMAPS:
+            self._pixmaps.popitem(last=False)
+        row = self._rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def set_preview(self, row, pixmap):
+        """Show pixmap in place of a row's thumbnail; row -1 ends the preview"""
+        previous = self.preview[0] if self.preview else -1
+        self.preview = (row, pixmap) if row >= 0 else None
+        for changed in {previous, row} - {-1}:
+            if changed < len(self.gifs):
+                index = self.index(changed)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class GifGridView(QListView):
+    """Icon grid over a GifGridModel that plays the hovered GIF"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)      # no per-item size queries for a big collection
+        self.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.setGridSize(QSize(THUMB_SIZE + 28, THUMB_SIZE + 36))
+        self.setTextElideMode(Qt.ElideMiddle)
+        self.setWordWrap(False)
+        self.setMouseTracking(True)
+
+        self.hover_row = -1
+        self.movie = None
+        self.hover_timer = QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        self.hover_timer.setInterval(HOVER_DELAY)
+        self.hover_timer.timeout.connect(self.start_preview)
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        row = self.indexAt(event.pos()).row()
+        if row != self.hover_row:
+            self.stop_preview()
+            self.hover_row = row
+            if row >= 0:
+                self.hover_timer.start()
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self.stop_preview()
+        self.hover_row = -1
+
+    def start_preview(self):
+        model = self.model()
+        if model is None or not 0 <= self.hover_row < model.rowCount():
+            return
+        path = model.gifs[self.hover_row]
+        if utils.is_video_loop(path):
+            return
+        self.movie = QMovie(path, parent=self)
+        if not self.movie.isValid():
+            self.movie = None
+            return
+        # Decode at thumbnail size, not full size
+        size = QImageReader(path).size()
+        if size.isValid():
+            self.movie.setScaledSize(size.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio))
+        row, movie = self.hover_row, self.movie
+        movie.frameChanged.connect(lambda _: model.set_preview(row, movie.currentPixmap()))
+        movie.start()
+
+    def stop_preview(self):
+        self.hover_timer.stop()
+        if self.movie is not None:
+            self.movie.stop()
+            self.movie.deleteLater()
+            self.movie = None
+        model = self.model()
+        if model is not None and model.preview is not None:
+            model.set_preview(-1, None)
@@ -0,0 +1,212 @@
+# gif_rules.py
+import fnmatch
+import os
+import re
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# A rule is {"kind": <kind>, "value": <value>, "gifs": [gif paths]}:
+#   folder:   <directory>            (songs anywhere below it)
+#   pattern:  <glob>                 (file name, case-insensitive, e.g. "*remix*")
+#   artist:   <name>                 (case-insensitive)
+#   tempo:    [min_bpm, max_bpm]     (either end may be null)
+KINDS = ("folder", "pattern", "artist", "tempo")
+
+TEMPO_BUCKET = 10                           # bpm per tempo bucket
+MAX_BPM = 400
+
+def valid_rule(rule):
+    if not (isinstance(rule, dict) and rule.get("kind") in KINDS
+            and isinstance(rule.get("gifs"), list) and rule["gifs"]):
+        return False
+    value = rule.get("value")
+    if rule["kind"] == "tempo":
+        return (isinstance(value, list) and len(value) == 2
+                and all(v is None or isinstance(v, (int, float)) for v in value))
+    return isinstance(value, str) and bool(value.strip())
+
+def _folder_key(path):
+    return os.path.normcase(os.path.normpath(path))
+
+def _longest_literal(pattern):
+    """Longest run of plain characters in a glob, outside [...] sets"""
+    runs = re.split(r"\[[^\]]*\]|[*?\[]", pattern)
+    return max(runs, key=len)
+
+
+class GifRuleIndex:
+    """
+    Rules compiled into lookup structures, so finding the rules that apply
+    to a song costs time proportional to the rules that match, not to the
+    number of rules:
+
+    - folder rules: dict keyed by folder, probed for each parent of the song
+    - artist rules: dict keyed by casefolded artist
+    - tempo rules:  dict of 10-bpm buckets, then an exact band check
+    - pattern rules: filed under one three-letter piece (the least used
+      one) of the longest literal part of the glob, e.g. the "remix" in
+      "*remix*"; a file name only checks patterns filed under its own
+      trigrams
+    """
+
+    def __init__(self, rules=()):
+        self.rules = [r for r in rules if valid_rule(r)]
+        self.by_folder = {}
+        self.by_artist = {}
+        self.by_tempo = {}
+        self.by_trigram = {}                # trigram -> [(rule id, compiled glob)]
+        self.unindexed = []                 # [(rule id, compiled glob)] without a usable literal
+
+        for rule_id, rule in enumerate(self.rules):
+            kind, value = rule["kind"], rule["value"]
+            if kind == "folder":
+                self.by_folder.setdefault(_folder_key(value), []).append(rule_id)
+            elif kind == "artist":
+                self.by_artist.setdefault(value.strip().casefold(), []).append(rule_id)
+            elif kind == "tempo":
+                low = int(value[0] or 0)
+                high = int(value[1] if value[1] is not None else MAX_BPM)
+                for bucket in range(max(0, low) // TEMPO_BUCKET, min(high, MAX_BPM) // TEMPO_BUCKET + 1):
+                    self.by_tempo.setdefault(bucket, []).append(rule_id)
+            elif kind == "pattern":
+                glob = value.strip().casefold()
+                entry = (rule_id, re.compile(fnmatch.translate(glob)))
+                literal = _longest_literal(glob)
+                if len(literal) >= 3:
+                    trigram = min((literal[i:i + 3] for i in range(len(literal) - 2)),
+                                  key=lambda t: len(self.by_trigram.get(t, ())))
+                    self.by_trigram.setdefault(trigram, []).append(entry)
+                else:
+                    self.unindexed.append(entry)
+
+    def match(self, path, record=None):
+        """Ids of the rules that apply to a song, in rule order"""
+        matched = []
+
+        if self.by_folder:
+            folder = _folder_key(os.path.dirname(path))
+            while True:
+                matched.extend(self.by_folder.get(folder, ()))
+                parent = os.path.dirname(folder)
+                if parent == folder:
+                    break
+                folder = parent
+
+        if self.by_trigram or self.unindexed:
+            name = os.path.basename(path).casefold()
+            candidates = list(self.unindexed)
+            if self.by_trigram:
+                for trigram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                    candidates.extend(self.by_trigram.get(trigram, ()))
+            matched.extend(rule_id for rule_id, glob in candidates if glob.match(name))
+
+        if record is not None:
+            if self.by_artist and record.artist:
+                matched.extend(self.by_artist.get(record.artist.casefold(), ()))
+            if self.by_tempo and record.bpm:
+                for rule_id in self.by_tempo.get(min(record.bpm, MAX_BPM) // TEMPO_BUCKET, ()):
+                    low, high = self.rules[rule_id]["value"]
+                    if (low is None or record.bpm >= low) and (high is None or record.bpm <= high):
+                        matched.append(rule_id)
+
+        matched.sort()
+        return matched
+
+    def gifs_for(self, path, record=None):
+        """GIFs of all matching rules, first rule first, without repeats"""
+        gifs = []
+        for rule_id in self.match(path, record):
+            gifs.extend(self.rules[rule_id]["gifs"])
+        return list(dict.fromkeys(gifs))
+
+
+class GifAssigner(QObject):
+    """
+    Resolve the GIF set of every song from the rules ahead of time.
+
+    Results are cached per track and filled in for the whole library in
+    small batches from the event loop, so the lookup on a song change is a
+    dictionary hit. Songs are re-resolved when their tags change, and the
+    whole cache is rebuilt when the rules change.
+    """
+    resolved = pyqtSignal()                 # emits when a full precompute pass is done
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, music_player, library_index, parent=None):
+        super().__init__(parent)
+        self.music_player = music_player
+        self.library_index = library_index
+        self.index = GifRuleIndex()
+        self._cache = {}                    # track id -> tuple of GIFs
+        self._cache_table = None            # TrackTable the cached ids belong to
+        self._shared = {}                   # one tuple object per distinct GIF set
+        self._next = 0                      # next playlist position to precompute
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+
+    @property
+    def rules(self):
+        return self.index.rules
+
+    def set_rules(self, rules):
+        self.index = GifRuleIndex(rules)
+        self.invalidate_all()
+
+    def invalidate_all(self):
+        self._cache = {}
+        self._shared = {}
+        self._cache_table = self.music_player.tracks
+        self._next = 0
+        if self.index.rules:
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def invalidate(self, paths):
+        lookup = self.music_player.tracks.lookup
+        for path in paths:
+            track_id = lookup(path)
+            if track_id is not None:
+                self._cache.pop(track_id, None)
+
+    def resume(self):
+        """Precompute songs added since the last pass"""
+        if self.index.rules and self._next < len(self.music_player.order):
+            self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _resolve(self, path):
+        gifs = tuple(self.index.gifs_for(path, self.library_index.records.get(path)))
+        return self._shared.setdefault(gifs, gifs)
+
+    def gifs_for(self, path):
+        """GIFs the rules give a song (cached)"""
+        if not self.index.rules or not path:
+            return []
+        if self._cache_table is not self.music_player.tracks:
+            self.invalidate_all()
+        track_id = self.music_player.tracks.lookup(path)
+        if track_id is None:
+            return list(self._resolve(path))
+        gifs = self._cache.get(track_id)
+        if gifs is None:
+            gifs = self._cache[track_id] = self._resolve(path)
+        return list(gifs)
+
+    def _step(self):
+        if self._cache_table is not self.music_player.tracks:
+            self.invalidate_all()
+        order = self.music_player.order
+        tracks = self.music_player.tracks
+        end = min(self._next + self.BATCH_SIZE, len(order))
+        for position in range(self._next, end):
+            track_id = order[position]
+            if track_id not in self._cache:
+                self._cache[track_id] = self._resolve(tracks.path(track_id))
+        self._next = end
+        if end >= len(order):
+            self._timer.stop()
+            self.resolved.emit()
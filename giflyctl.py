@@ -0,0 +1,105 @@
+# giflyctl.py
+"""
+Control a running Gifly from the command line.
+
+Only the standard library is used, so a command takes milliseconds
+instead of starting Qt:
+
+    python giflyctl.py status
+    python giflyctl.py toggle
+    python giflyctl.py enqueue song1.mp3 song2.flac
+"""
+import json
+import os
+import socket
+import sys
+import utils
+
+TIMEOUT = 2.0
+
+COMMANDS = ("play", "pause", "toggle", "stop", "next", "prev",
+            "enqueue", "volume", "status", "top", "show", "quit", "ping")
+
+def connect(timeout=TIMEOUT):
+    """Open a connection to the running instance, or return None"""
+    address = utils.get_control_address()
+    if sys.platform == "win32":
+        try:
+            return open("\\\\.\\pipe\\" + address, "r+b", buffering=0)
+        except OSError:
+            return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        return None
+    conn = sock.makefile("rwb")
+    sock.close()    # the file object keeps the connection open
+    return conn
+
+def send_commands(lines, timeout=TIMEOUT):
+    """Send request lines to the running instance.
+    Returns the reply lines, or None if Gifly is not running."""
+    conn = connect(timeout)
+    if conn is None:
+        return None
+    replies = []
+    try:
+        with conn:
+            conn.write(b"".join(line.encode("utf-8") + b"\n" for line in lines))
+            conn.flush()
+            for _ in lines:
+                reply = conn.readline()
+                if not reply:
+                    break
+                replies.append(reply.decode("utf-8").rstrip("\r\n"))
+    except OSError as e:
+        print(f"Warning: Lost connection to Gifly: {e}", file=sys.stderr)
+    return replies
+
+def format_status(payload):
+    status = json.loads(payload)
+    song = os.path.basename(status.get("path") or "") or "No song"
+    return (f"{status['state']}: {song} "
+            f"[{utils.format_time(status['position'])}/{utils.format_time(status['duration'])}] "
+            f"track {status['index'] + 1}/{status['count']}, queue {status['queue']}, "
+            f"volume {status['volume']}")
+
+def main(argv):
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: giflyctl.py {{{','.join(COMMANDS)}}} [args...]", file=sys.stderr)
+        return 2
+
+    command, args = argv[0], argv[1:]
+    if command == "enqueue":
+        if not args:
+            print("enqueue needs at least one file", file=sys.stderr)
+            return 2
+        lines = [f"enqueue {path if utils.is_stream_url(path) else os.path.abspath(path)}" for path in args]
+    else:
+        lines = [" ".join([command] + args)]
+
+    replies = send_commands(lines)
+    if replies is None:
+        print("Gifly is not running", file=sys.stderr)
+        return 1
+
+    status = 0
+    for reply in replies:
+        ok, _, payload = reply.partition(" ")
+        if ok != "OK":
+            print(reply, file=sys.stderr)
+            status = 3
+        elif command == "status":
+            print(format_status(payload))
+        elif command == "top":
+            for plays, path in json.loads(payload):
+                print(f"{plays:6d}  {path}")
+        elif payload:
+            print(payload)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
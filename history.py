@@ -0,0 +1,205 @@
+# history.py
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtMultimedia import QMediaPlayer
+import utils
+
+HISTORY_FILE = os.path.join(utils.get_config_dir(), "history.db")
+
+# Event kinds, stored as small integers
+EVENT_START = 0
+EVENT_SKIP = 1
+EVENT_FINISH = 2
+EVENT_POSITION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS events (
+    ts INTEGER NOT NULL,
+    track INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    track INTEGER PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0,
+    skips INTEGER NOT NULL DEFAULT 0,
+    finishes INTEGER NOT NULL DEFAULT 0,
+    listened_ms INTEGER NOT NULL DEFAULT 0,
+    last_played INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS stats_by_plays ON stats (plays DESC);
+CREATE INDEX IF NOT EXISTS stats_by_last_played ON stats (last_played DESC);
+"""
+
+class HistoryStore:
+    """
+    Append-only log of play events plus per-track aggregates.
+
+    Events are buffered in memory and written in one transaction per batch.
+    The same transaction folds the batch into the stats table, so play
+    counts, skip rate and last played are always a single indexed lookup
+    and never require scanning the event log.
+    """
+
+    def __init__(self, path=HISTORY_FILE, batch_size=64):
+        self.batch_size = batch_size
+        self._pending = []          # (ts, path, kind, position)
+        self._track_ids = {}
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    # ---------- Writing ----------
+    def record(self, path, kind, position=0):
+        """Log one event; it reaches disk with the next batch"""
+        if not path:
+            return
+        self._pending.append((int(time.time()), path, kind, max(0, int(position))))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def _track_id(self, path):
+        track_id = self._track_ids.get(path)
+        if track_id is None:
+            self.db.execute("INSERT OR IGNORE INTO tracks (path) VALUES (?)", (path,))
+            track_id = self.db.execute("SELECT id FROM tracks WHERE path = ?", (path,)).fetchone()[0]
+            self._track_ids[path] = track_id
+        return track_id
+
+    def flush(self):
+        """Write buffered events and fold them into the aggregates"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            with self.db:
+                rows = []
+                # track -> [plays, skips, finishes, listened_ms, last_played]
+                deltas = defaultdict(lambda: [0, 0, 0, 0, 0])
+                for ts, path, kind, position in pending:
+                    track_id = self._track_id(path)
+                    rows.append((ts, track_id, kind, position))
+                    delta = deltas[track_id]
+                    if kind == EVENT_START:
+                        delta[0] += 1
+                        delta[4] = max(delta[4], ts)
+                    elif kind == EVENT_SKIP:
+                        delta[1] += 1
+                        delta[3] += position
+                    elif kind == EVENT_FINISH:
+                        delta[2] += 1
+                        delta[3] += position
+
+                self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?)", rows)
+                self.db.executemany("""
+                    INSERT INTO stats (track, plays, skips, finishes, listened_ms, last_played)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (track) DO UPDATE SET
+                        plays = plays + excluded.plays,
+                        skips = skips + excluded.skips,
+                        finishes = finishes + excluded.finishes,
+                        listened_ms = listened_ms + excluded.listened_ms,
+                        last_played = MAX(last_played, excluded.last_played)
+                """, [(track_id, *delta) for track_id, delta in deltas.items()])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not write play history: {e}")
+            self._track_ids.clear()
+
+    # ---------- Queries ----------
+    @staticmethod
+    def _stats_dict(row):
+        path, plays, skips, finishes, listened_ms, last_played = row
+        return {
+            "path": path,
+            "plays": plays,
+            "skips": skips,
+            "finishes": finishes,
+            "skip_rate": skips / plays if plays else 0.0,
+            "listened_ms": listened_ms,
+            "last_played": last_played,
+        }
+
+    def _query_stats(self, where="", order="", params=()):
+        self.flush()
+        return [self._stats_dict(row) for row in self.db.execute(f"""
+            SELECT t.path, s.plays, s.skips, s.finishes, s.listened_ms, s.last_played
+            FROM stats s JOIN tracks t ON t.id = s.track {where} {order}
+        """, params)]
+
+    def stats_for(self, path):
+        rows = self._query_stats("WHERE t.path = ?", params=(path,))
+        return rows[0] if rows else None
+
+    def most_played(self, limit=25):
+        return self._query_stats("WHERE s.plays > 0", "ORDER BY s.plays DESC LIMIT ?", (limit,))
+
+    def recently_played(self, limit=25):
+        return self._query_stats("WHERE s.last_played > 0", "ORDER BY s.last_played DESC LIMIT ?", (limit,))
+
+    def play_counts(self):
+        """Return {path: plays} for every track that was ever started"""
+        self.flush()
+        return dict(self.db.execute(
+            "SELECT t.path, s.plays FROM stats s JOIN tracks t ON t.id = s.track"
+        ))
+
+
+class PlayTracker(QObject):
+    """Turn MusicPlayer signals into history events"""
+    played = pyqtSignal(str)                # emits a path each time a play is counted
+
+    def __init__(self, music_player, store, parent=None):
+        super().__init__(parent)
+        self.music_player = music_player
+        self.store = store
+        self._current = ""
+        self._started = False
+        self._finished = False
+        self._position = 0
+
+        music_player.song_changed.connect(self._on_song_changed)
+        music_player.state_changed.connect(self._on_state_changed)
+        music_player.position_changed.connect(self._on_position_changed)
+        music_player.finished.connect(self._on_finished)
+
+    def _close_current(self):
+        # Moving on from a track that was started but did not finish is a skip
+        if self._current and self._started and not self._finished:
+            self.store.record(self._current, EVENT_SKIP, self._position)
+
+    def _on_song_changed(self, path):
+        self._close_current()
+        self._current = path
+        self._started = False
+        self._finished = False
+        self._position = 0
+
+    def _on_state_changed(self, state):
+        if state == QMediaPlayer.PlayingState:
+            if self._current and not self._started:
+                self._started = True
+                self.store.record(self._current, EVENT_START, self._position)
+                self.played.emit(self._current)
+        elif state == QMediaPlayer.PausedState and self._started:
+            self.store.record(self._current, EVENT_POSITION, self._position)
+
+    def _on_position_changed(self, position):
+        self._position = position
+
+    def _on_finished(self):
+        if self._current and self._started and not self._finished:
+            self._finished = True
+            duration = self.music_player.get_duration()
+            self.store.record(self._current, EVENT_FINISH, max(duration, self._position))
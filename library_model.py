@@ -0,0 +1,219 @@
+# library_model.py
+import re
+import time
+from array import array
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QFont
+import utils
+
+# (key, header) for each column
+COLUMNS = (
+    ("title", "Title"),
+    ("artist", "Artist"),
+    ("album", "Album"),
+    ("duration", "Time"),
+    ("added", "Added"),
+    ("plays", "Plays"),
+)
+NUMERIC_COLUMNS = ("duration", "added", "plays")
+COVER_SIZE = 24                             # px of the cover shown next to titles
+
+_DIGITS = re.compile(r"[0-9]+")
+
+def _number_key(match):
+    digits = match.group().lstrip("0") or "0"
+    return f"{len(digits):03d}{digits}"
+
+def natural_key(text):
+    """Case-insensitive sort key that orders embedded numbers by value, so
+    "Track 2" comes before "Track 10". It is a plain string, so comparing
+    two keys is a single C-level string comparison."""
+    return _DIGITS.sub(_number_key, text.casefold())
+
+
+class LibraryModel(QAbstractTableModel):
+    """
+    Songs table backed directly by the player's track table.
+
+    Cells are produced on demand from track ids, so the view holds no
+    per-song items. Filtering and sorting only change `rows`, a
+    permutation of playlist positions; the playlist order (and with it
+    MusicPlayer.current_index) is never touched.
+
+    Sort keys are computed once per track and column and cached until
+    that track's metadata changes, so re-sorting is a single sort over a
+    list of ready-made keys. The sort is stable: equal keys keep their
+    playlist order.
+    """
+
+    def __init__(self, music_player, library_index, art=None, parent=None):
+        super().__init__(parent)
+        self.music_player = music_player
+        self.library_index = library_index
+        self.art = art                      # AlbumArt for covers next to titles, or None
+        self.filter_text = ""
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.rows = None                    # playlist positions in display order, or None for playlist order
+        self._keys = {}                     # column -> {track id: sort key}
+        self._keys_table = None             # TrackTable the cached ids belong to
+
+    # ---------- Qt model interface ----------
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.rows is not None:
+            return len(self.rows)
+        return len(self.music_player.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section][1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        position = self.playlist_index(index.row())
+        column = COLUMNS[index.column()][0]
+        if role == Qt.DisplayRole:
+            return self._display(column, self.music_player.order[position])
+        if role == Qt.ToolTipRole:
+            return self.music_player.tracks.path(self.music_player.order[position])
+        if role == Qt.DecorationRole and column == "title" and self.art is not None:
+            return self.art.pixmap(self.music_player.tracks.path(self.music_player.order[position]),
+                                   COVER_SIZE)
+        if role == Qt.FontRole and position == self.music_player.current_index:
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == Qt.TextAlignmentRole and column in NUMERIC_COLUMNS:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh()
+
+    # ---------- Cells and keys ----------
+    def _record(self, track_id):
+        return self.library_index.records.get(self.music_player.tracks.path(track_id))
+
+    def _display(self, column, track_id):
+        record = self._record(track_id)
+        if column == "title":
+            return record.title if record else self.music_player.tracks.name(track_id)
+        if record is None:
+            return ""
+        if column == "artist":
+            return record.artist
+        if column == "album":
+            return record.album
+        if column == "duration":
+            return utils.format_time(record.duration_ms) if record.duration_ms else ""
+        if column == "added":
+            return time.strftime("%Y-%m-%d", time.localtime(record.added)) if record.added else ""
+        if column == "plays":
+            return str(self.library_index.plays.get(record.path, 0))
+        return ""
+
+    def _compute_key(self, column, track_id):
+        record = self._record(track_id)
+        if column == "title":
+            return natural_key(record.title if record else self.music_player.tracks.name(track_id))
+        if column in ("artist", "album"):
+            return natural_key(getattr(record, column)) if record else ""
+        if record is None:
+            return 0
+        if column == "duration":
+            return record.duration_ms
+        if column == "added":
+            return record.added
+        return self.library_index.plays.get(record.path, 0)
+
+    def _sort_keys(self, column):
+        """Sort keys by playlist position, from the cache where possible"""
+        tracks = self.music_player.tracks
+        if self._keys_table is not tracks:
+            # The table was replaced (library cleared), so old ids mean nothing
+            self._keys = {}
+            self._keys_table = tracks
+        cache = self._keys.setdefault(column, {})
+        keys = []
+        for track_id in self.music_player.order:
+            key = cache.get(track_id)
+            if key is None:
+                key = cache[track_id] = self._compute_key(column, track_id)
+            keys.append(key)
+        return keys
+
+    def invalidate(self, paths):
+        """Forget cached keys of tracks whose metadata or play count changed"""
+        lookup = self.music_player.tracks.lookup
+        for path in paths:
+            track_id = lookup(path)
+            if track_id is not None:
+                for cache in self._keys.values():
+                    cache.pop(track_id, None)
+
+    def _matches(self, needle, track_id):
+        if needle in self.music_player.tracks.name(track_id).lower():
+            return True
+        record = self._record(track_id)
+        return record is not None and (needle in record.title.lower()
+                                       or needle in record.artist.lower()
+                                       or needle in record.album.lower())
+
+    # ---------- Rows ----------
+    def playlist_index(self, row):
+        """Playlist position of a model row"""
+        return self.rows[row] if self.rows is not None else row
+
+    def is_playlist_order(self):
+        """Whether rows are exactly the playlist positions"""
+        return self.rows is None
+
+    def set_filter(self, text):
+        self.filter_text = text.lower()
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild rows after the playlist, filter or sort changed"""
+        self.beginResetModel()
+        order = self.music_player.order
+        if self.filter_text:
+            needle = self.filter_text
+            positions = [i for i, track_id in enumerate(order) if self._matches(needle, track_id)]
+        else:
+            positions = None
+        if 0 <= self.sort_column < len(COLUMNS):
+            keys = self._sort_keys(COLUMNS[self.sort_column][0])
+            positions = sorted(range(len(order)) if positions is None else positions,
+                               key=keys.__getitem__,
+                               reverse=self.sort_order == Qt.DescendingOrder)
+        self.rows = None if positions is None else array("I", positions)
+        self.endResetModel()
+
+    def tracks_changed(self, paths):
+        """Metadata or play counts changed for some tracks"""
+        self.invalidate(paths)
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self.rowCount() - 1, len(COLUMNS) - 1))
+
+    def covers_changed(self):
+        """Repaint the covers next to titles"""
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0),
+                                  [Qt.DecorationRole])
+
+    def current_changed(self):
+        """Repaint so the bold current-song row follows playback"""
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self.rowCount() - 1, len(COLUMNS) - 1),
+                                  [Qt.FontRole])
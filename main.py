@@ -4,13 +4,25 @@ import os
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget,
     QFileDialog, QSlider, QLabel, QListWidget, QHBoxLayout, QMenu,
-    QTabWidget, QMessageBox, QGroupBox, QSplitter, QLineEdit
+    QTabWidget, QMessageBox, QGroupBox, QSplitter, QLineEdit,
+    QDialog, QFormLayout, QSpinBox, QComboBox, QDialogButtonBox, QListWidgetItem,
+    QTableView, QHeaderView, QAbstractItemView, QShortcut, QCheckBox, QInputDialog
 )
-from PyQt5.QtCore import Qt, QTimer, QRect, QSize
-from PyQt5.QtGui import QIcon, QPainter, QColor, QFont
+from PyQt5.QtCore import Qt, QTimer, QPoint, QRect, QSize, QItemSelection, QItemSelectionModel
+from PyQt5.QtGui import QIcon, QPainter, QColor, QFont, QKeySequence
 from PyQt5.QtMultimedia import QMediaPlayer
-from player import MusicPlayer
 from dock import GifDock
+from dock_hub import DockHub
+from audio_analysis import AudioAnalyzer, speed_for
+from dsp import EQ_BANDS, EQ_PRESETS, EQ_RANGE
+from frame_cache import FrameStore
+from core import GiflyCore
+from dedupe import DuplicateScanThread, duplicate_extras
+from library_model import LibraryModel, COVER_SIZE
+from gif_grid import GifGridModel, GifGridView
+from playlist_io import PLAYLIST_EXTENSIONS
+from gif_rules import valid_rule
+import giflyctl
 import utils
 
 # Professional color scheme - Dark theme with subtle accents
@@ -29,28 +41,286 @@ COLORS = {
     'danger': '#da3633'        # Danger red
 }
 
+def dialog_style():
+    return f"""
+        QDialog {{ background: {COLORS['panel']}; }}
+        QLabel {{ color: {COLORS['text']}; }}
+        QLineEdit, QSpinBox, QComboBox, QListWidget {{
+            background: {COLORS['panel_light']};
+            border: 1px solid {COLORS['border']};
+            border-radius: 4px;
+            padding: 6px;
+            color: {COLORS['text']};
+        }}
+        QPushButton {{
+            background: {COLORS['panel_light']};
+            border: 1px solid {COLORS['border']};
+            border-radius: 4px;
+            padding: 6px 12px;
+            color: {COLORS['text']};
+        }}
+    """
+
+def make_gif_checklist(gifs, checked=()):
+    """A list of GIFs with a checkbox each"""
+    checked = set(checked)
+    widget = QListWidget()
+    for gif in gifs:
+        item = QListWidgetItem(os.path.basename(gif))
+        item.setToolTip(gif)
+        item.setData(Qt.UserRole, gif)
+        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+        item.setCheckState(Qt.Checked if gif in checked else Qt.Unchecked)
+        widget.addItem(item)
+    return widget
+
+def checked_gifs(widget):
+    return [widget.item(i).data(Qt.UserRole) for i in range(widget.count())
+            if widget.item(i).checkState() == Qt.Checked]
+
+class SmartPlaylistDialog(QDialog):
+    """Collect the rules of a smart playlist; empty fields are ignored"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("New Smart Playlist")
+        self.setMinimumWidth(360)
+        self.setStyleSheet(dialog_style())
+        form = QFormLayout(self)
+
+        self.nameEdit = QLineEdit()
+        self.genreEdit = QLineEdit()
+        self.artistEdit = QLineEdit()
+        self.minDuration = self.make_spin(" s")
+        self.maxDuration = self.make_spin(" s")
+        self.minPlays = self.make_spin("")
+        self.maxPlays = self.make_spin("")
+        self.addedDays = self.make_spin(" days")
+        self.matchCombo = QComboBox()
+        self.matchCombo.addItems(["Match all rules", "Match any rule"])
+
+        form.addRow("Name", self.nameEdit)
+        form.addRow("Genre", self.genreEdit)
+        form.addRow("Artist", self.artistEdit)
+        form.addRow("Longer than", self.minDuration)
+        form.addRow("Shorter than", self.maxDuration)
+        form.addRow("Played at least", self.minPlays)
+        form.addRow("Played at most", self.maxPlays)
+        form.addRow("Added in the last", self.addedDays)
+        form.addRow("", self.matchCombo)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        form.addRow(buttons)
+
+    @staticmethod
+    def make_spin(suffix):
+        spin = QSpinBox()
+        spin.setRange(-1, 100000)
+        spin.setValue(-1)
+        spin.setSpecialValueText("Any")
+        spin.setSuffix(suffix)
+        return spin
+
+    def rules(self):
+        rules = []
+        if self.genreEdit.text().strip():
+            rules.append({"field": "genre", "value": self.genreEdit.text().strip()})
+        if self.artistEdit.text().strip():
+            rules.append({"field": "artist", "value": self.artistEdit.text().strip()})
+        low, high = self.minDuration.value(), self.maxDuration.value()
+        if low >= 0 or high >= 0:
+            rules.append({"field": "duration", "value": [low if low >= 0 else None, high if high >= 0 else None]})
+        low, high = self.minPlays.value(), self.maxPlays.value()
+        if low >= 0 or high >= 0:
+            rules.append({"field": "plays", "value": [low if low >= 0 else None, high if high >= 0 else None]})
+        if self.addedDays.value() >= 0:
+            rules.append({"field": "added", "value": self.addedDays.value()})
+        return rules
+
+    def match(self):
+        return "any" if self.matchCombo.currentIndex() == 1 else "all"
+
+
+class GifPickerDialog(QDialog):
+    """Choose GIFs for the selected songs"""
+
+    def __init__(self, gifs, checked=(), parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Assign GIFs")
+        self.setMinimumSize(360, 420)
+        self.setStyleSheet(dialog_style())
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("GIFs shown while these songs play:"))
+        self.gifList = make_gif_checklist(gifs, checked)
+        layout.addWidget(self.gifList)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def selected(self):
+        return checked_gifs(self.gifList)
+
+
+class GifRulesDialog(QDialog):
+    """Edit the rules that pick GIFs for songs automatically"""
+    KIND_LABELS = (("folder", "Folder"), ("pattern", "File name pattern"),
+                   ("artist", "Artist"), ("tempo", "Tempo"))
+
+    def __init__(self, rules, gifs, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("GIF Rules")
+        self.setMinimumSize(460, 560)
+        self.setStyleSheet(dialog_style())
+        self.rules = [dict(rule) for rule in rules]
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Songs without their own GIFs use the GIFs of every matching rule:"))
+        self.ruleList = QListWidget()
+        layout.addWidget(self.ruleList)
+        removeBtn = QPushButton("Remove Rule")
+        removeBtn.clicked.connect(self.remove_rule)
+        layout.addWidget(removeBtn)
+
+        form = QFormLayout()
+        self.kindCombo = QComboBox()
+        self.kindCombo.addItems([label for _, label in self.KIND_LABELS])
+        self.kindCombo.currentIndexChanged.connect(self.update_form)
+        self.valueEdit = QLineEdit()
+        self.browseBtn = QPushButton("Browse...")
+        self.browseBtn.clicked.connect(self.browse_folder)
+        valueRow = QHBoxLayout()
+        valueRow.addWidget(self.valueEdit)
+        valueRow.addWidget(self.browseBtn)
+        self.minBpm = SmartPlaylistDialog.make_spin(" bpm")
+        self.maxBpm = SmartPlaylistDialog.make_spin(" bpm")
+        self.gifList = make_gif_checklist(gifs)
+        form.addRow("Match by", self.kindCombo)
+        form.addRow("Value", valueRow)
+        form.addRow("From", self.minBpm)
+        form.addRow("To", self.maxBpm)
+        form.addRow("GIFs", self.gifList)
+        layout.addLayout(form)
+        addBtn = QPushButton("Add Rule")
+        addBtn.clicked.connect(self.add_rule)
+        layout.addWidget(addBtn)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.refresh_rules()
+        self.update_form()
+
+    def kind(self):
+        return self.KIND_LABELS[self.kindCombo.currentIndex()][0]
+
+    def update_form(self):
+        kind = self.kind()
+        self.valueEdit.setEnabled(kind != "tempo")
+        self.browseBtn.setEnabled(kind == "folder")
+        self.minBpm.setEnabled(kind == "tempo")
+        self.maxBpm.setEnabled(kind == "tempo")
+        self.valueEdit.setPlaceholderText({"folder": "Folder path", "pattern": "e.g. *remix*",
+                                           "artist": "Artist name"}.get(kind, ""))
+
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Choose Folder")
+        if folder:
+            self.valueEdit.setText(folder)
+
+    @staticmethod
+    def describe(rule):
+        value = rule["value"]
+        if rule["kind"] == "tempo":
+            low, high = value
+            value = f"{low if low is not None else 'any'}-{high if high is not None else 'any'} bpm"
+        label = dict(GifRulesDialog.KIND_LABELS)[rule["kind"]]
+        return f"{label}: {value}  →  {len(rule['gifs'])} GIF(s)"
+
+    def refresh_rules(self):
+        self.ruleList.clear()
+        for rule in self.rules:
+            self.ruleList.addItem(self.describe(rule))
+
+    def add_rule(self):
+        kind = self.kind()
+        if kind == "tempo":
+            low, high = self.minBpm.value(), self.maxBpm.value()
+            value = [low if low >= 0 else None, high if high >= 0 else None]
+        else:
+            value = self.valueEdit.text().strip()
+        rule = {"kind": kind, "value": value, "gifs": checked_gifs(self.gifList)}
+        if not valid_rule(rule):
+            QMessageBox.warning(self, "GIF Rules", "Please enter a value and check at least one GIF.")
+            return
+        self.rules.append(rule)
+        self.refresh_rules()
+        self.valueEdit.clear()
+
+    def remove_rule(self):
+        row = self.ruleList.currentRow()
+        if 0 <= row < len(self.rules):
+            del self.rules[row]
+            self.refresh_rules()
+
+
 class GiflyPlayer(QMainWindow):
-    def __init__(self):
+    def __init__(self, core=None):
         super().__init__()
         self.setWindowTitle("Gifly - Music Player")
         self.setMinimumSize(1100, 650)
 
-        # Load settings first
-        self.settings = utils.load_settings()
+        # Playback core; a window started on its own owns it, a window
+        # attached to a headless daemon just borrows it
+        self.owns_core = core is None
+        self.core = core if core is not None else GiflyCore()
+        self.settings = self.core.settings
+        self.music_player = self.core.music_player
+        self.song_gifs = self.core.song_gifs
+        self.gif_list = self.core.gif_list
 
-        # Core components
-        self.music_player = MusicPlayer()
         self.music_player.song_changed.connect(self.on_song_changed)
-        self.music_player.finished.connect(self.on_song_finished)
         self.music_player.position_changed.connect(self.update_position)
         self.music_player.duration_changed.connect(self.update_duration)
         self.music_player.state_changed.connect(self.on_state_changed)
+        self.core.library_changed.connect(self.refresh_songs_list)
+        self.core.tracks_changed.connect(self.on_tracks_changed)
+        self.core.art.changed.connect(self.on_covers_changed)
+        self.core.playlists_changed.connect(self.refresh_playlists)
+        self.core.smart_playlists.changed.connect(self.schedule_playlists_refresh)
+        self.core.gifs_changed.connect(self.on_gifs_changed)
+        self.core.assignments_changed.connect(self.refresh_dock_gifs)
+        self.core.volume_changed.connect(self.on_volume_changed)
+        self.core.message.connect(self.show_message)
+        self.core.saving.connect(self.on_saving)
+        self.core.attach_handler = self.bring_to_front
+
+        # Smart playlist results can change many times per second while
+        # tags are being read; the list is refreshed at most once per interval
+        self.playlists_timer = QTimer(self)
+        self.playlists_timer.setSingleShot(True)
+        self.playlists_timer.setInterval(500)
+        self.playlists_timer.timeout.connect(self.refresh_playlists)
+
+        # Same for re-sorting or re-filtering songs while their tags arrive
+        self.songs_timer = QTimer(self)
+        self.songs_timer.setSingleShot(True)
+        self.songs_timer.setInterval(500)
+        self.songs_timer.timeout.connect(self.refresh_songs_list)
 
         # Data
-        self.song_gifs = self.settings.get("song_gifs", {})
-        self.gif_list = self.settings.get("gifs", [])
-        self.dock = None
+        self._dupe_scan = None
+        self.docks = []                     # the first one is the main dock; all share dock_hub
         self._saved_dock_geometry = None
+        self.frame_store = FrameStore(self.settings["frame_memory_mb"] * 1024 * 1024)
+        self.dock_hub = DockHub(self.frame_store, self)
+        self.dock_hub.frames_changed.connect(
+            lambda: self.frameMemoryLabel.setText(self.frame_store.describe()))
+        self.audio_analyzer = None
 
         # Apply theme
         self.apply_theme()
@@ -61,11 +331,6 @@ class GiflyPlayer(QMainWindow):
         # Restore saved state
         self.restore_state()
 
-        # Auto-save timer
-        self.save_timer = QTimer()
-        self.save_timer.timeout.connect(self.save_state)
-        self.save_timer.start(10000)  # Save every 10 seconds
-
     def setup_ui(self):
         """Initialize the user interface"""
         main_widget = QWidget()
@@ -144,6 +409,7 @@ class GiflyPlayer(QMainWindow):
         self.create_playlist_tab()
         self.create_gifs_tab()
         self.create_dock_tab()
+        self.create_equalizer_tab()
 
         layout.addWidget(self.tabs)
         return panel
@@ -185,13 +451,29 @@ class GiflyPlayer(QMainWindow):
         """)
         layout.addWidget(self.searchBox)
 
-        # Songs list
-        self.songsListWidget = QListWidget()
-        self.songsListWidget.itemDoubleClicked.connect(self.play_selected_song)
-        self.songsListWidget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.songsListWidget.customContextMenuRequested.connect(self.show_song_menu)
-        self.songsListWidget.setStyleSheet(f"""
-            QListWidget {{
+        # Songs table; click a column header to sort
+        self.songsModel = LibraryModel(self.music_player, self.core.library_index, self.core.art, self)
+        self.songsView = QTableView()
+        self.songsView.setModel(self.songsModel)
+        self.songsView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.songsView.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.songsView.setShowGrid(False)
+        self.songsView.setWordWrap(False)
+        self.songsView.setIconSize(QSize(COVER_SIZE, COVER_SIZE))
+        self.songsView.verticalHeader().hide()
+        self.songsView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.songsView.verticalHeader().setDefaultSectionSize(32)
+        self.songsView.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.songsView.horizontalHeader().setStretchLastSection(True)
+        self.songsView.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.songsView.setSortingEnabled(True)
+        self.songsView.horizontalHeader().setContextMenuPolicy(Qt.CustomContextMenu)
+        self.songsView.horizontalHeader().customContextMenuRequested.connect(self.show_sort_menu)
+        self.songsView.doubleClicked.connect(self.play_selected_song)
+        self.songsView.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.songsView.customContextMenuRequested.connect(self.show_song_menu)
+        self.songsView.setStyleSheet(f"""
+            QTableView {{
                 background: {COLORS['panel']};
                 border: 1px solid {COLORS['border']};
                 border-radius: 6px;
@@ -199,19 +481,32 @@ class GiflyPlayer(QMainWindow):
                 color: {COLORS['text']};
                 font-size: 13px;
             }}
-            QListWidget::item {{
-                padding: 10px;
-                border-radius: 4px;
+            QTableView::item {{
+                padding: 0 6px;
             }}
-            QListWidget::item:hover {{
+            QTableView::item:hover {{
                 background: {COLORS['panel_light']};
             }}
-            QListWidget::item:selected {{
+            QTableView::item:selected {{
                 background: {COLORS['accent']};
                 color: white;
             }}
+            QHeaderView::section {{
+                background: {COLORS['panel_light']};
+                color: {COLORS['text_dim']};
+                border: none;
+                border-bottom: 1px solid {COLORS['border']};
+                padding: 6px;
+                font-size: 12px;
+            }}
         """)
-        layout.addWidget(self.songsListWidget)
+        for column, width in enumerate((260, 160, 160, 60, 90)):
+            self.songsView.setColumnWidth(column, width)
+        layout.addWidget(self.songsView)
+
+        # Delete removes every selected song in one go
+        self.deleteSongsShortcut = QShortcut(QKeySequence.Delete, self.songsView, self.delete_selected_songs)
+        self.deleteSongsShortcut.setContext(Qt.WidgetShortcut)
 
         # Action buttons
         actions_layout = QHBoxLayout()
@@ -222,6 +517,24 @@ class GiflyPlayer(QMainWindow):
         self.addSongsBtn.setStyleSheet(self.get_button_style())
         actions_layout.addWidget(self.addSongsBtn)
 
+        self.addFolderBtn = QPushButton("+ Add Folder")
+        self.addFolderBtn.clicked.connect(self.openFolder)
+        self.addFolderBtn.setStyleSheet(self.get_button_style())
+        self.addFolderBtn.setToolTip("Add a folder and keep it in sync with the library")
+        actions_layout.addWidget(self.addFolderBtn)
+
+        self.addUrlBtn = QPushButton("+ Add URL")
+        self.addUrlBtn.clicked.connect(self.openUrl)
+        self.addUrlBtn.setStyleSheet(self.get_button_style())
+        self.addUrlBtn.setToolTip("Add an internet radio stream or podcast episode")
+        actions_layout.addWidget(self.addUrlBtn)
+
+        self.dupeSongsBtn = QPushButton("Duplicates")
+        self.dupeSongsBtn.clicked.connect(self.find_duplicate_songs)
+        self.dupeSongsBtn.setStyleSheet(self.get_button_style())
+        self.dupeSongsBtn.setToolTip("Find songs with identical file content")
+        actions_layout.addWidget(self.dupeSongsBtn)
+
         self.clearSongsBtn = QPushButton("Clear All")
         self.clearSongsBtn.clicked.connect(self.clear_all_songs)
         self.clearSongsBtn.setStyleSheet(self.get_button_style(danger=True))
@@ -250,6 +563,9 @@ class GiflyPlayer(QMainWindow):
 
         # Playlist widget
         self.playlistsWidget = QListWidget()
+        self.playlistsWidget.itemDoubleClicked.connect(self.play_selected_playlist)
+        self.playlistsWidget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.playlistsWidget.customContextMenuRequested.connect(self.show_playlist_menu)
         self.playlistsWidget.setStyleSheet(f"""
             QListWidget {{
                 background: {COLORS['panel']};
@@ -274,12 +590,39 @@ class GiflyPlayer(QMainWindow):
         layout.addWidget(self.playlistsWidget)
 
         # Info message
-        info = QLabel("Playlist management coming soon!")
+        info = QLabel("Double-click a playlist to play it. Smart playlists (⚡) update themselves.")
         info.setStyleSheet(f"color: {COLORS['text_dim']}; font-size: 12px; padding: 8px;")
+        info.setWordWrap(True)
         info.setAlignment(Qt.AlignCenter)
         layout.addWidget(info)
 
-        layout.addStretch()
+        # Action buttons
+        actions_layout = QHBoxLayout()
+        actions_layout.setSpacing(8)
+
+        self.newSmartBtn = QPushButton("+ Smart Playlist")
+        self.newSmartBtn.clicked.connect(self.new_smart_playlist)
+        self.newSmartBtn.setStyleSheet(self.get_button_style())
+        actions_layout.addWidget(self.newSmartBtn)
+
+        self.importPlaylistBtn = QPushButton("Import")
+        self.importPlaylistBtn.clicked.connect(self.import_playlist)
+        self.importPlaylistBtn.setStyleSheet(self.get_button_style())
+        self.importPlaylistBtn.setToolTip("Add the songs of an M3U/M3U8/PLS playlist to the library")
+        actions_layout.addWidget(self.importPlaylistBtn)
+
+        self.exportPlaylistBtn = QPushButton("Export")
+        self.exportPlaylistBtn.clicked.connect(lambda: self.export_playlist())
+        self.exportPlaylistBtn.setStyleSheet(self.get_button_style())
+        self.exportPlaylistBtn.setToolTip("Save the selected playlist, or the whole library, as M3U/PLS")
+        actions_layout.addWidget(self.exportPlaylistBtn)
+
+        self.deletePlaylistBtn = QPushButton("Delete")
+        self.deletePlaylistBtn.clicked.connect(self.delete_selected_playlist)
+        self.deletePlaylistBtn.setStyleSheet(self.get_button_style(danger=True))
+        actions_layout.addWidget(self.deletePlaylistBtn)
+
+        layout.addLayout(actions_layout)
         self.tabs.addTab(tab, "Playlists")
 
     def create_gifs_tab(self):
@@ -301,37 +644,41 @@ class GiflyPlayer(QMainWindow):
         layout.addWidget(header)
 
         # Info label
-        info = QLabel("Manage your GIF collection. These will be displayed in the dock.")
+        info = QLabel("Manage your GIF collection. These will be displayed in the dock. "
+                      "Hover a GIF to play it.")
         info.setStyleSheet(f"color: {COLORS['text_dim']}; font-size: 12px; padding: 4px 0 8px 0;")
         info.setWordWrap(True)
         layout.addWidget(info)
 
-        # GIFs list
-        self.gifListWidget = QListWidget()
-        self.gifListWidget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.gifListWidget.customContextMenuRequested.connect(self.show_gif_menu)
-        self.gifListWidget.setStyleSheet(f"""
-            QListWidget {{
+        # GIF thumbnails, made only for the GIFs scrolled into view
+        self.gifModel = GifGridModel(self)
+        self.gifGridView = GifGridView()
+        self.gifGridView.setModel(self.gifModel)
+        self.gifGridView.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.gifGridView.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.gifGridView.customContextMenuRequested.connect(self.show_gif_menu)
+        self.gifGridView.setStyleSheet(f"""
+            QListView {{
                 background: {COLORS['panel']};
                 border: 1px solid {COLORS['border']};
                 border-radius: 6px;
                 padding: 6px;
                 color: {COLORS['text']};
-                font-size: 13px;
+                font-size: 12px;
             }}
-            QListWidget::item {{
-                padding: 10px;
+            QListView::item {{
+                padding: 4px;
                 border-radius: 4px;
             }}
-            QListWidget::item:hover {{
+            QListView::item:hover {{
                 background: {COLORS['panel_light']};
             }}
-            QListWidget::item:selected {{
+            QListView::item:selected {{
                 background: {COLORS['accent']};
                 color: white;
             }}
         """)
-        layout.addWidget(self.gifListWidget)
+        layout.addWidget(self.gifGridView)
 
         # Action buttons
         actions_layout = QHBoxLayout()
@@ -347,6 +694,18 @@ class GiflyPlayer(QMainWindow):
         self.removeGifBtn.setStyleSheet(self.get_button_style())
         actions_layout.addWidget(self.removeGifBtn)
 
+        self.gifRulesBtn = QPushButton("Rules...")
+        self.gifRulesBtn.clicked.connect(self.edit_gif_rules)
+        self.gifRulesBtn.setStyleSheet(self.get_button_style())
+        self.gifRulesBtn.setToolTip("Pick GIFs automatically by folder, file name, artist or tempo")
+        actions_layout.addWidget(self.gifRulesBtn)
+
+        self.dupeGifsBtn = QPushButton("Duplicates")
+        self.dupeGifsBtn.clicked.connect(self.find_duplicate_gifs)
+        self.dupeGifsBtn.setStyleSheet(self.get_button_style())
+        self.dupeGifsBtn.setToolTip("Find GIFs with identical file content")
+        actions_layout.addWidget(self.dupeGifsBtn)
+
         self.clearGifsBtn = QPushButton("Clear All")
         self.clearGifsBtn.clicked.connect(self.clear_all_gifs)
         self.clearGifsBtn.setStyleSheet(self.get_button_style(danger=True))
@@ -381,9 +740,64 @@ class GiflyPlayer(QMainWindow):
         self.dockStatusLabel = QLabel("Dock: Closed")
         self.dockStatusLabel.setStyleSheet(f"color: {COLORS['text']}; font-size: 14px; font-weight: 600;")
         status_layout.addWidget(self.dockStatusLabel)
+
+        self.frameMemoryLabel = QLabel(self.frame_store.describe())
+        self.frameMemoryLabel.setStyleSheet(f"color: {COLORS['text_dim']}; font-size: 12px;")
+        self.frameMemoryLabel.setWordWrap(True)
+        status_layout.addWidget(self.frameMemoryLabel)
         status_group.setLayout(status_layout)
         layout.addWidget(status_group)
 
+        # Transition between GIFs
+        transition_group = QGroupBox("GIF Changes")
+        transition_group.setStyleSheet(self.get_groupbox_style() + dialog_style())
+        transition_layout = QFormLayout()
+        self.transitionCombo = QComboBox()
+        for label, kind in (("Crossfade", "crossfade"), ("Slide", "slide"), ("None", "none")):
+            self.transitionCombo.addItem(label, kind)
+        self.transitionCombo.setCurrentIndex(max(0, self.transitionCombo.findData(self.settings["dock_transition"])))
+        self.transitionCombo.currentIndexChanged.connect(self.change_transition)
+        transition_layout.addRow("Between GIFs", self.transitionCombo)
+
+        self.rotateCombo = QComboBox()
+        for label, mode in (("Off", "off"), ("Every N seconds", "seconds"),
+                            ("Every N loops", "loops"), ("Every N beats", "beats")):
+            self.rotateCombo.addItem(label, mode)
+        self.rotateCombo.setCurrentIndex(max(0, self.rotateCombo.findData(self.settings["dock_rotate_mode"])))
+        self.rotateCombo.setToolTip("Change GIFs automatically; beats use the song's BPM tag")
+        self.rotateSpin = QSpinBox()
+        self.rotateSpin.setRange(1, 3600)
+        self.rotateSpin.setValue(self.settings["dock_rotate_every"])
+        self.rotateCombo.currentIndexChanged.connect(self.change_rotation)
+        self.rotateSpin.valueChanged.connect(self.change_rotation)
+        transition_layout.addRow("Auto-rotate", self.rotateCombo)
+        transition_layout.addRow("N", self.rotateSpin)
+
+        self.reactiveCheck = QCheckBox("Speed up with the music")
+        self.reactiveCheck.setStyleSheet(f"color: {COLORS['text']};")
+        self.reactiveCheck.setChecked(self.settings["dock_audio_reactive"])
+        self.reactiveCheck.toggled.connect(self.change_audio_options)
+        transition_layout.addRow("", self.reactiveCheck)
+
+        self.spectrumCheck = QCheckBox("Spectrum overlay")
+        self.spectrumCheck.setStyleSheet(f"color: {COLORS['text']};")
+        self.spectrumCheck.setChecked(self.settings["dock_spectrum"])
+        self.spectrumCheck.toggled.connect(self.change_audio_options)
+        transition_layout.addRow("", self.spectrumCheck)
+        self.spectrumBinsSpin = QSpinBox()
+        self.spectrumBinsSpin.setRange(4, 128)
+        self.spectrumBinsSpin.setValue(self.settings["spectrum_bins"])
+        self.spectrumBinsSpin.valueChanged.connect(self.change_audio_options)
+        transition_layout.addRow("Bars", self.spectrumBinsSpin)
+        self.spectrumFpsSpin = QSpinBox()
+        self.spectrumFpsSpin.setRange(5, 60)
+        self.spectrumFpsSpin.setSuffix(" fps")
+        self.spectrumFpsSpin.setValue(self.settings["spectrum_fps"])
+        self.spectrumFpsSpin.valueChanged.connect(self.change_audio_options)
+        transition_layout.addRow("Frame rate cap", self.spectrumFpsSpin)
+        transition_group.setLayout(transition_layout)
+        layout.addWidget(transition_group)
+
         # Control button
         self.dockBtn = QPushButton("Open GIF Dock")
         self.dockBtn.clicked.connect(self.toggleDock)
@@ -391,6 +805,13 @@ class GiflyPlayer(QMainWindow):
         self.dockBtn.setStyleSheet(self.get_button_style(primary=True))
         layout.addWidget(self.dockBtn)
 
+        self.addDockBtn = QPushButton("Add Dock")
+        self.addDockBtn.setToolTip("Open another dock, e.g. for a second monitor; "
+                                   "docks showing the same GIF share its frames")
+        self.addDockBtn.clicked.connect(lambda: self.add_dock())
+        self.addDockBtn.setStyleSheet(self.get_button_style())
+        layout.addWidget(self.addDockBtn)
+
         # Instructions
         info_group = QGroupBox("Instructions")
         info_group.setStyleSheet(self.get_groupbox_style())
@@ -401,7 +822,8 @@ class GiflyPlayer(QMainWindow):
             "• Hover to show controls\n"
             "• Use ◀ / ▶ to change GIFs\n"
             "• Use ⇲ to resize\n"
-            "• Add GIFs in the GIFs tab"
+            "• Add GIFs in the GIFs tab\n"
+            "• Right-click GIFs there to give them a dock of their own"
         )
         instructions.setStyleSheet(f"color: {COLORS['text']}; font-size: 13px; line-height: 1.8;")
         instructions.setWordWrap(True)
@@ -412,6 +834,104 @@ class GiflyPlayer(QMainWindow):
         layout.addStretch()
         self.tabs.addTab(tab, "Dock")
 
+    def create_equalizer_tab(self):
+        """Create equalizer tab"""
+        tab = QWidget()
+        tab.setStyleSheet(f"background: {COLORS['bg']};")
+        layout = QVBoxLayout(tab)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(16)
+
+        header = QLabel("Equalizer")
+        header.setStyleSheet(f"""
+            color: {COLORS['text']};
+            font-size: 18px;
+            font-weight: 600;
+            padding: 2px 0;
+        """)
+        layout.addWidget(header)
+
+        if self.music_player.has_dsp():
+            text = f"Ten bands from 31 Hz to 16 kHz, up to {EQ_RANGE:g} dB of boost or cut each."
+        else:
+            text = ('The equalizer needs the PCM audio engine: set "audio_engine" to "pcm" '
+                    'in settings.json and restart Gifly.')
+        info = QLabel(text)
+        info.setStyleSheet(f"color: {COLORS['text_dim']}; font-size: 12px; padding: 4px 0 8px 0;")
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        # Presets
+        preset_layout = QHBoxLayout()
+        preset_layout.setSpacing(8)
+        self.eqCheck = QCheckBox("Enabled")
+        self.eqCheck.setStyleSheet(f"color: {COLORS['text']};")
+        self.eqCheck.setChecked(self.settings["eq_enabled"])
+        self.eqCheck.toggled.connect(self.change_equalizer)
+        preset_layout.addWidget(self.eqCheck)
+        self.eqPresetCombo = QComboBox()
+        self.eqPresetCombo.setStyleSheet(dialog_style())
+        self.eqPresetCombo.activated.connect(self.apply_eq_preset)
+        preset_layout.addWidget(self.eqPresetCombo, 1)
+        self.saveEqPresetBtn = QPushButton("Save Preset...")
+        self.saveEqPresetBtn.clicked.connect(self.save_eq_preset)
+        self.saveEqPresetBtn.setStyleSheet(self.get_button_style())
+        preset_layout.addWidget(self.saveEqPresetBtn)
+        self.deleteEqPresetBtn = QPushButton("Delete")
+        self.deleteEqPresetBtn.clicked.connect(self.delete_eq_preset)
+        self.deleteEqPresetBtn.setStyleSheet(self.get_button_style(danger=True))
+        preset_layout.addWidget(self.deleteEqPresetBtn)
+        layout.addLayout(preset_layout)
+
+        # One vertical slider per band
+        bands_group = QGroupBox("Bands")
+        bands_group.setStyleSheet(self.get_groupbox_style())
+        bands_layout = QHBoxLayout()
+        self.eqSliders = []
+        self.eqValueLabels = []
+        for freq, gain in zip(EQ_BANDS, self.settings["eq_gains"]):
+            column = QVBoxLayout()
+            value = QLabel()
+            value.setAlignment(Qt.AlignCenter)
+            value.setStyleSheet(f"color: {COLORS['text']}; font-size: 11px;")
+            slider = QSlider(Qt.Vertical)
+            slider.setRange(-int(EQ_RANGE), int(EQ_RANGE))
+            slider.setValue(int(round(gain)))
+            slider.setMinimumHeight(160)
+            slider.setStyleSheet(f"""
+                QSlider::groove:vertical {{
+                    width: 6px;
+                    background: {COLORS['panel_light']};
+                    border-radius: 3px;
+                }}
+                QSlider::handle:vertical {{
+                    background: white;
+                    height: 14px;
+                    margin: 0 -4px;
+                    border-radius: 7px;
+                }}
+                QSlider::handle:vertical:hover {{
+                    background: {COLORS['accent']};
+                }}
+            """)
+            slider.valueChanged.connect(self.change_equalizer)
+            name = QLabel(f"{freq // 1000}k" if freq >= 1000 else str(freq))
+            name.setAlignment(Qt.AlignCenter)
+            name.setStyleSheet(f"color: {COLORS['text_dim']}; font-size: 11px;")
+            column.addWidget(value)
+            column.addWidget(slider, 1, Qt.AlignHCenter)
+            column.addWidget(name)
+            bands_layout.addLayout(column)
+            self.eqSliders.append(slider)
+            self.eqValueLabels.append(value)
+        bands_group.setLayout(bands_layout)
+        layout.addWidget(bands_group)
+
+        self.refresh_eq_presets()
+        self.update_eq_labels()
+        layout.addStretch()
+        self.tabs.addTab(tab, "Equalizer")
+
     def create_right_panel(self):
         """Create right panel with player controls"""
         panel = QWidget()
@@ -710,61 +1230,132 @@ class GiflyPlayer(QMainWindow):
     # ============ File Management ============
     def openFiles(self):
         """Open file dialog to add songs"""
+        patterns = " ".join("*" + ext for ext in utils.AUDIO_EXTENSIONS + (utils.CUE_EXTENSION,))
         files, _ = QFileDialog.getOpenFileNames(
             self, "Add Audio Files", "",
-            "Audio Files (*.mp3 *.wav *.ogg *.flac *.m4a *.aac *.wma)"
+            f"Audio Files and CUE Sheets ({patterns})"
         )
         if files:
-            self.music_player.load_songs(files)
-            self.refresh_songs_list()
-            self.save_state()
-            self.statusBar().showMessage(f"Added {len(files)} song(s)", 3000)
+            self.core.add_songs(files)
+
+    def openUrl(self):
+        """Add an http(s) stream or podcast episode to the library"""
+        url, ok = QInputDialog.getText(self, "Add URL", "Stream or podcast URL:")
+        url = url.strip()
+        if not ok or not url:
+            return
+        if not utils.is_stream_url(url):
+            QMessageBox.warning(self, "Add URL", "Only http:// and https:// addresses can be played.")
+            return
+        self.core.add_songs([url])
+
+    def openFolder(self):
+        """Add a folder to the library and watch it for changes"""
+        folder = QFileDialog.getExistingDirectory(self, "Add Music Folder")
+        if folder:
+            self.core.add_folder(folder)
 
     def refresh_songs_list(self):
-        """Refresh the songs list widget"""
-        self.songsListWidget.clear()
-        for song in self.music_player.playlist:
-            self.songsListWidget.addItem(os.path.basename(song))
+        """Refresh the songs list view"""
+        self.songsModel.refresh()
+
+    def show_sort_menu(self, pos):
+        """Header menu to go back to playlist order"""
+        menu = QMenu(self)
+        unsorted_action = menu.addAction("Playlist Order")
+        unsorted_action.setEnabled(self.songsModel.sort_column != -1)
+        if menu.exec_(self.songsView.horizontalHeader().mapToGlobal(pos)) == unsorted_action:
+            self.songsView.sortByColumn(-1, Qt.AscendingOrder)
+
+    def on_tracks_changed(self, paths):
+        """Repaint changed tags now; re-sort or re-filter a little later"""
+        self.songsModel.tracks_changed(paths)
+        # New tags can change which rules pick GIFs for the current song
+        if self.music_player.current_path() in paths:
+            self.refresh_dock_gifs()
+        if self.songsModel.sort_column != -1 or self.songsModel.filter_text:
+            if not self.songs_timer.isActive():
+                self.songs_timer.start()
+
+    def on_covers_changed(self, paths):
+        self.songsModel.covers_changed()
+        # A dock without GIFs shows the cover
+        if (any(dock.follows_song and not dock.gifs for dock in self.docks)
+                and self.music_player.current_path() in paths):
+            self.update_dock_for_song(self.music_player.current_path())
 
     def filter_songs(self, text):
         """Filter songs based on search text"""
-        for i in range(self.songsListWidget.count()):
-            item = self.songsListWidget.item(i)
-            item.setHidden(text.lower() not in item.text().lower())
+        self.songsModel.set_filter(text)
 
-    def play_selected_song(self, item):
+    def play_selected_song(self, index):
         """Play song when double-clicked"""
-        index = self.songsListWidget.row(item)
-        if 0 <= index < len(self.music_player.playlist):
-            self.music_player.current_index = index
-            self.music_player.load_current()
-            self.music_player.play()
-            self.save_state()
+        self.core.play_index(self.songsModel.playlist_index(index.row()))
+
+    def selected_song_indexes(self):
+        """Playlist positions of the selected songs, in playlist order"""
+        rows = self.songsView.selectionModel().selectedRows()
+        return sorted(self.songsModel.playlist_index(index.row()) for index in rows)
 
     def show_song_menu(self, pos):
-        """Show context menu for songs"""
-        item = self.songsListWidget.itemAt(pos)
-        if item:
-            menu = QMenu(self)
-            remove_action = menu.addAction("Remove from Library")
-            
-            action = menu.exec_(self.songsListWidget.mapToGlobal(pos))
-            if action == remove_action:
-                self.delete_song(item)
-
-    def delete_song(self, item):
-        """Remove a song from the playlist"""
-        index = self.songsListWidget.row(item)
-        if 0 <= index < len(self.music_player.playlist):
-            song_path = self.music_player.playlist[index]
-            self.music_player.remove_song(index)
-            self.songsListWidget.takeItem(index)
-            
-            if song_path in self.song_gifs:
-                del self.song_gifs[song_path]
-            
-            self.save_state()
-            self.statusBar().showMessage("Song removed", 2000)
+        """Show context menu for the selected songs"""
+        index = self.songsView.indexAt(pos)
+        if not index.isValid():
+            return
+        if not self.songsView.selectionModel().isSelected(index):
+            self.songsView.setCurrentIndex(index)
+        songs = self.selected_song_indexes()
+        suffix = f" ({len(songs)})" if len(songs) > 1 else ""
+
+        menu = QMenu(self)
+        queue_action = menu.addAction("Play Next" + suffix)
+        top_action = menu.addAction("Move to Top")
+        bottom_action = menu.addAction("Move to Bottom")
+        menu.addSeparator()
+        assign_action = menu.addAction("Assign GIFs...")
+        assign_action.setEnabled(bool(self.gif_list))
+        paths = [self.music_player.playlist[i] for i in songs]
+        unassign_action = menu.addAction("Clear Assigned GIFs")
+        unassign_action.setEnabled(any(p in self.song_gifs for p in paths))
+        menu.addSeparator()
+        remove_action = menu.addAction("Remove from Library" + suffix)
+
+        action = menu.exec_(self.songsView.mapToGlobal(pos))
+        if action == queue_action:
+            self.core.enqueue_indexes(songs)
+        elif action == top_action:
+            self.move_songs(songs, 0)
+        elif action == bottom_action:
+            self.move_songs(songs, len(self.music_player.playlist))
+        elif action == assign_action:
+            self.assign_gifs(paths)
+        elif action == unassign_action:
+            self.core.assign_gifs(paths, [])
+        elif action == remove_action:
+            self.core.remove_indexes(songs)
+
+    def assign_gifs(self, paths):
+        """Pick GIFs from the collection for the given songs"""
+        dialog = GifPickerDialog(self.gif_list, self.song_gifs.get(paths[0], []), self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.core.assign_gifs(paths, dialog.selected())
+
+    def move_songs(self, songs, destination):
+        """Move songs and keep them selected"""
+        first = self.core.move_songs(songs, destination)
+        # Rows only match playlist positions while not filtered or sorted
+        if first != -1 and self.songsModel.is_playlist_order():
+            selection = QItemSelection(self.songsModel.index(first, 0),
+                                       self.songsModel.index(first + len(songs) - 1, 0))
+            self.songsView.selectionModel().select(
+                selection, QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows)
+            self.songsView.scrollTo(self.songsModel.index(first, 0))
+
+    def delete_selected_songs(self):
+        """Remove all selected songs at once"""
+        songs = self.selected_song_indexes()
+        if songs:
+            self.core.remove_indexes(songs)
 
     def clear_all_songs(self):
         """Clear all songs from playlist"""
@@ -775,55 +1366,134 @@ class GiflyPlayer(QMainWindow):
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
-                self.music_player.clear_playlist()
-                self.songsListWidget.clear()
+                self.core.clear_songs()
                 self.currentSongLabel.setText("No song loaded")
-                self.song_gifs.clear()
-                self.save_state()
+
+    # ============ Playlists ============
+    def schedule_playlists_refresh(self, name=""):
+        if not self.playlists_timer.isActive():
+            self.playlists_timer.start()
+
+    def refresh_playlists(self):
+        """Refresh the playlists widget"""
+        selected = self.selected_playlist()
+        self.playlistsWidget.clear()
+        for name, paths in sorted(self.settings.get("playlists", {}).items()):
+            self.add_playlist_item("static", name, f"{name}  ({len(paths)})")
+        smart = self.core.smart_playlists
+        for name in sorted(smart.definitions):
+            self.add_playlist_item("smart", name, f"⚡ {name}  ({len(smart.results.get(name, ()))})")
+        for i in range(self.playlistsWidget.count()):
+            if self.playlistsWidget.item(i).data(Qt.UserRole) == selected:
+                self.playlistsWidget.setCurrentRow(i)
+
+    def add_playlist_item(self, kind, name, text):
+        item = QListWidgetItem(text)
+        item.setData(Qt.UserRole, (kind, name))
+        self.playlistsWidget.addItem(item)
+
+    def selected_playlist(self):
+        item = self.playlistsWidget.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def play_selected_playlist(self, item):
+        """Play playlist when double-clicked"""
+        kind, name = item.data(Qt.UserRole)
+        self.core.play_playlist(kind, name)
+
+    def show_playlist_menu(self, pos):
+        """Show context menu for playlists"""
+        item = self.playlistsWidget.itemAt(pos)
+        if item:
+            menu = QMenu(self)
+            play_action = menu.addAction("Play")
+            export_action = menu.addAction("Export...")
+            delete_action = menu.addAction("Delete Playlist")
+            action = menu.exec_(self.playlistsWidget.mapToGlobal(pos))
+            if action == play_action:
+                self.play_selected_playlist(item)
+            elif action == export_action:
+                self.export_playlist(item.data(Qt.UserRole))
+            elif action == delete_action:
+                self.core.delete_playlist(*item.data(Qt.UserRole))
+
+    def new_smart_playlist(self):
+        """Create a smart playlist from rules"""
+        dialog = SmartPlaylistDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        name = dialog.nameEdit.text().strip()
+        rules = dialog.rules()
+        if not name or not rules:
+            QMessageBox.warning(self, "Smart Playlist", "Please enter a name and at least one rule.")
+            return
+        self.core.save_smart_playlist(name, rules, dialog.match())
+        self.statusBar().showMessage(f"Smart playlist '{name}' saved", 3000)
+
+    def import_playlist(self):
+        """Import songs from a playlist file"""
+        patterns = " ".join("*" + ext for ext in PLAYLIST_EXTENSIONS)
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Playlist", "",
+            f"Playlists ({patterns})"
+        )
+        if path:
+            self.core.import_playlist(path)
+
+    def export_playlist(self, selected=None):
+        """Export the given or selected playlist, or the whole library"""
+        kind, name = selected or self.selected_playlist() or (None, "Library")
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Playlist", f"{name}.m3u8",
+            "M3U8 Playlist (*.m3u8);;M3U Playlist (*.m3u);;PLS Playlist (*.pls)"
+        )
+        if path:
+            self.core.export_playlist(path, kind, name)
+
+    def delete_selected_playlist(self):
+        selected = self.selected_playlist()
+        if selected:
+            self.core.delete_playlist(*selected)
 
     # ============ GIF Management ============
     def add_gifs(self):
-        """Add GIF files"""
+        """Add GIF files or short video loops"""
         files, _ = QFileDialog.getOpenFileNames(
-            self, "Select GIF Files", "", "GIF Files (*.gif)"
+            self, "Select GIF Files", "",
+            "Animations (*.gif *.mp4 *.webm);;GIF Files (*.gif);;Video Loops (*.mp4 *.webm)"
         )
         if files:
-            for gif in files:
-                if gif not in self.gif_list:
-                    self.gif_list.append(gif)
-            self.refresh_gif_list()
-            self.save_state()
-            if self.dock and self.dock.isVisible():
-                self.dock.update_default_gifs(self.gif_list)
-            self.statusBar().showMessage(f"Added {len(files)} GIF(s)", 3000)
+            self.core.add_gifs(files)
 
     def remove_selected_gif(self):
         """Remove selected GIF"""
-        current_item = self.gifListWidget.currentItem()
-        if current_item:
-            index = self.gifListWidget.row(current_item)
-            if 0 <= index < len(self.gif_list):
-                self.gif_list.pop(index)
-                self.refresh_gif_list()
-                self.save_state()
-                if self.dock and self.dock.isVisible():
-                    self.dock.update_default_gifs(self.gif_list)
+        index = self.gifGridView.currentIndex()
+        if index.isValid():
+            self.core.remove_gif(index.row())
 
     def show_gif_menu(self, pos):
         """Show context menu for GIFs"""
-        item = self.gifListWidget.itemAt(pos)
-        if item:
+        index = self.gifGridView.indexAt(pos)
+        if index.isValid():
             menu = QMenu(self)
+            dock_action = menu.addAction("Show in New Dock")
             delete_action = menu.addAction("Remove GIF")
-            action = menu.exec_(self.gifListWidget.mapToGlobal(pos))
-            if action == delete_action:
-                index = self.gifListWidget.row(item)
-                if 0 <= index < len(self.gif_list):
-                    self.gif_list.pop(index)
-                    self.refresh_gif_list()
-                    self.save_state()
-                    if self.dock and self.dock.isVisible():
-                        self.dock.update_default_gifs(self.gif_list)
+            action = menu.exec_(self.gifGridView.viewport().mapToGlobal(pos))
+            if action == dock_action:
+                selected = self.gifGridView.selectionModel().selectedIndexes()
+                rows = sorted(i.row() for i in selected) if index in selected else [index.row()]
+                self.add_dock([self.gif_list[row] for row in rows])
+            elif action == delete_action:
+                self.core.remove_gif(index.row())
+
+    def edit_gif_rules(self):
+        """Edit the automatic GIF assignment rules"""
+        if not self.gif_list:
+            QMessageBox.information(self, "No GIFs", "Please add GIFs first!")
+            return
+        dialog = GifRulesDialog(self.core.gif_rules.rules, self.gif_list, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.core.set_gif_rules(dialog.rules)
 
     def clear_all_gifs(self):
         """Clear all GIFs"""
@@ -834,70 +1504,285 @@ class GiflyPlayer(QMainWindow):
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
-                self.gif_list.clear()
-                self.refresh_gif_list()
-                self.save_state()
-                if self.dock and self.dock.isVisible():
-                    self.dock.update_default_gifs(self.gif_list)
+                self.core.clear_gifs()
+
+    def on_gifs_changed(self):
+        """Keep the GIF list and the dock in sync with the collection"""
+        self.refresh_gif_list()
+        for dock in self.docks:
+            if dock.follows_song:
+                if dock.isVisible():
+                    dock.update_default_gifs(self.gif_list)
+            elif any(gif not in self.gif_list for gif in dock.default_gifs):
+                dock.update_default_gifs([gif for gif in dock.default_gifs if gif in self.gif_list])
+
+    # ============ Duplicate Detection ============
+    def find_duplicate_songs(self):
+        """Scan the library for songs with identical content"""
+        self.start_duplicate_scan(self.music_player.playlist, self.remove_duplicate_songs)
+
+    def find_duplicate_gifs(self):
+        """Scan the GIF collection for identical files"""
+        self.start_duplicate_scan(self.gif_list, self.remove_duplicate_gifs)
+
+    def start_duplicate_scan(self, paths, on_found):
+        if self._dupe_scan and self._dupe_scan.isRunning():
+            self.statusBar().showMessage("A duplicate scan is already running", 2000)
+            return
+        if len(paths) < 2:
+            self.statusBar().showMessage("No duplicates found", 2000)
+            return
+        self._dupe_scan = DuplicateScanThread(paths, self)
+        self._dupe_scan.found.connect(on_found)
+        self._dupe_scan.start()
+        self.statusBar().showMessage(f"Checking {len(paths)} file(s) for duplicates...")
+
+    def confirm_duplicate_removal(self, groups, what):
+        """Ask before removing duplicates. Returns the paths to remove."""
+        extras = duplicate_extras(groups)
+        if not extras:
+            self.statusBar().showMessage("No duplicates found", 2000)
+            return []
+        reply = QMessageBox.question(
+            self, 'Duplicates Found',
+            f'Found {len(extras)} duplicate {what} in {len(groups)} group(s).\n'
+            f'Remove the extra copies from Gifly? Files on disk are not deleted.',
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            self.statusBar().showMessage("Ready")
+            return []
+        return extras
+
+    def remove_duplicate_songs(self, groups):
+        extras = self.confirm_duplicate_removal(groups, "song(s)")
+        if extras:
+            self.core.remove_songs(extras)
+            self.statusBar().showMessage(f"Removed {len(extras)} duplicate song(s)", 3000)
+
+    def remove_duplicate_gifs(self, groups):
+        extras = self.confirm_duplicate_removal(groups, "GIF(s)")
+        if extras:
+            self.core.remove_gifs(extras)
+            self.statusBar().showMessage(f"Removed {len(extras)} duplicate GIF(s)", 3000)
 
     def refresh_gif_list(self):
-        """Refresh GIF list widget"""
-        self.gifListWidget.clear()
-        for gif in self.gif_list:
-            self.gifListWidget.addItem(os.path.basename(gif))
+        """Refresh the GIF grid"""
+        self.gifModel.set_gifs(self.gif_list)
 
     # ============ Dock Control ============
     def toggleDock(self):
-        """Toggle GIF dock visibility"""
-        if not self.gif_list:
+        """Toggle the visibility of all GIF docks"""
+        if not self.gif_list and self.song_cover(self.music_player.current_path()) is None:
             QMessageBox.warning(
                 self, "No GIFs",
                 "Please add some GIFs first in the GIFs tab!"
             )
             return
 
-        if not self.dock:
-            self.dock = GifDock(default_gifs=self.gif_list)
-            self.dock.closed.connect(self.on_dock_closed)
-            if self._saved_dock_geometry:
-                self.dock.setGeometry(self._saved_dock_geometry)
-            self.dock.show()
-            
-            current_song = None
-            if 0 <= self.music_player.current_index < len(self.music_player.playlist):
-                current_song = self.music_player.playlist[self.music_player.current_index]
-            self.update_dock_for_song(current_song)
-            
-            self.dockBtn.setText("Close Dock")
-            self.dockStatusLabel.setText("Dock: Open")
+        if not self.docks:
+            # Bring back the docks of the last session
+            self.create_dock(geometry=self._saved_dock_geometry)
+            for saved in self.settings["extra_docks"]:
+                gifs = [gif for gif in saved["gifs"] if gif in self.gif_list]
+                self.create_dock(gifs, QRect(*saved["geometry"]))
+            self.show_docks()
+        elif any(dock.isVisible() for dock in self.docks):
+            for dock in self.docks:
+                dock.hide()
         else:
-            if self.dock.isVisible():
-                self.dock.hide()
-                self.dockBtn.setText("Open Dock")
-                self.dockStatusLabel.setText("Dock: Hidden")
+            self.show_docks()
+        self.update_dock_status()
+
+    def create_dock(self, gifs=None, geometry=None):
+        """A new, hidden dock; it keeps to `gifs` if given, else follows the song"""
+        dock = GifDock(default_gifs=gifs or self.gif_list, hub=self.dock_hub)
+        dock.follows_song = not gifs
+        dock.set_transition(self.transitionCombo.currentData())
+        dock.set_rotation(self.rotateCombo.currentData(), self.rotateSpin.value())
+        dock.closed.connect(lambda: self.on_dock_closed(dock))
+        if geometry is not None:
+            dock.setGeometry(geometry)
+        self.docks.append(dock)
+        self.update_audio_analysis()
+        return dock
+
+    def show_docks(self):
+        for dock in self.docks:
+            dock.show()
+        self.update_dock_for_song(self.music_player.current_path())
+
+    def add_dock(self, gifs=None):
+        """Open another dock, on the next screen if there is one"""
+        if not gifs and not self.gif_list:
+            QMessageBox.warning(self, "No GIFs", "Please add some GIFs first in the GIFs tab!")
+            return
+        dock = self.create_dock(gifs)
+        if len(self.docks) > 1:
+            previous = self.docks[-2].geometry()
+            dock.resize(previous.size())
+            screens = QApplication.screens()
+            if len(screens) > 1:
+                area = screens[(len(self.docks) - 1) % len(screens)].availableGeometry()
+                dock.move(area.center() - dock.rect().center())
             else:
-                current_song = None
-                if 0 <= self.music_player.current_index < len(self.music_player.playlist):
-                    current_song = self.music_player.playlist[self.music_player.current_index]
-                self.update_dock_for_song(current_song)
-                self.dock.show()
-                self.dockBtn.setText("Close Dock")
-                self.dockStatusLabel.setText("Dock: Open")
-
-    def on_dock_closed(self):
-        """Handle dock close event"""
-        self.dockBtn.setText("Open Dock")
-        self.dockStatusLabel.setText("Dock: Closed")
-        self.save_state()
+                dock.move(previous.topLeft() + QPoint(40, 40))
+        elif self._saved_dock_geometry:
+            dock.setGeometry(self._saved_dock_geometry)
+        dock.show()
+        self.update_dock_for_song(self.music_player.current_path())
+        self.update_dock_status()
+        self.core.schedule_save()
+
+    def update_dock_status(self):
+        shown = sum(dock.isVisible() for dock in self.docks)
+        if not self.docks:
+            self.dockStatusLabel.setText("Dock: Closed")
+        elif len(self.docks) == 1:
+            self.dockStatusLabel.setText("Dock: Open" if shown else "Dock: Hidden")
+        else:
+            self.dockStatusLabel.setText(f"Docks: {shown} of {len(self.docks)} open")
+        self.dockBtn.setText("Close Dock" if shown else "Open Dock")
+
+    def change_transition(self):
+        for dock in self.docks:
+            dock.set_transition(self.transitionCombo.currentData())
+        self.core.schedule_save()
+
+    def change_rotation(self):
+        for dock in self.docks:
+            dock.set_rotation(self.rotateCombo.currentData(), self.rotateSpin.value())
+        self.core.schedule_save()
+
+    def change_audio_options(self):
+        self.update_audio_analysis()
+        self.core.schedule_save()
+
+    def update_audio_analysis(self):
+        """Run the audio analysis only while something uses it"""
+        spectrum = self.spectrumCheck.isChecked()
+        wanted = bool(self.docks) and (self.reactiveCheck.isChecked() or spectrum)
+        if wanted and self.audio_analyzer is None:
+            self.audio_analyzer = AudioAnalyzer(self.music_player.player, self)
+            self.audio_analyzer.levels.connect(self.on_audio_levels)
+            self.audio_analyzer.spectrum.connect(self.on_spectrum)
+            if not self.audio_analyzer.available:
+                for check in (self.reactiveCheck, self.spectrumCheck):
+                    check.setToolTip("Needs numpy and a platform where Qt can tap the decoded audio")
+                self.statusBar().showMessage("Audio analysis is not available", 3000)
+        for dock in self.docks:
+            dock.show_spectrum(spectrum and self.audio_analyzer is not None
+                               and self.audio_analyzer.available)
+            if not self.reactiveCheck.isChecked():
+                dock.set_speed(1.0)
+        if self.audio_analyzer is None:
+            return
+        self.audio_analyzer.set_spectrum(self.spectrumBinsSpin.value() if spectrum else 0,
+                                         self.spectrumFpsSpin.value())
+        if wanted:
+            self.audio_analyzer.start()
+        elif self.audio_analyzer.isRunning():
+            self.audio_analyzer.stop()
+
+    def eq_presets(self):
+        """Built-in presets followed by the user's own"""
+        presets = dict(EQ_PRESETS)
+        presets.update(self.settings["eq_presets"])
+        return presets
+
+    def refresh_eq_presets(self):
+        gains = [slider.value() for slider in self.eqSliders]
+        self.eqPresetCombo.clear()
+        self.eqPresetCombo.addItem("Custom", None)
+        for name, preset in self.eq_presets().items():
+            self.eqPresetCombo.addItem(name, name)
+            if preset == gains and self.eqPresetCombo.currentIndex() == 0:
+                self.eqPresetCombo.setCurrentIndex(self.eqPresetCombo.count() - 1)
+        self.deleteEqPresetBtn.setEnabled(self.eqPresetCombo.currentData() in self.settings["eq_presets"])
+
+    def update_eq_labels(self):
+        for slider, label in zip(self.eqSliders, self.eqValueLabels):
+            label.setText(f"{slider.value():+d}")
+
+    def change_equalizer(self):
+        self.update_eq_labels()
+        self.refresh_eq_presets()
+        self.core.set_equalizer(self.eqCheck.isChecked(), [slider.value() for slider in self.eqSliders])
+
+    def apply_eq_preset(self):
+        name = self.eqPresetCombo.currentData()
+        if name is None:
+            return
+        for slider, gain in zip(self.eqSliders, self.eq_presets()[name]):
+            slider.blockSignals(True)
+            slider.setValue(int(round(gain)))
+            slider.blockSignals(False)
+        if not self.eqCheck.isChecked():
+            self.eqCheck.blockSignals(True)
+            self.eqCheck.setChecked(True)
+            self.eqCheck.blockSignals(False)
+        self.change_equalizer()
+
+    def save_eq_preset(self):
+        name, ok = QInputDialog.getText(self, "Save Preset", "Preset name:")
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name in EQ_PRESETS:
+            QMessageBox.warning(self, "Save Preset", f"'{name}' is a built-in preset; please pick another name.")
+            return
+        self.core.save_eq_preset(name, [slider.value() for slider in self.eqSliders])
+        self.refresh_eq_presets()
+        self.statusBar().showMessage(f"Equalizer preset '{name}' saved", 3000)
+
+    def delete_eq_preset(self):
+        name = self.eqPresetCombo.currentData()
+        if name in self.settings["eq_presets"]:
+            self.core.delete_eq_preset(name)
+            self.refresh_eq_presets()
+
+    def on_audio_levels(self, level, onset):
+        if self.reactiveCheck.isChecked():
+            speed = speed_for(level, onset)
+            for dock in self.docks:
+                dock.set_speed(speed)
+
+    def on_spectrum(self, bars):
+        for dock in self.docks:
+            if dock.isVisible():
+                dock.spectrum.set_bars(bars)
+
+    def on_dock_closed(self, dock):
+        """Closing an extra dock removes it; the main one is only hidden"""
+        if dock is not self.docks[0]:
+            self.docks.remove(dock)
+            dock.stop_gif()
+            dock.drop_preload()
+            dock.deleteLater()
+        self.update_dock_status()
+        self.core.save_state()
+
+    def refresh_dock_gifs(self):
+        self.update_dock_for_song(self.music_player.current_path())
 
     def update_dock_for_song(self, song_path):
         """Update dock GIFs for current song"""
-        if not self.dock:
+        if not self.docks:
             return
-        if song_path and song_path in self.song_gifs and self.song_gifs[song_path]:
-            self.dock.update_for_song(song_path, self.song_gifs[song_path])
-        else:
-            self.dock.update_for_song(song_path or "", [])
+        record = self.core.library_index.records.get(song_path) if song_path else None
+        song_gifs = self.core.gifs_for_song(song_path)
+        cover = self.song_cover(song_path)
+        for dock in self.docks:
+            dock.set_tempo(record.bpm if record else 0)
+            if dock.follows_song:
+                dock.update_for_song(song_path or "", song_gifs, cover)
+
+    def song_cover(self, song_path):
+        """The song's album art at about the dock's size, or None"""
+        if not song_path:
+            return None
+        size = max(self.docks[0].width(), self.docks[0].height()) if self.docks else 256
+        return self.core.art.pixmap(song_path, size)
 
     # ============ Playback Controls ============
     def togglePlay(self):
@@ -906,20 +1791,15 @@ class GiflyPlayer(QMainWindow):
             QMessageBox.information(self, "No Songs", "Please add songs first!")
             return
         
-        self.music_player.toggle()
-        self.save_state()
+        self.core.toggle()
 
     def play_next(self):
         """Play next song"""
-        if self.music_player.playlist:
-            self.music_player.next_song()
-            self.save_state()
+        self.core.play_next()
 
     def play_prev(self):
         """Play previous song"""
-        if self.music_player.playlist:
-            self.music_player.prev_song()
-            self.save_state()
+        self.core.play_prev()
 
     def seek_position(self, position):
         """Seek to position"""
@@ -927,7 +1807,6 @@ class GiflyPlayer(QMainWindow):
 
     def changeVolume(self, value):
         """Change volume"""
-        self.music_player.set_volume(value)
         self.volumeValue.setText(str(value))
         
         # Update icon
@@ -940,15 +1819,17 @@ class GiflyPlayer(QMainWindow):
         else:
             self.volumeLabel.setText("🔊")
         
-        self.settings["volume"] = value
-        self.save_state()
+        if value != self.core.volume:
+            self.core.set_volume(value)
+
+    def on_volume_changed(self, value):
+        """Volume was changed remotely"""
+        self.volumeSlider.setValue(value)
 
     def toggle_shuffle(self):
         """Toggle shuffle mode"""
         enabled = self.shuffleBtn.isChecked()
-        self.music_player.set_shuffle(enabled)
-        self.settings["shuffle"] = enabled
-        self.save_state()
+        self.core.set_shuffle(enabled)
         self.statusBar().showMessage(f"Shuffle {'ON' if enabled else 'OFF'}", 2000)
 
     def toggle_repeat(self):
@@ -969,11 +1850,14 @@ class GiflyPlayer(QMainWindow):
             self.repeatBtn.setChecked(False)
             msg = "Repeat: Off"
         
-        self.music_player.set_repeat_mode(self.current_repeat_mode)
-        self.settings["repeat_mode"] = self.current_repeat_mode
-        self.save_state()
+        self.core.set_repeat_mode(self.current_repeat_mode)
         self.statusBar().showMessage(msg, 2000)
 
+    def bring_to_front(self):
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
     # ============ Event Handlers ============
     def on_song_changed(self, file_path):
         """Handle song change"""
@@ -981,11 +1865,10 @@ class GiflyPlayer(QMainWindow):
         self.statusBar().showMessage(f"Now Playing: {song_name}")
         self.currentSongLabel.setText(song_name)
         self.update_dock_for_song(file_path)
-        self.save_state()
+        self.songsModel.current_changed()
 
-    def on_song_finished(self):
-        """Handle song finish"""
-        self.save_state()
+    def show_message(self, text, timeout):
+        self.statusBar().showMessage(text, timeout)
 
     def on_state_changed(self, state):
         """Handle playback state change"""
@@ -1008,35 +1891,21 @@ class GiflyPlayer(QMainWindow):
 
     # ============ State Management ============
     def restore_state(self):
-        """Restore saved state on startup"""
-        # Restore playlist
-        playlist = self.settings.get("playlist", [])
-        if playlist:
-            self.music_player.load_songs(playlist)
-            self.refresh_songs_list()
-
-        # Restore playback position
-        last_index = self.settings.get("last_index", -1)
-        last_position = self.settings.get("last_position", 0)
-        if last_index is not None and 0 <= last_index < len(self.music_player.playlist):
-            self.music_player.current_index = last_index
-            self.music_player.load_current()
-            QTimer.singleShot(300, lambda: self.music_player.set_position(last_position))
+        """Restore widgets from the core's state"""
+        self.refresh_songs_list()
+        song_path = self.music_player.current_path()
+        if song_path:
+            self.currentSongLabel.setText(os.path.basename(song_path))
+        self.on_state_changed(self.music_player.get_state())
 
         # Restore volume
-        volume = self.settings.get("volume", 70)
-        self.volumeSlider.setValue(volume)
-        self.music_player.set_volume(volume)
-        self.volumeValue.setText(str(volume))
+        self.volumeSlider.setValue(self.core.volume)
+        self.changeVolume(self.core.volume)
 
         # Restore shuffle and repeat
-        self.music_player.set_shuffle(self.settings.get("shuffle", False))
         self.shuffleBtn.setChecked(self.music_player.shuffle)
-        
-        repeat_mode = self.settings.get("repeat_mode", "none")
-        self.music_player.set_repeat_mode(repeat_mode)
-        self.current_repeat_mode = repeat_mode
-        self.repeatBtn.setChecked(repeat_mode != 'none')
+        self.current_repeat_mode = self.music_player.repeat_mode
+        self.repeatBtn.setChecked(self.current_repeat_mode != 'none')
 
         # Restore dock geometry
         dock_geom = self.settings.get("dock_geometry")
@@ -1050,49 +1919,87 @@ class GiflyPlayer(QMainWindow):
         else:
             self.setGeometry(150, 100, 1100, 650)
 
-        # Refresh GIF list
+        # Restore the songs sort order
+        column, order = self.settings.get("library_sort", [-1, 0])
+        if 0 <= column < self.songsModel.columnCount():
+            self.songsView.sortByColumn(column, Qt.DescendingOrder if order else Qt.AscendingOrder)
+
+        # Refresh GIF and playlist lists
         self.refresh_gif_list()
+        self.refresh_playlists()
 
     def save_state(self):
         """Save current state to settings"""
-        self.settings["playlist"] = self.music_player.playlist
-        self.settings["last_index"] = self.music_player.current_index
-        
-        try:
-            self.settings["last_position"] = int(self.music_player.get_position())
-        except:
-            self.settings["last_position"] = 0
-        
-        self.settings["volume"] = int(self.volumeSlider.value())
-        self.settings["gifs"] = self.gif_list
-        self.settings["song_gifs"] = self.song_gifs
-        self.settings["shuffle"] = self.music_player.shuffle
-        self.settings["repeat_mode"] = self.music_player.repeat_mode
-
-        # Save dock geometry
-        if self.dock:
-            geom = self.dock.geometry()
-            self.settings["dock_geometry"] = [geom.x(), geom.y(), geom.width(), geom.height()]
+        self.core.save_state()
+
+    def on_saving(self, settings):
+        """Add window and dock geometry to the settings being saved"""
+        # Save dock geometry; extra docks also keep their own GIFs, if any
+        if self.docks:
+            geom = self.docks[0].geometry()
+            settings["dock_geometry"] = [geom.x(), geom.y(), geom.width(), geom.height()]
+            settings["extra_docks"] = []
+            for dock in self.docks[1:]:
+                geom = dock.geometry()
+                settings["extra_docks"].append({
+                    "geometry": [geom.x(), geom.y(), geom.width(), geom.height()],
+                    "gifs": [] if dock.follows_song else dock.default_gifs[:],
+                })
+
+        settings["dock_transition"] = self.transitionCombo.currentData()
+        settings["dock_rotate_mode"] = self.rotateCombo.currentData()
+        settings["dock_rotate_every"] = self.rotateSpin.value()
+        settings["dock_audio_reactive"] = self.reactiveCheck.isChecked()
+        settings["dock_spectrum"] = self.spectrumCheck.isChecked()
+        settings["spectrum_bins"] = self.spectrumBinsSpin.value()
+        settings["spectrum_fps"] = self.spectrumFpsSpin.value()
 
         # Save window geometry
         geom = self.geometry()
-        self.settings["window_geometry"] = [geom.x(), geom.y(), geom.width(), geom.height()]
+        settings["window_geometry"] = [geom.x(), geom.y(), geom.width(), geom.height()]
 
-        utils.save_settings(self.settings)
+        # Save the songs sort order
+        settings["library_sort"] = [self.songsModel.sort_column,
+                                    1 if self.songsModel.sort_order == Qt.DescendingOrder else 0]
 
     def closeEvent(self, event):
         """Handle application close"""
-        self.save_state()
+        if self.owns_core:
+            self.core.shutdown()
+        else:
+            # Detach from the daemon; it keeps playing without us
+            self.core.save_state()
+            self.core.saving.disconnect(self.on_saving)
+            self.core.attach_handler = None
+        for dock in self.docks:
+            dock.close()
+        self.dock_hub.shutdown()
+        if self.audio_analyzer:
+            self.audio_analyzer.stop()
+        self.gifModel.stop()
         super().closeEvent(event)
 
 
 # ============ Application Entry Point ============
 if __name__ == "__main__":
+    # Hand songs to an already running Gifly instead of opening a second one
+    files = [a if utils.is_stream_url(a) else os.path.abspath(a) for a in sys.argv[1:]
+             if utils.is_stream_url(a) or (utils.is_audio_file(a) and os.path.isfile(a))]
+    replies = giflyctl.send_commands([f"enqueue {f}" for f in files] + ["show"])
+    if replies is not None:
+        for reply in replies:
+            if not reply.startswith("OK"):
+                print(f"Gifly is already running: {reply}", file=sys.stderr)
+        sys.exit(0)
+
     app = QApplication(sys.argv)
     app.setApplicationName("Gifly")
     app.setOrganizationName("Gifly")
     
     window = GiflyPlayer()
+    window.core.start_control_server()
     window.show()
+    if files:
+        window.core.enqueue_files(files)
     
     sys.exit(app.exec_())
\ No newline at end of file
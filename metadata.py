@@ -0,0 +1,239 @@
+# metadata.py
+import os
+import sqlite3
+import time
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+import cue
+import utils
+
+try:
+    import mutagen      # optional: without it only file names are used
+except ImportError:
+    mutagen = None
+
+LIBRARY_FILE = os.path.join(utils.get_config_dir(), "library.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    artist TEXT NOT NULL DEFAULT '',
+    album TEXT NOT NULL DEFAULT '',
+    genre TEXT NOT NULL DEFAULT '',
+    duration_ms INTEGER NOT NULL DEFAULT 0,
+    bpm INTEGER NOT NULL DEFAULT 0,
+    added REAL NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0
+)
+"""
+
+class TrackInfo:
+    """Tag data for one file"""
+    __slots__ = ("path", "title", "artist", "album", "genre",
+                 "duration_ms", "bpm", "added", "mtime")
+
+    def __init__(self, path, title="", artist="", album="", genre="",
+                 duration_ms=0, bpm=0, added=0.0, mtime=0.0):
+        self.path = path
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.genre = genre
+        self.duration_ms = duration_ms
+        self.bpm = bpm
+        self.added = added
+        self.mtime = mtime
+
+    def as_row(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+def _first_tag(tags, key):
+    try:
+        values = tags.get(key)
+    except Exception:
+        return ""
+    if not values:
+        return ""
+    value = values[0] if isinstance(values, list) else values
+    return str(value).strip()
+
+def info_from_filename(info):
+    """Fill missing title/artist/album from an 'Artist - Title' file name"""
+    if not info.title:
+        name = os.path.splitext(os.path.basename(cue.source_file(info.path)))[0]
+        if " - " in name:
+            artist, title = name.split(" - ", 1)
+            info.artist = info.artist or artist.strip()
+            info.title = title.strip()
+        else:
+            info.title = name
+    if not info.album:
+        info.album = os.path.basename(os.path.dirname(info.path))
+    return info
+
+def info_from_cue(info, read_length=False):
+    """Fill a virtual track's record from its CUE sheet. The last track of a
+    file only gets a duration if read_length allows opening the audio file."""
+    virtual = cue.split_virtual(info.path)
+    sheet = cue.load_sheet(virtual[0])
+    track = sheet.track(virtual[1]) if sheet else None
+    if track is None:
+        return info
+    info.title = track.title
+    info.artist = track.performer
+    info.album = sheet.title
+    info.genre = sheet.genre
+    end = track.end_ms
+    if not end and read_length and mutagen is not None:
+        try:
+            audio = mutagen.File(track.file)
+            end = int((getattr(audio.info, "length", 0) or 0) * 1000) if audio is not None else 0
+        except Exception:
+            end = 0
+    info.duration_ms = max(0, end - track.start_ms) if end else 0
+    return info
+
+def placeholder_info(path, added=None):
+    """A record built from the path alone, used until the tags are read"""
+    info = TrackInfo(path, added=added if added is not None else time.time())
+    if "#" in path and cue.split_virtual(path):
+        info_from_cue(info)
+    return info_from_filename(info)
+
+def read_metadata(path, added=None):
+    """Read tags from a file. Falls back to 'Artist - Title' file names."""
+    info = TrackInfo(path, added=added if added is not None else time.time())
+    try:
+        info.mtime = os.path.getmtime(cue.source_file(path))
+    except OSError:
+        pass
+
+    if cue.split_virtual(path):
+        return info_from_filename(info_from_cue(info, read_length=True))
+
+    if mutagen is not None:
+        try:
+            audio = mutagen.File(path, easy=True)
+        except Exception:
+            audio = None
+        if audio is not None:
+            length = getattr(audio.info, "length", 0) or 0
+            info.duration_ms = int(length * 1000)
+            tags = audio.tags or {}
+            info.title = _first_tag(tags, "title")
+            info.artist = _first_tag(tags, "artist")
+            info.album = _first_tag(tags, "album")
+            info.genre = _first_tag(tags, "genre")
+            try:
+                info.bpm = int(float(_first_tag(tags, "bpm") or 0))
+            except ValueError:
+                info.bpm = 0
+    return info_from_filename(info)
+
+
+class MetadataStore:
+    """SQLite cache of TrackInfo records, keyed by path"""
+
+    def __init__(self, path=LIBRARY_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def load(self, paths):
+        """Return {path: TrackInfo} for the given paths that are cached"""
+        wanted = set(paths)
+        records = {}
+        for row in self.db.execute(f"SELECT {', '.join(TrackInfo.__slots__)} FROM tracks"):
+            if row[0] in wanted:
+                records[row[0]] = TrackInfo(*row)
+        return records
+
+    def put_many(self, records):
+        try:
+            with self.db:
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO tracks VALUES ({', '.join('?' * len(TrackInfo.__slots__))})",
+                    [r.as_row() for r in records]
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save track metadata: {e}")
+
+    def remove_many(self, paths):
+        try:
+            with self.db:
+                self.db.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in paths])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not remove track metadata: {e}")
+
+
+class MetadataScanThread(QThread):
+    """Read tags for files whose modification time changed"""
+    scanned = pyqtSignal(list)              # emits batches of TrackInfo
+
+    BATCH_SIZE = 200
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs                    # [(path, added, known mtime or None)]
+
+    def run(self):
+        batch = []
+        for path, added, known_mtime in self.jobs:
+            if self.isInterruptionRequested():
+                break
+            try:
+                mtime = os.path.getmtime(cue.source_file(path))
+            except OSError:
+                continue
+            if known_mtime is not None and mtime == known_mtime:
+                continue
+            batch.append(read_metadata(path, added))
+            if len(batch) >= self.BATCH_SIZE:
+                self.scanned.emit(batch)
+                batch = []
+        if batch:
+            self.scanned.emit(batch)
+
+
+class MetadataScanner(QObject):
+    """Queue tag reads and run them one background thread at a time"""
+    updated = pyqtSignal(list)              # emits batches of fresh TrackInfo
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self._pending = []
+        self._thread = None
+
+    def request(self, records):
+        """Rescan the given records (TrackInfo; mtime 0 forces a read)"""
+        self._pending.extend((r.path, r.added, r.mtime or None) for r in records)
+        if self._thread is None:
+            self._start_next()
+
+    def stop(self):
+        self._pending = []
+        if self._thread is not None:
+            self._thread.requestInterruption()
+            self._thread.wait()
+
+    def _start_next(self):
+        if not self._pending:
+            self._thread = None
+            return
+        jobs, self._pending = self._pending, []
+        self._thread = MetadataScanThread(jobs, self)
+        self._thread.scanned.connect(self._on_scanned)
+        self._thread.finished.connect(self._on_finished)
+        self._thread.start()
+
+    def _on_scanned(self, records):
+        self.store.put_many(records)
+        self.updated.emit(records)
+
+    def _on_finished(self):
+        self._thread.deleteLater()
+        self._start_next()
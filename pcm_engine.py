@@ -0,0 +1,412 @@
+# pcm_engine.py
+"""
+Playback engine that decodes to PCM itself, so the audio can be processed.
+
+QAudioDecoder turns the file into 16-bit stereo PCM a few seconds ahead
+of playback, into a fixed-size ring, so memory stays the same however
+long the file (a multi-hour CUE rip included). The decoder is only read
+while the ring has room, which holds it back until playback catches up.
+A timer pumps fixed-size blocks from the ring through the DSP chain
+(dsp.py) into a push-mode QAudioOutput. The output stays open from one
+track to the next, so the next song continues the same stream instead
+of reopening the device.
+
+Seeks within the ring are instant and seeks ahead skip decoded audio up
+to the target. QAudioDecoder cannot seek, so going back further than the
+ring holds decodes the file again from the start, skipping up to the
+target; either way the position is sample-accurate.
+
+PcmPlayer offers the subset of the QMediaPlayer API (and its enum
+values) that MusicPlayer uses, so the two engines are interchangeable.
+"""
+from PyQt5.QtCore import QByteArray, QObject, QTimer, pyqtSignal
+from PyQt5.QtMultimedia import (QAudio, QAudioBuffer, QAudioDecoder, QAudioDeviceInfo,
+                                QAudioFormat, QAudioOutput, QMediaPlayer)
+from audio_analysis import SAMPLE_FORMATS
+from dsp import DspChain
+
+try:
+    import numpy        # optional: required by this engine
+except ImportError:
+    numpy = None
+
+RATE = 44100
+CHANNELS = 2
+FRAME_BYTES = CHANNELS * 2                  # one int16 sample per channel
+BLOCK_FRAMES = 2048                         # frames run through the DSP chain at once
+BUFFER_MS = 250                             # audio queued in the output
+RING_SECONDS = 8                            # decoded audio kept in memory
+AHEAD_SECONDS = 5                           # of which decoded ahead; the rest keeps what just played
+PUMP_MS = 20                                # how often the output is topped up
+NOTIFY_MS = 1000                            # positionChanged interval, as QMediaPlayer's default
+
+def output_format():
+    fmt = QAudioFormat()
+    fmt.setSampleRate(RATE)
+    fmt.setChannelCount(CHANNELS)
+    fmt.setSampleSize(16)
+    fmt.setSampleType(QAudioFormat.SignedInt)
+    fmt.setByteOrder(QAudioFormat.LittleEndian)
+    fmt.setCodec("audio/pcm")
+    return fmt
+
+
+class PcmPlayer(QObject):
+    """Decode, process and play one track at a time"""
+    mediaStatusChanged = pyqtSignal(int)
+    stateChanged = pyqtSignal(int)
+    positionChanged = pyqtSignal('qint64')
+    durationChanged = pyqtSignal('qint64')
+    error = pyqtSignal(int)
+    audioBufferProbed = pyqtSignal(QAudioBuffer)    # each processed block, for analysis
+
+    @staticmethod
+    def supported():
+        """Whether this system can run the engine"""
+        if numpy is None:
+            return False
+        if not QAudioDecoder().isAvailable():
+            return False
+        device = QAudioDeviceInfo.defaultOutputDevice()
+        return not device.isNull() and device.isFormatSupported(output_format())
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.format = output_format()
+        self.dsp = DspChain(RATE, CHANNELS)
+
+        self.decoder = QAudioDecoder(self)
+        self.decoder.setAudioFormat(self.format)
+        self.decoder.bufferReady.connect(self._on_buffer)
+        self.decoder.finished.connect(self._on_decoded)
+        self.decoder.durationChanged.connect(self._on_decoder_duration)
+        self.decoder.error.connect(self._on_decode_error)
+
+        self.output = QAudioOutput(self.format, self)
+        self.output.setBufferSize(RATE * BUFFER_MS // 1000 * FRAME_BYTES)
+        self._device = None                 # push-mode QIODevice while the output is open
+
+        # Decoded audio: frames [_ring_start, _frames) of the track, frame f at _ring[f % len]
+        self._ring = numpy.zeros((RING_SECONDS * RATE, CHANNELS), numpy.int16)
+        self._ring_start = 0
+        self._frames = 0                    # frames decoded so far
+        self._skip_to = 0                   # decoded frames before this are dropped (seeking ahead)
+        self._overflow = None               # decoded chunk waiting for room in the ring
+        self._decoding = False
+        self._length_known = False          # the whole track was decoded once, so _duration is exact
+        self._resample_warned = False
+
+        # Playback
+        self._pos = 0                       # next frame to send to the output
+        self._state = QMediaPlayer.StoppedState
+        self._status = QMediaPlayer.NoMedia
+        self._duration = 0
+        self._volume = 100
+        self._error_string = ""
+        self._notified = 0
+        self._notify_ms = NOTIFY_MS
+
+        # Work arrays, reused for every block
+        self._block = numpy.zeros((BLOCK_FRAMES, CHANNELS), numpy.float32)
+        self._pcm = numpy.zeros((BLOCK_FRAMES, CHANNELS), numpy.int16)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(PUMP_MS)
+        self._timer.timeout.connect(self._pump)
+
+    # ---------- QMediaPlayer API ----------
+    def setMedia(self, content):
+        self._timer.stop()
+        self.decoder.stop()
+        self._ring_start = self._frames = self._skip_to = self._pos = self._notified = 0
+        self._overflow = None
+        self._decoding = self._length_known = False
+        self._error_string = ""
+        self._set_state(QMediaPlayer.StoppedState)
+        self._set_duration(0)
+        self.positionChanged.emit(0)
+
+        url = content.canonicalUrl()
+        if url.isEmpty():
+            self._set_status(QMediaPlayer.NoMedia)
+            return
+        if not url.isLocalFile():
+            # QAudioDecoder only reads files
+            self._error_string = "The PCM engine only plays local files"
+            print(f"Warning: Could not play {url.toString()}: {self._error_string}")
+            self._set_status(QMediaPlayer.InvalidMedia)
+            self.error.emit(QMediaPlayer.ResourceError)
+            return
+        path = url.toLocalFile()
+        # The output is left open: whatever is still queued from the
+        # previous track plays out, and this one follows right after
+        self.dsp.reset()
+        self._decoding = True
+        self._set_status(QMediaPlayer.LoadingMedia)
+        self.decoder.setSourceFilename(path)
+        self.decoder.start()
+
+    def play(self):
+        if self._status in (QMediaPlayer.NoMedia, QMediaPlayer.InvalidMedia):
+            return
+        if self._status == QMediaPlayer.EndOfMedia:
+            self._seek(0)
+            self._set_status(QMediaPlayer.LoadedMedia)
+        if self._device is None or self.output.state() == QAudio.StoppedState:
+            self._device = self.output.start()
+        elif self.output.state() == QAudio.SuspendedState:
+            self.output.resume()
+        self._set_state(QMediaPlayer.PlayingState)
+        self._timer.start()
+        self._pump()
+
+    def pause(self):
+        if self._state != QMediaPlayer.PlayingState:
+            return
+        self._timer.stop()
+        self.output.suspend()
+        self._set_state(QMediaPlayer.PausedState)
+
+    def stop(self):
+        self._timer.stop()
+        # After the end of a track, let the tail still in the output play out
+        if self._status != QMediaPlayer.EndOfMedia:
+            self._close_output()
+            decoded = self._frames
+            self._seek(0)
+            self.positionChanged.emit(0)
+            if self._status != QMediaPlayer.NoMedia and decoded:
+                self._set_status(QMediaPlayer.LoadedMedia)
+        self._set_state(QMediaPlayer.StoppedState)
+
+    def setPosition(self, position):
+        self._seek(max(0, int(position) * RATE // 1000))
+        if self._status == QMediaPlayer.EndOfMedia and (self._pos < self._frames or not self._exhausted()):
+            self._set_status(QMediaPlayer.LoadedMedia)
+        if self._state == QMediaPlayer.PlayingState:
+            # Drop what is queued at the old position so the jump is heard at once
+            self._close_output()
+            self._device = self.output.start()
+        elif self._state == QMediaPlayer.PausedState:
+            self._close_output()
+        self.dsp.reset()
+        self._notified = self.position()
+        self.positionChanged.emit(self._notified)
+
+    def position(self):
+        return max(0, self._pos - self._queued_frames()) * 1000 // RATE
+
+    def duration(self):
+        return self._duration
+
+    def setNotifyInterval(self, ms):
+        self._notify_ms = max(1, int(ms))
+
+    def notifyInterval(self):
+        return self._notify_ms
+
+    def setVolume(self, volume):
+        self._volume = max(0, min(100, int(volume)))
+        # Linear, like QMediaPlayer's volume
+        self.dsp.volume.factor = self._volume / 100
+
+    def volume(self):
+        return self._volume
+
+    def state(self):
+        return self._state
+
+    def mediaStatus(self):
+        return self._status
+
+    def errorString(self):
+        return self._error_string
+
+    # ---------- Decoding ----------
+    def _seek(self, frame):
+        """Move the play position to a frame, decoding again if it is no longer in the ring"""
+        if frame < self._ring_start:
+            # Behind what the ring holds: start over and skip up to it
+            self.decoder.stop()
+            self._ring_start = self._frames = 0
+            self._overflow = None
+            self._decoding = True
+            self.decoder.start()
+        elif frame > self._frames and self._exhausted():
+            frame = self._frames
+        self._skip_to = frame               # anything not decoded yet before it is dropped
+        self._pos = frame
+        self._fill()
+
+    def _on_buffer(self):
+        self._fill()
+
+    def _fill(self):
+        """Move decoded audio into the ring while it has room"""
+        while True:
+            if self._overflow is not None:
+                chunk, self._overflow = self._overflow, None
+            elif self.decoder.bufferAvailable():
+                buffer = self.decoder.read()
+                if not buffer.isValid() or not buffer.frameCount():
+                    return
+                chunk = self._to_chunk(buffer)
+                if chunk is None:
+                    continue
+            else:
+                if not self._decoding and not self._length_known:
+                    # The decoded length is exact; the container's estimate may not be
+                    self._length_known = True
+                    self._set_duration(self._frames * 1000 // RATE)
+                return
+            self._overflow = self._store(chunk)
+            if self._frames > self._ring_start and self._status == QMediaPlayer.LoadingMedia:
+                self._set_status(QMediaPlayer.LoadedMedia)
+            if self._overflow is not None:
+                return                      # full; the decoder waits until playback catches up
+
+    def _store(self, chunk):
+        """Append decoded frames to the ring, up to AHEAD_SECONDS past the position.
+        Returns what did not fit, or None."""
+        if self._skip_to > self._frames:
+            drop = min(len(chunk), self._skip_to - self._frames)
+            chunk = chunk[drop:]
+            self._frames += drop
+            self._ring_start = self._frames
+        size = len(self._ring)
+        take = min(len(chunk), AHEAD_SECONDS * RATE - (self._frames - min(self._pos, self._frames)))
+        if take <= 0:
+            return chunk if len(chunk) else None
+        index = self._frames % size
+        first = min(take, size - index)
+        self._ring[index:index + first] = chunk[:first]
+        self._ring[:take - first] = chunk[first:take]
+        self._frames += take
+        self._ring_start = max(self._ring_start, self._frames - size)
+        return chunk[take:] if take < len(chunk) else None
+
+    def _exhausted(self):
+        """Whether every frame of the track has been decoded and stored"""
+        return not self._decoding and self._overflow is None and not self.decoder.bufferAvailable()
+
+    def _to_chunk(self, buffer):
+        """Decoded buffer as an int16 (frames, CHANNELS) array in the output format"""
+        fmt = buffer.format()
+        data = buffer.constData()
+        data.setsize(buffer.byteCount())
+        if fmt == self.format:
+            return numpy.frombuffer(data, numpy.int16).reshape(-1, CHANNELS).copy()
+
+        # Some backends ignore the requested format; convert here
+        key = (fmt.sampleType(), fmt.sampleSize())
+        if key not in SAMPLE_FORMATS or fmt.channelCount() < 1:
+            return None
+        dtype, scale, zero = SAMPLE_FORMATS[key]
+        samples = numpy.frombuffer(data, dtype).reshape(-1, fmt.channelCount()).astype(numpy.float32)
+        if zero:
+            samples -= zero
+        samples *= scale
+        if fmt.channelCount() == 1:
+            samples = numpy.repeat(samples, CHANNELS, axis=1)
+        elif fmt.channelCount() > CHANNELS:
+            samples = samples[:, :CHANNELS]
+        if fmt.sampleRate() != RATE:
+            if not self._resample_warned:
+                print(f"Warning: Resampling {fmt.sampleRate()} Hz audio to {RATE} Hz")
+                self._resample_warned = True
+            count = len(samples) * RATE // fmt.sampleRate()
+            where = numpy.linspace(0, len(samples) - 1, count)
+            samples = numpy.stack([numpy.interp(where, numpy.arange(len(samples)), samples[:, c])
+                                   for c in range(CHANNELS)], axis=1)
+        return (numpy.clip(samples, -1.0, 1.0) * 32767).astype(numpy.int16)
+
+    def _on_decoded(self):
+        self._decoding = False
+        self._fill()
+
+    def _on_decoder_duration(self, duration):
+        if self._decoding and not self._length_known and duration > 0:
+            self._set_duration(duration)
+
+    def _on_decode_error(self, _error):
+        self._decoding = False
+        self._error_string = self.decoder.errorString()
+        print(f"Warning: Could not decode {self.decoder.sourceFilename()}: {self._error_string}")
+        if not self._frames:
+            self._timer.stop()
+            self._set_state(QMediaPlayer.StoppedState)
+            self._set_status(QMediaPlayer.InvalidMedia)
+        self.error.emit(QMediaPlayer.ResourceError)
+
+    # ---------- Output ----------
+    def _read(self, start, block):
+        """Fill block with frames from `start` on out of the ring, as float32 -1..1"""
+        size, frames = len(self._ring), len(block)
+        index = start % size
+        first = min(frames, size - index)
+        numpy.multiply(self._ring[index:index + first], 1 / 32768, out=block[:first], casting="unsafe")
+        if first < frames:
+            numpy.multiply(self._ring[:frames - first], 1 / 32768, out=block[first:], casting="unsafe")
+
+    def _pump(self):
+        if self._state != QMediaPlayer.PlayingState or self._device is None:
+            return
+        free = self.output.bytesFree() // FRAME_BYTES
+        while free > 0:
+            available = self._frames - self._pos
+            if available <= 0:
+                if self._exhausted():
+                    self._end_of_media()
+                    return
+                break                       # the decoder has not caught up yet
+            frames = min(free, available, BLOCK_FRAMES)
+            block, pcm = self._block[:frames], self._pcm[:frames]
+            self._read(self._pos, block)
+            self.dsp.process(block)
+            block *= 32767
+            numpy.copyto(pcm, block, casting="unsafe")
+            data = pcm.tobytes()
+            self._device.write(data)
+            if self.receivers(self.audioBufferProbed):
+                self.audioBufferProbed.emit(QAudioBuffer(QByteArray(data), self.format))
+            self._pos += frames
+            free -= frames
+            self._fill()
+
+        position = self.position()
+        if abs(position - self._notified) >= self._notify_ms:
+            self._notified = position
+            self.positionChanged.emit(position)
+
+    def _queued_frames(self):
+        """Frames written to the output but not heard yet"""
+        if self._device is None:
+            return 0
+        return max(0, self.output.bufferSize() - self.output.bytesFree()) // FRAME_BYTES
+
+    def _close_output(self):
+        if self._device is not None:
+            self.output.stop()
+            self._device = None
+
+    def _end_of_media(self):
+        self._timer.stop()
+        self.positionChanged.emit(self._duration)
+        self._set_state(QMediaPlayer.StoppedState)
+        self._set_status(QMediaPlayer.EndOfMedia)
+
+    # ---------- State ----------
+    def _set_state(self, state):
+        if state != self._state:
+            self._state = state
+            self.stateChanged.emit(state)
+
+    def _set_status(self, status):
+        if status != self._status:
+            self._status = status
+            self.mediaStatusChanged.emit(status)
+
+    def _set_duration(self, duration):
+        if duration != self._duration:
+            self._duration = duration
+            self.durationChanged.emit(duration)
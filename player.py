@@ -2,6 +2,16 @@
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from PyQt5.QtCore import QUrl, pyqtSignal, QObject
 import random
+from array import array
+from tracks import TrackTable, TrackList
+from pcm_engine import PcmPlayer
+import cue
+import utils
+
+NOTIFY_MS = 1000                            # position updates, QMediaPlayer's default
+TRACK_NOTIFY_MS = 50                        # position updates while a track ends mid-file
+END_MARGIN = 30                             # ms before its end that a mid-file track counts as over
+SEEK_TOLERANCE = 250                        # ms off a track's start that still needs no seek
 
 class MusicPlayer(QObject):
     song_changed = pyqtSignal(str)          # emits file path when song changes
@@ -9,12 +19,28 @@ class MusicPlayer(QObject):
     position_changed = pyqtSignal(int)      # emits current position in ms
     duration_changed = pyqtSignal(int)      # emits total duration in ms
     state_changed = pyqtSignal(int)         # emits when playback state changes
+    tracks_added = pyqtSignal(list)         # emits paths added to the playlist
+    tracks_removed = pyqtSignal(list)       # emits paths removed from the playlist
 
-    def __init__(self):
+    def __init__(self, engine="qt", stream_proxy=None):
         super().__init__()
-        self.player = QMediaPlayer()
-        self.playlist = []
+        self.player = self._create_engine(engine)
+        self.stream_proxy = stream_proxy    # StreamProxy that internet streams are played through
+        self.tracks = TrackTable()          # interned paths; the playlist only holds their ids
+        self.order = array("I")             # playlist as track ids
+        self.playlist = TrackList(self.tracks, self.order)
         self.current_index = -1
+        self._member = bytearray()          # track id -> 1 if it is in the playlist
+        self.queue = []                     # track ids to play next, before continuing in order
+        self.generation = 0                 # bumped on every playlist change, for cheap "dirty" checks
+        self._cue_media = set()             # audio files that loaded CUE sheets split into tracks
+
+        # The file in the engine, and the part of it the current track spans
+        self._media = ""
+        self._span_start = 0                # ms
+        self._span_end = 0                  # ms; 0 = the end of the file
+        self._pending_seek = None           # span start to seek to once the file has loaded
+        self._ended = False                 # the current track's end was already handled
 
         # Playback features
         self.shuffle = False
@@ -26,45 +52,256 @@ class MusicPlayer(QObject):
         self.player.durationChanged.connect(self._on_duration_changed)
         self.player.stateChanged.connect(self._on_state_changed)
 
+    @staticmethod
+    def _create_engine(engine):
+        """QMediaPlayer, or the PCM engine with its DSP chain ("pcm")"""
+        if engine == "pcm":
+            if PcmPlayer.supported():
+                return PcmPlayer()
+            print("Warning: The PCM audio engine is not available here, using the standard player")
+        return QMediaPlayer()
+
+    def has_dsp(self):
+        """Whether the engine runs the DSP chain (only the PCM engine does)"""
+        return isinstance(self.player, PcmPlayer)
+
+    def set_equalizer(self, gains):
+        """Set the equalizer's band gains in dB; None turns it off"""
+        if self.has_dsp():
+            eq = self.player.dsp.eq
+            eq.set_gains(gains if gains is not None else [0] * len(eq.bands))
+
     # ---------- Playlist management ----------
+    def _set_order(self, ids):
+        """Replace the playlist contents in place so TrackList views stay valid"""
+        self.order[:] = ids
+        self.generation += 1
+
+    def _is_member(self, track_id):
+        return track_id is not None and track_id < len(self._member) and self._member[track_id]
+
     def load_songs(self, file_paths):
-        """Add multiple songs to playlist."""
+        """Add multiple songs to playlist, skipping ones already in it.
+        Returns the paths that were actually added."""
         if not file_paths:
-            return
-        self.playlist.extend(file_paths)
-        if self.current_index == -1 and self.playlist:
+            return []
+        file_paths = self._expand_cues(file_paths)
+        added = []
+        intern = self.tracks.intern
+        member = self._member
+        for path in file_paths:
+            track_id = intern(path)
+            if track_id >= len(member):
+                member.extend(bytes(track_id + 1 - len(member)))
+            if not member[track_id]:
+                member[track_id] = 1
+                self.order.append(track_id)
+                added.append(path)
+        if added:
+            self.generation += 1
+            self.tracks_added.emit(added)
+        if self.current_index == -1 and self.order:
             self.current_index = 0
             self.load_current()
+        return added
+
+    def _expand_cues(self, file_paths):
+        """Replace CUE sheets by their tracks and give every virtual track its
+        span in the track table. Audio files a sheet splits up are left out."""
+        sheets = {}
+        expanded = []
+        for path in file_paths:
+            if utils.is_cue_file(path):
+                sheet = sheets[path] = cue.load_sheet(path)
+                if sheet is not None:
+                    expanded.extend(cue.virtual_path(path, t.number) for t in sheet.tracks)
+            else:
+                expanded.append(path)
+
+        result = []
+        for path in expanded:
+            virtual = cue.split_virtual(path) if "#" in path else None
+            if virtual is None:
+                result.append(path)
+                continue
+            cue_path, number = virtual
+            if cue_path not in sheets:
+                sheets[cue_path] = cue.load_sheet(cue_path)
+            track = sheets[cue_path].track(number) if sheets[cue_path] else None
+            if track is None:
+                continue                    # the sheet is gone or no longer has this track
+            self.tracks.set_span(self.tracks.intern(path), track.file, track.start_ms, track.end_ms)
+            result.append(path)
+
+        for sheet in sheets.values():
+            if sheet is not None:
+                self._cue_media.update(t.file for t in sheet.tracks)
+        if self._cue_media:
+            result = [p for p in result if p not in self._cue_media]
+        return result
+
+    def contains(self, path):
+        return bool(self._is_member(self.tracks.lookup(path)))
+
+    def current_path(self):
+        if 0 <= self.current_index < len(self.order):
+            return self.tracks.path(self.order[self.current_index])
+        return ""
+
+    def enqueue(self, file_paths):
+        """Queue songs to play next, adding them to the playlist if needed.
+        Returns the paths that were new to the playlist."""
+        added = self.load_songs(file_paths)
+        current = self.order[self.current_index] if 0 <= self.current_index < len(self.order) else None
+        for path in file_paths:
+            track_id = self.tracks.lookup(path)
+            if self._is_member(track_id) and track_id != current:
+                self.queue.append(track_id)
+        return added
 
     def clear_playlist(self):
         self.stop()
-        self.playlist = []
+        removed = list(self.playlist)
+        self._set_order(array("I"))
+        # Nothing refers to the old ids any more, so start a fresh table
+        self.tracks = self.playlist.table = TrackTable()
+        self._member = bytearray()
+        self._cue_media = set()
+        self.queue = []
         self.current_index = -1
         self.song_changed.emit("")
+        if removed:
+            self.tracks_removed.emit(removed)
 
     def remove_song(self, index):
-        if 0 <= index < len(self.playlist):
-            removed = self.playlist.pop(index)
-            if index == self.current_index:
-                self.stop()
-                if self.playlist:
-                    self.current_index = min(index, len(self.playlist) - 1)
-                    self.load_current()
-                else:
-                    self.current_index = -1
-                    self.song_changed.emit("")
-            elif index < self.current_index:
-                self.current_index -= 1
+        removed = self.remove_indexes([index])
+        return removed[0] if removed else None
+
+    def remove_paths(self, paths):
+        """Remove all given paths from the playlist in a single pass.
+        A CUE sheet's path removes all of its tracks."""
+        lookup = self.tracks.lookup
+        doomed = {t for t in map(lookup, paths) if self._is_member(t)}
+        sheets = {p for p in paths if utils.is_cue_file(p)}
+        if sheets:
+            doomed.update(t for t in self.order if cue.source_file(self.tracks.path(t)) in sheets)
+        if not doomed:
+            return []
+        return self._remove_where(lambda i, track_id: track_id in doomed)
+
+    def remove_indexes(self, indexes):
+        """Remove the songs at the given playlist positions in a single pass."""
+        doomed = {i for i in indexes if 0 <= i < len(self.order)}
+        if not doomed:
+            return []
+        return self._remove_where(lambda i, track_id: i in doomed)
+
+    def _remove_where(self, is_doomed):
+        """Drop every position for which is_doomed(index, track_id) is true.
+        The playlist is rebuilt once and current_index is fixed once."""
+        kept = array("I")
+        removed_ids = []
+        removed_before_current = 0
+        current_kept = False
+        for i, track_id in enumerate(self.order):
+            if is_doomed(i, track_id):
+                removed_ids.append(track_id)
+                if i < self.current_index:
+                    removed_before_current += 1
+            else:
+                if i == self.current_index:
+                    current_kept = True
+                kept.append(track_id)
+        if not removed_ids:
+            return []
+
+        self._set_order(kept)
+        for track_id in removed_ids:
+            self._member[track_id] = 0
+        if self.queue:
+            gone = set(removed_ids)
+            self.queue = [t for t in self.queue if t not in gone]
+        removed = [self.tracks.path(t) for t in removed_ids]
+        self.tracks_removed.emit(removed)
+        if self.current_index == -1:
             return removed
-        return None
+        if current_kept:
+            self.current_index -= removed_before_current
+        else:
+            self.stop()
+            if self.order:
+                self.current_index = min(self.current_index - removed_before_current,
+                                         len(self.order) - 1)
+                self.load_current()
+            else:
+                self.current_index = -1
+                self.song_changed.emit("")
+        return removed
+
+    def move_indexes(self, indexes, destination):
+        """Move the songs at the given positions, keeping their order, so they
+        sit right before position `destination` (len(playlist) = the end).
+        Returns the new position of the first moved song, or -1."""
+        moving = {i for i in indexes if 0 <= i < len(self.order)}
+        if not moving:
+            return -1
+        destination = max(0, min(int(destination), len(self.order)))
+        current = self.order[self.current_index] if 0 <= self.current_index < len(self.order) else None
+
+        before = array("I")
+        block = array("I")
+        after = array("I")
+        for i, track_id in enumerate(self.order):
+            if i in moving:
+                block.append(track_id)
+            elif i < destination:
+                before.append(track_id)
+            else:
+                after.append(track_id)
+        self._set_order(before + block + after)
+        if current is not None:
+            self.current_index = self.order.index(current)
+        return len(before)
+
+    def enqueue_indexes(self, indexes):
+        """Queue the songs at the given positions to play next, in order.
+        Returns how many were queued."""
+        ids = [self.order[i] for i in sorted(set(indexes))
+               if 0 <= i < len(self.order) and i != self.current_index]
+        self.queue.extend(ids)
+        return len(ids)
 
     # ---------- Load / play ----------
     def load_current(self):
         if 0 <= self.current_index < len(self.playlist):
-            file_path = self.playlist[self.current_index]
-            self.player.setMedia(QMediaContent(QUrl.fromLocalFile(file_path)))
+            track_id = self.order[self.current_index]
+            file_path = self.tracks.path(track_id)
+            span = self.tracks.span(track_id)
+            media, start, end = span or (file_path, 0, 0)
+            self._ended = False
+            self._pending_seek = None
+            self._span_start, self._span_end = start, end
+            if span and media == self._media and self.player.mediaStatus() not in (
+                    QMediaPlayer.NoMedia, QMediaPlayer.InvalidMedia):
+                # Another track of the file already loaded: seek instead of
+                # reloading, or not even that when it follows the one that ended
+                if abs(self.player.position() - start) > SEEK_TOLERANCE:
+                    self.player.setPosition(start)
+                self.duration_changed.emit(self.get_duration())
+            else:
+                self._media = media
+                self.player.setMedia(QMediaContent(self._media_url(media)))
+                if start:
+                    self._pending_seek = start
+                    self.player.setPosition(start)
+            self.player.setNotifyInterval(TRACK_NOTIFY_MS if end else NOTIFY_MS)
             self.song_changed.emit(file_path)
 
+    def _media_url(self, media):
+        if utils.is_stream_url(media):
+            return QUrl(self.stream_proxy.url_for(media) if self.stream_proxy else media)
+        return QUrl.fromLocalFile(media)
+
     def play(self):
         if not self.playlist:
             return
@@ -72,6 +309,12 @@ class MusicPlayer(QObject):
             self.current_index = 0
             self.load_current()
         if self.player.mediaStatus() != QMediaPlayer.NoMedia:
+            if self._span_start or self._span_end:
+                # After a stop the engine is back at the start of the file
+                position = self.player.position()
+                if position < self._span_start - SEEK_TOLERANCE or (
+                        self._span_end and position >= self._span_end - END_MARGIN):
+                    self.set_position(0)
             self.player.play()
 
     def pause(self):
@@ -95,7 +338,9 @@ class MusicPlayer(QObject):
             self.play()
             return
 
-        if self.shuffle:
+        if self.queue:
+            self.current_index = self.order.index(self.queue.pop(0))
+        elif self.shuffle:
             if len(self.playlist) > 1:
                 next_index = self.current_index
                 while next_index == self.current_index:
@@ -136,16 +381,21 @@ class MusicPlayer(QObject):
         self.player.setVolume(int(volume))
 
     def set_position(self, position):
-        """Seek to position in milliseconds"""
-        self.player.setPosition(int(position))
+        """Seek to position in milliseconds, from the start of the current track"""
+        self._pending_seek = None
+        self._ended = False
+        self.player.setPosition(self._span_start + int(position))
 
     def get_position(self):
         """Get current position in milliseconds"""
-        return int(self.player.position())
+        return max(0, int(self.player.position()) - self._span_start)
 
     def get_duration(self):
         """Get total duration in milliseconds"""
-        return int(self.player.duration())
+        if self._span_end:
+            return self._span_end - self._span_start
+        duration = int(self.player.duration())
+        return max(0, duration - self._span_start) if duration > 0 else duration
 
     def is_playing(self):
         return self.player.state() == QMediaPlayer.PlayingState
@@ -155,30 +405,45 @@ class MusicPlayer(QObject):
 
     # ---------- Signal handlers ----------
     def _check_end(self, status):
+        if status in (QMediaPlayer.LoadedMedia, QMediaPlayer.BufferedMedia) and self._pending_seek is not None:
+            # Not every backend keeps a seek made while the file was still loading
+            start, self._pending_seek = self._pending_seek, None
+            if abs(self.player.position() - start) > SEEK_TOLERANCE:
+                self.player.setPosition(start)
+        elif status == QMediaPlayer.EndOfMedia and not self._ended:
+            self._track_ended()
+
+    def _track_ended(self):
+        self._ended = True
         try:
-            from PyQt5.QtMultimedia import QMediaPlayer as _QMP
-            if status == _QMP.EndOfMedia:
-                self.finished.emit()
-                if self.repeat_mode == 'one':
-                    self.load_current()
-                    self.play()
+            self.finished.emit()
+            if self.repeat_mode == 'one':
+                self.load_current()
+                self.play()
+            else:
+                if self.repeat_mode == 'all':
+                    self.next_song()
                 else:
-                    if self.repeat_mode == 'all':
-                        self.next_song()
-                    else:
-                        if not self.shuffle:
-                            if self.current_index == len(self.playlist) - 1:
-                                self.stop()
-                                return
-                        self.next_song()
+                    if not self.shuffle:
+                        if self.current_index == len(self.playlist) - 1 and not self.queue:
+                            self.stop()
+                            return
+                    self.next_song()
         except Exception:
             pass
 
     def _on_position_changed(self, position):
-        self.position_changed.emit(int(position))
+        # A track that ends mid-file is over when the position gets there;
+        # the file plays on, so EndOfMedia would come only after the last one
+        if (self._span_end and not self._ended and position >= self._span_end - END_MARGIN
+                and self.is_playing()):
+            self._track_ended()
+            return
+        self.position_changed.emit(max(0, int(position) - self._span_start))
 
     def _on_duration_changed(self, duration):
-        self.duration_changed.emit(int(duration))
+        if not self._span_end:
+            self.duration_changed.emit(self.get_duration())
 
     def _on_state_changed(self, state):
         self.state_changed.emit(state)
@@ -0,0 +1,210 @@
+# playlist_io.py
+"""
+Streaming M3U/M3U8/PLS reading and writing.
+
+Readers are generators that yield one entry per line, and writers take
+any iterable of paths, so playlists of any length are handled in
+constant memory.
+"""
+import os
+import tempfile
+from collections import OrderedDict
+from itertools import islice
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import cue
+import utils
+
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8", ".pls")
+
+# ---------- Reading ----------
+def _decode(raw, fallback):
+    """UTF-8 first; plain .m3u files are often in a legacy encoding"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode(fallback, errors="replace")
+
+def _lines(path, fallback):
+    with open(path, "rb") as f:
+        for raw in f:
+            line = _decode(raw, fallback).strip().lstrip("\ufeff")
+            if line:
+                yield line
+
+def iter_m3u(path):
+    """Yield the entries of an M3U/M3U8 file, skipping comments and #EXT lines"""
+    fallback = "utf-8" if path.lower().endswith(".m3u8") else "latin-1"
+    for line in _lines(path, fallback):
+        if not line.startswith("#"):
+            yield line
+
+def iter_pls(path):
+    """Yield the FileN= entries of a PLS file in file order"""
+    for line in _lines(path, "latin-1"):
+        key, sep, value = line.partition("=")
+        if sep and key.strip().lower().startswith("file"):
+            yield value.strip()
+
+def read_playlist(path):
+    if path.lower().endswith(".pls"):
+        return iter_pls(path)
+    return iter_m3u(path)
+
+# ---------- Resolving ----------
+def _to_local(entry, base_dir):
+    """Turn a playlist entry into an absolute local path, or None for other URLs"""
+    if "://" in entry:
+        url = urlparse(entry)
+        if url.scheme != "file":
+            return None
+        entry = url2pathname(unquote(url.path))
+    if os.sep == "/":
+        entry = entry.replace("\\", "/")    # playlists written on Windows
+    return os.path.normpath(os.path.join(base_dir, entry))
+
+def resolve_entries(entries, base_dir, cache_size=256):
+    """
+    Yield an absolute path for each entry, or None if it is not an audio
+    file on disk. A CUE virtual track ("Album.cue#3") counts when its sheet
+    is on disk, and http(s) stream URLs are passed on as they are. Existence is checked against directory listings, read
+    once per directory and kept in a small LRU cache, instead of a stat
+    call per entry.
+    """
+    listings = OrderedDict()                # directory -> frozenset of normcased names
+    for entry in entries:
+        if utils.is_stream_url(entry):
+            yield entry
+            continue
+        path = _to_local(entry, base_dir)
+        virtual = cue.split_virtual(path) if path and "#" in path else None
+        if path is None or not (virtual or utils.is_audio_file(path)):
+            yield None
+            continue
+        directory, name = os.path.split(virtual[0] if virtual else path)
+        names = listings.get(directory)
+        if names is None:
+            try:
+                names = frozenset(os.path.normcase(n) for n in os.listdir(directory))
+            except OSError:
+                names = frozenset()
+            listings[directory] = names
+            if len(listings) > cache_size:
+                listings.popitem(last=False)
+        else:
+            listings.move_to_end(directory)
+        yield path if os.path.normcase(name) in names else None
+
+# ---------- Writing ----------
+def _relative(path, base_dir):
+    """Path relative to the playlist when it lives below it, else absolute"""
+    if utils.is_stream_url(path):
+        return path
+    try:
+        rel = os.path.relpath(path, base_dir)
+    except ValueError:                      # different drive on Windows
+        return path
+    return path if rel == os.pardir or rel.startswith(os.pardir + os.sep) else rel
+
+def _write_atomic(path, write_lines):
+    """Write to a temp file next to the target, then replace it"""
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(tmp_fd, "w", encoding="utf-8", newline="\n") as f:
+            count = write_lines(f)
+        os.replace(tmp_path, path)
+        return count
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_m3u(path, paths, info=None):
+    """
+    Write an extended M3U (UTF-8) playlist. info(path) may return
+    (seconds, title) to add #EXTINF lines. Returns the number of entries.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def write_lines(f):
+        f.write("#EXTM3U\n")
+        count = 0
+        for track in paths:
+            details = info(track) if info else None
+            if details:
+                f.write(f"#EXTINF:{details[0]},{details[1]}\n")
+            f.write(_relative(track, base_dir) + "\n")
+            count += 1
+        return count
+    return _write_atomic(path, write_lines)
+
+def write_pls(path, paths, info=None):
+    """Write a PLS playlist; the entry count goes last so paths can stream"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def write_lines(f):
+        f.write("[playlist]\n")
+        count = 0
+        for track in paths:
+            count += 1
+            f.write(f"File{count}={_relative(track, base_dir)}\n")
+            details = info(track) if info else None
+            if details:
+                f.write(f"Title{count}={details[1]}\nLength{count}={details[0]}\n")
+        f.write(f"NumberOfEntries={count}\nVersion=2\n")
+        return count
+    return _write_atomic(path, write_lines)
+
+def write_playlist(path, paths, info=None):
+    if path.lower().endswith(".pls"):
+        return write_pls(path, paths, info)
+    return write_m3u(path, paths, info)
+
+
+class PlaylistImport(QObject):
+    """
+    Add the tracks of a playlist file to the player a batch at a time.
+
+    Each batch is read, resolved and loaded from a zero-delay timer, so
+    the event loop keeps running between batches and the window stays
+    responsive however long the playlist is.
+    """
+    progress = pyqtSignal(int)              # emits tracks added so far
+    done = pyqtSignal(int, int)             # emits (added, skipped)
+
+    BATCH_SIZE = 2000
+
+    def __init__(self, path, music_player, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.music_player = music_player
+        self.added = 0
+        self.skipped = 0
+        base_dir = os.path.dirname(os.path.abspath(path))
+        self._entries = resolve_entries(read_playlist(path), base_dir)
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+
+    def start(self):
+        self._timer.start()
+
+    def cancel(self):
+        self._timer.stop()
+        self._entries.close()
+
+    def _step(self):
+        try:
+            batch = list(islice(self._entries, self.BATCH_SIZE))
+        except OSError as e:
+            print(f"Warning: Could not read playlist {self.path}: {e}")
+            batch = []
+            self.cancel()
+        paths = [p for p in batch if p is not None]
+        self.skipped += len(batch) - len(paths)
+        if paths:
+            self.added += len(self.music_player.load_songs(paths))
+            self.progress.emit(self.added)
+        if len(batch) < self.BATCH_SIZE:
+            self._timer.stop()
+            self.done.emit(self.added, self.skipped)
@@ -0,0 +1,285 @@
+# smartlists.py
+import time
+from bisect import bisect_left, bisect_right
+from PyQt5.QtCore import QObject, pyqtSignal
+
+DAY = 24 * 60 * 60
+
+# A rule is {"field": <field>, "value": <value>}:
+#   genre / artist:  <text>              (case-insensitive match)
+#   duration:        [min_s, max_s]      (either end may be null)
+#   plays:           [min, max]          (either end may be null)
+#   added:           <days>              (added within the last N days)
+FIELDS = ("genre", "artist", "duration", "plays", "added")
+
+class SortedKeyIndex:
+    """
+    Paths kept sorted by a numeric key, for range lookups.
+
+    The (key, path) pairs live in a list of sorted buckets of a bounded
+    size, so an update only shifts one bucket instead of the whole list.
+    A bucket that grows past twice BUCKET_SIZE is split in two.
+    """
+
+    BUCKET_SIZE = 1000
+
+    def __init__(self):
+        self.buckets = []                   # sorted lists of (key, path), in order
+        self.bucket_keys = []               # keys of each bucket, for bisecting by key only
+        self.maxes = []                     # last pair of each bucket, for finding a pair's bucket
+        self.keys = {}                      # path -> key
+
+    def load(self, keys):
+        """Replace the contents with {path: key} in one sort"""
+        self.keys = dict(keys)
+        pairs = sorted((key, path) for path, key in self.keys.items())
+        size = self.BUCKET_SIZE
+        self.buckets = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        self.bucket_keys = [[key for key, _ in bucket] for bucket in self.buckets]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+
+    def set(self, path, key):
+        old = self.keys.get(path)
+        if old == key:
+            return
+        if old is not None:
+            self.remove(path)
+        self.keys[path] = key
+        pair = (key, path)
+        if not self.buckets:
+            self.buckets.append([pair])
+            self.bucket_keys.append([key])
+            self.maxes.append(pair)
+            return
+        b = min(bisect_left(self.maxes, pair), len(self.buckets) - 1)
+        bucket, keys = self.buckets[b], self.bucket_keys[b]
+        i = bisect_left(bucket, pair)
+        bucket.insert(i, pair)
+        keys.insert(i, key)
+        self.maxes[b] = bucket[-1]
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            half = len(bucket) // 2
+            self.buckets[b:b + 1] = [bucket[:half], bucket[half:]]
+            self.bucket_keys[b:b + 1] = [keys[:half], keys[half:]]
+            self.maxes[b:b + 1] = [bucket[half - 1], bucket[-1]]
+
+    def remove(self, path):
+        old = self.keys.pop(path, None)
+        if old is None:
+            return
+        pair = (old, path)
+        b = bisect_left(self.maxes, pair)
+        bucket = self.buckets[b]
+        i = bisect_left(bucket, pair)
+        del bucket[i]
+        del self.bucket_keys[b][i]
+        if bucket:
+            self.maxes[b] = bucket[-1]
+        else:
+            del self.buckets[b], self.bucket_keys[b], self.maxes[b]
+
+    def range(self, low=None, high=None):
+        """Paths with low <= key <= high"""
+        # (low,) sorts before every pair whose key is low
+        b = 0 if low is None else bisect_left(self.maxes, (low,))
+        paths = set()
+        for bucket, keys in zip(self.buckets[b:], self.bucket_keys[b:]):
+            if high is not None and keys[0] > high:
+                break
+            start = 0 if low is None else bisect_left(keys, low)
+            end = len(keys) if high is None else bisect_right(keys, high)
+            paths.update(path for _, path in bucket[start:end])
+        return paths
+
+
+class LibraryIndex:
+    """Metadata indexes over the library used to answer rules without scans"""
+
+    def __init__(self):
+        self.records = {}                   # path -> TrackInfo
+        self.plays = {}                     # path -> play count
+        self.by_genre = {}                  # lowercase genre -> set of paths
+        self.by_artist = {}                 # lowercase artist -> set of paths
+        self.durations = SortedKeyIndex()
+        self.play_index = SortedKeyIndex()
+        self.added = SortedKeyIndex()
+
+    @staticmethod
+    def _unlink(table, key, path):
+        paths = table.get(key)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del table[key]
+
+    def update(self, record):
+        path = record.path
+        old = self.records.get(path)
+        if old is not None:
+            self._unlink(self.by_genre, old.genre.lower(), path)
+            self._unlink(self.by_artist, old.artist.lower(), path)
+        self.records[path] = record
+        self.by_genre.setdefault(record.genre.lower(), set()).add(path)
+        self.by_artist.setdefault(record.artist.lower(), set()).add(path)
+        self.durations.set(path, record.duration_ms)
+        self.added.set(path, record.added)
+        self.play_index.set(path, self.plays.get(path, 0))
+
+    def remove(self, path):
+        old = self.records.pop(path, None)
+        if old is None:
+            return
+        self._unlink(self.by_genre, old.genre.lower(), path)
+        self._unlink(self.by_artist, old.artist.lower(), path)
+        self.durations.remove(path)
+        self.added.remove(path)
+        self.play_index.remove(path)
+
+    def load(self, records):
+        """Replace the contents with `records`, sorting each index once"""
+        self.records = {record.path: record for record in records}
+        self.by_genre, self.by_artist = {}, {}
+        for path, record in self.records.items():
+            self.by_genre.setdefault(record.genre.lower(), set()).add(path)
+            self.by_artist.setdefault(record.artist.lower(), set()).add(path)
+        self.durations.load((path, record.duration_ms) for path, record in self.records.items())
+        self.added.load((path, record.added) for path, record in self.records.items())
+        self.play_index.load((path, self.plays.get(path, 0)) for path in self.records)
+
+    def set_plays(self, path, plays):
+        self.plays[path] = plays
+        if path in self.records:
+            self.play_index.set(path, plays)
+
+    # ---------- Rule evaluation ----------
+    @staticmethod
+    def _bounds(value, scale=1):
+        """[low, high] rule value (either may be None) scaled to index units"""
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        low, high = (list(value) + [None, None])[:2]
+        return (None if low is None else low * scale,
+                None if high is None else high * scale)
+
+    def candidates(self, rule, now=None):
+        """All paths matching one rule, answered from the indexes"""
+        field, value = rule.get("field"), rule.get("value")
+        if field == "genre":
+            return set(self.by_genre.get(str(value).lower(), ()))
+        if field == "artist":
+            return set(self.by_artist.get(str(value).lower(), ()))
+        if field == "duration":
+            return self.durations.range(*self._bounds(value, 1000))
+        if field == "plays":
+            return self.play_index.range(*self._bounds(value))
+        if field == "added":
+            now = now if now is not None else time.time()
+            return self.added.range(now - float(value) * DAY, None)
+        return set()
+
+    def matches(self, path, rule, now=None):
+        """Whether one track matches one rule, answered from its record"""
+        record = self.records.get(path)
+        if record is None:
+            return False
+        field, value = rule.get("field"), rule.get("value")
+        if field == "genre":
+            return record.genre.lower() == str(value).lower()
+        if field == "artist":
+            return record.artist.lower() == str(value).lower()
+        if field in ("duration", "plays"):
+            if field == "duration":
+                key, (low, high) = record.duration_ms, self._bounds(value, 1000)
+            else:
+                key, (low, high) = self.plays.get(path, 0), self._bounds(value)
+            return (low is None or key >= low) and (high is None or key <= high)
+        if field == "added":
+            now = now if now is not None else time.time()
+            return record.added >= now - float(value) * DAY
+        return False
+
+
+class SmartPlaylists(QObject):
+    """
+    Rule-based playlists whose results are kept up to date incrementally.
+
+    A playlist is built once by intersecting index lookups (smallest
+    candidate set first). After that, every added, changed, removed or
+    played track is checked against each playlist's rules on its own, so
+    a change costs O(playlists x rules), independent of the library size.
+    "added" rules are relative to the time of the last rebuild.
+    """
+    changed = pyqtSignal(str)               # emits the name of a playlist whose results changed
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.definitions = {}               # name -> {"match": "all"|"any", "rules": [...]}
+        self.results = {}                   # name -> set of paths
+
+    def set_definitions(self, definitions):
+        self.definitions = {name: d for name, d in definitions.items() if self.valid(d)}
+        self.results = {}
+        for name in self.definitions:
+            self.rebuild(name)
+
+    @staticmethod
+    def valid(definition):
+        return (isinstance(definition, dict)
+                and isinstance(definition.get("rules"), list)
+                and all(isinstance(r, dict) and r.get("field") in FIELDS for r in definition["rules"]))
+
+    def define(self, name, rules, match="all"):
+        definition = {"match": match, "rules": rules}
+        if not self.valid(definition):
+            raise ValueError(f"invalid smart playlist rules: {rules}")
+        self.definitions[name] = definition
+        self.rebuild(name)
+
+    def remove(self, name):
+        self.definitions.pop(name, None)
+        self.results.pop(name, None)
+        self.changed.emit(name)
+
+    def rebuild(self, name):
+        definition = self.definitions[name]
+        now = time.time()
+        sets = sorted((self.index.candidates(r, now) for r in definition["rules"]), key=len)
+        if not sets:
+            result = set()
+        elif definition.get("match") == "any":
+            result = set().union(*sets)
+        else:
+            result = sets[0].intersection(*sets[1:])
+        self.results[name] = result
+        self.changed.emit(name)
+
+    def tracks(self, name):
+        """Results of a playlist, oldest additions first"""
+        added = self.index.added.keys
+        return sorted(self.results.get(name, ()), key=lambda p: added.get(p, 0))
+
+    # ---------- Incremental maintenance ----------
+    def _evaluate(self, path, definition, now):
+        if not definition["rules"]:
+            return False
+        checks = (self.index.matches(path, r, now) for r in definition["rules"])
+        return any(checks) if definition.get("match") == "any" else all(checks)
+
+    def track_updated(self, path):
+        now = time.time()
+        for name, definition in self.definitions.items():
+            result = self.results.setdefault(name, set())
+            inside = self._evaluate(path, definition, now)
+            if inside and path not in result:
+                result.add(path)
+                self.changed.emit(name)
+            elif not inside and path in result:
+                result.discard(path)
+                self.changed.emit(name)
+
+    def track_removed(self, path):
+        for name, result in self.results.items():
+            if path in result:
+                result.discard(path)
+                self.changed.emit(name)
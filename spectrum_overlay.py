@@ -0,0 +1,49 @@
+# spectrum_overlay.py
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter, QColor, QLinearGradient
+from PyQt5.QtCore import Qt, QRectF
+
+class SpectrumOverlay(QWidget):
+    """
+    Spectrum bars drawn over the dock's GIF.
+
+    Bar heights arrive ready-made from the audio analysis worker, so a
+    repaint is one QPainter pass: a single drawRects call with one
+    gradient brush for every bar.
+    """
+    GAP = 2                                 # px between bars
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WA_NoSystemBackground)
+        self.bars = None
+
+    def set_bars(self, bars):
+        self.bars = bars
+        self.update()
+
+    def clear(self):
+        self.bars = None
+        self.update()
+
+    def paintEvent(self, event):
+        if self.bars is None or not len(self.bars):
+            return
+        count = len(self.bars)
+        width, height = self.width(), self.height()
+        bar_width = max(1.0, (width - self.GAP * (count - 1)) / count)
+        step = bar_width + self.GAP
+        rects = [QRectF(i * step, height * (1 - value), bar_width, height * value)
+                 for i, value in enumerate(self.bars.tolist()) if value > 0]
+        if not rects:
+            return
+
+        gradient = QLinearGradient(0, height, 0, 0)
+        gradient.setColorAt(0, QColor(13, 122, 255, 200))
+        gradient.setColorAt(1, QColor(255, 255, 255, 220))
+        painter = QPainter(self)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(gradient)
+        painter.drawRects(rects)
+        painter.end()
@@ -0,0 +1,489 @@
+# stream_cache.py
+"""
+Internet streams through a local caching proxy.
+
+The player is handed http://127.0.0.1:<port>/<n> instead of a stream's
+own URL. The proxy fetches from the real server with Range requests and
+keeps every byte it got on disk, so an episode that was heard (or seeked
+through) once replays without downloading again, and a seek only fetches
+what is missing; cached parts play even while the server is offline.
+A dropped connection is picked up where it broke off, after a growing
+pause. The cache is trimmed to its size as it grows, least recently
+played first, sparing streams being played. Internet radio has no length and is only relayed,
+with the same reconnects. Before the first byte goes to the player a
+prebuffer is filled, so playback does not start on a connection that
+stalls right away.
+"""
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import utils
+
+CACHE_DIR = os.path.join(utils.get_config_dir(), "streams")
+CHUNK_SIZE = 64 * 1024
+BACKOFF = (0, 0.5, 1, 2, 4, 8)              # s to wait before each connection attempt; then give up
+TIMEOUT = 15                                # s without data before a connection counts as dropped
+READ_THROUGH = 128 * 1024                   # bytes worth reading past rather than reconnecting
+SAVE_EVERY = 4 * 1024 * 1024                # bytes downloaded between saves of a stream's range list
+TRIM_EVERY = 16 * 1024 * 1024               # bytes downloaded between trims of the cache to its size
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+class UpstreamError(Exception):
+    pass
+
+
+class CachedStream:
+    """What is on disk of one URL: a sparse data file and the byte ranges in it"""
+
+    def __init__(self, url, cache_dir=CACHE_DIR):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        self.url = url
+        self.data_path = os.path.join(cache_dir, key + ".data")
+        self.meta_path = os.path.join(cache_dir, key + ".json")
+        self.lock = threading.Lock()
+        self.length = None                  # total bytes; None until known
+        self.etag = ""
+        self.content_type = ""
+        self.ranges = []                    # sorted, disjoint [start, end) pairs on disk
+        self.version = 0                    # bumped when the cache is started over
+        self._unsaved = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            size = os.path.getsize(self.data_path)
+        except (OSError, ValueError):
+            return
+        if not isinstance(meta, dict) or meta.get("url") != self.url or not isinstance(meta.get("length"), int):
+            return
+        ranges = [r for r in meta.get("ranges", []) if isinstance(r, list) and len(r) == 2
+                  and all(isinstance(v, int) for v in r) and 0 <= r[0] < r[1] <= size]
+        self.length = meta["length"]
+        self.etag = str(meta.get("etag", ""))
+        self.content_type = str(meta.get("content_type", ""))
+        self.ranges = sorted(ranges)
+
+    def save(self):
+        with self.lock:
+            if self.length is None:
+                return
+            meta = {"url": self.url, "length": self.length, "etag": self.etag,
+                    "content_type": self.content_type, "ranges": [list(r) for r in self.ranges]}
+            self._unsaved = 0
+        utils.write_json_atomic(self.meta_path, meta, indent=None)
+
+    def reset(self, length, etag, content_type):
+        """Start over, e.g. because the file on the server changed"""
+        with self.lock:
+            self.length, self.etag, self.content_type = length, etag, content_type
+            self.ranges = []
+            self.version += 1
+            try:
+                with open(self.data_path, "wb"):
+                    pass
+            except OSError as e:
+                print(f"Warning: Could not reset stream cache: {e}")
+
+    def touch(self):
+        """Mark the stream as just played, for trimming the cache"""
+        try:
+            os.utime(self.data_path)
+        except OSError:
+            pass
+
+    def cached_until(self, pos):
+        """End of the cached run that pos is in, or pos if it is not cached"""
+        with self.lock:
+            for start, end in self.ranges:
+                if start <= pos < end:
+                    return end
+        return pos
+
+    def read(self, pos, size):
+        with self.lock:
+            with open(self.data_path, "rb") as f:
+                f.seek(pos)
+                return f.read(size)
+
+    def write(self, pos, data):
+        with self.lock:
+            with open(self.data_path, "r+b" if os.path.exists(self.data_path) else "wb") as f:
+                f.seek(pos)
+                f.write(data)
+            # Merge [pos, pos + len) into the range list
+            start, end = pos, pos + len(data)
+            merged = []
+            for r in self.ranges:
+                if r[1] < start or r[0] > end:
+                    merged.append(r)
+                else:
+                    start, end = min(start, r[0]), max(end, r[1])
+            merged.append([start, end])
+            self.ranges = sorted(merged)
+            self._unsaved += len(data)
+            due = self._unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+
+class Upstream:
+    """One GET to the real server, from some byte on"""
+
+    def __init__(self, url, start):
+        request = urllib.request.Request(url, headers={
+            "User-Agent": utils.APP_NAME,
+            "Range": f"bytes={start}-",
+        })
+        try:
+            self.response = urllib.request.urlopen(request, timeout=TIMEOUT)
+        except urllib.error.HTTPError as e:
+            # 4xx will not get better by asking again
+            raise UpstreamError(f"HTTP {e.code}") if e.code < 500 else e
+        headers = self.response.headers
+        self.etag = headers.get("ETag", "")
+        self.content_type = headers.get("Content-Type", "")
+        match = _CONTENT_RANGE.match(headers.get("Content-Range", ""))
+        if self.response.status == 206 and match:
+            self.pos = int(match.group(1))
+            self.length = None if match.group(2) == "*" else int(match.group(2))
+        else:
+            # The server sends everything from the start
+            self.pos = 0
+            length = headers.get("Content-Length")
+            self.length = int(length) if length and length.isdigit() else None
+        self.seekable = self.response.status == 206
+
+    def read(self):
+        data = self.response.read(CHUNK_SIZE)
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        try:
+            self.response.close()
+        except OSError:
+            pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.proxy.serve(self)
+
+    def do_HEAD(self):
+        self.server.proxy.serve(self, body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StreamProxy:
+    """Local HTTP server the player reads internet streams through"""
+
+    def __init__(self, prebuffer_kb=256, cache_mb=1024, cache_dir=CACHE_DIR):
+        self.prebuffer = max(0, prebuffer_kb) * 1024
+        self.cache_bytes = max(0, cache_mb) * 1024 * 1024
+        self.cache_dir = cache_dir
+        self._keys = {}                     # url -> proxy path
+        self._urls = {}                     # proxy path -> url
+        self._streams = {}                  # url -> CachedStream
+        self._playing = {}                  # url -> connections serving it
+        self._lock = threading.Lock()
+        self._server = None
+        self.upstream_bytes = 0             # downloaded this session
+        self._untrimmed = 0                 # cached since the last trim
+
+    def start(self):
+        if self._server is not None:
+            return True
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        except OSError as e:
+            print(f"Warning: Could not start the stream proxy, streaming directly: {e}")
+            return False
+        server.daemon_threads = True
+        server.proxy = self
+        self._server = server
+        threading.Thread(target=server.serve_forever, name="stream-proxy", daemon=True).start()
+        threading.Thread(target=self.trim, daemon=True).start()
+        return True
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        for stream in list(self._streams.values()):
+            stream.save()
+        if self._untrimmed:
+            self.trim()
+
+    def url_for(self, url):
+        """The address the player should open for a stream"""
+        if not self.start():
+            return url
+        with self._lock:
+            path = self._keys.get(url)
+            if path is None:
+                # Keep the extension; some backends pick a decoder by it
+                ext = os.path.splitext(urlsplit(url).path)[1][:5]
+                path = self._keys[url] = f"/{len(self._keys)}{ext}"
+                self._urls[path] = url
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def _acquire(self, url):
+        """The CachedStream of a URL, kept from trimming until released"""
+        with self._lock:
+            stream = self._streams.get(url)
+            if stream is None:
+                stream = self._streams[url] = CachedStream(url, self.cache_dir)
+            self._playing[url] = self._playing.get(url, 0) + 1
+        stream.touch()
+        return stream
+
+    def _release(self, stream):
+        with self._lock:
+            self._playing[stream.url] -= 1
+            if not self._playing[stream.url]:
+                del self._playing[stream.url]
+
+    def _cached(self, size):
+        """Count downloaded bytes, trimming the cache every TRIM_EVERY"""
+        with self._lock:
+            self.upstream_bytes += size
+            self._untrimmed += size
+            due = self._untrimmed >= TRIM_EVERY
+        if due:
+            self.trim()
+
+    def trim(self):
+        """Delete least recently played streams until the cache fits its size"""
+        with self._lock:
+            self._untrimmed = 0
+            keep = {self._streams[url].data_path for url in self._playing}
+        # The disk work runs unlocked, so url_for() never waits on it
+        removed = set(prune(self.cache_dir, self.cache_bytes, keep))
+        restart = []
+        with self._lock:
+            # Forget what was deleted, so a later play starts from an empty cache
+            for url in [u for u, s in self._streams.items() if s.data_path in removed]:
+                if url in self._playing:
+                    restart.append(self._streams[url])  # started playing while pruning
+                else:
+                    del self._streams[url]
+        for stream in restart:
+            stream.reset(stream.length, stream.etag, stream.content_type)
+
+    # ---------- Serving (one thread per player connection) ----------
+    def serve(self, handler, body=True):
+        url = self._urls.get(handler.path)
+        if url is None:
+            handler.send_error(404)
+            return
+        stream = self._acquire(url)
+        first, last = _requested_range(handler.headers.get("Range"))
+        upstream = None
+        try:
+            # With the length known, serve what is cached and only go to
+            # the server once the player reaches a part that is not
+            if stream.length is None:
+                upstream = self._connect(stream, first if first is not None and first >= 0 else 0)
+                if upstream is None:
+                    handler.send_error(502)
+                    return
+                if upstream.length is None:
+                    self._relay(handler, upstream, body)
+                    return
+            self._serve_cached(handler, stream, upstream, first, last, body)
+        except OSError:
+            pass                            # the player hung up, e.g. to seek elsewhere
+        finally:
+            if upstream is not None:
+                upstream.close()
+            stream.save()
+            self._release(stream)
+
+    def _connect(self, stream, start):
+        """Open the server from `start`, with reconnects; None if it stays unreachable"""
+        for delay in BACKOFF:
+            time.sleep(delay)
+            try:
+                upstream = Upstream(stream.url, start)
+            except UpstreamError as e:
+                print(f"Warning: Stream {stream.url} failed: {e}")
+                return None
+            except (OSError, http.client.HTTPException) as e:
+                print(f"Warning: Stream {stream.url} unreachable, retrying: {e}")
+                continue
+            if upstream.length is not None and (stream.length != upstream.length or (
+                    stream.etag and upstream.etag and stream.etag != upstream.etag)):
+                stream.reset(upstream.length, upstream.etag, upstream.content_type)
+            return upstream
+        print(f"Warning: Gave up on stream {stream.url}")
+        return None
+
+    def _fetch(self, stream, upstream, pos):
+        """Download the next chunk at or before pos into the cache.
+        Returns the (possibly new) upstream, or None if the server is gone."""
+        for delay in (0,) + BACKOFF:
+            time.sleep(delay)
+            if upstream is None or upstream.pos > pos or (
+                    upstream.seekable and pos - upstream.pos > READ_THROUGH):
+                if upstream is not None:
+                    upstream.close()
+                upstream = self._connect(stream, pos)
+                if upstream is None:
+                    return None
+            try:
+                data = upstream.read()
+            except (OSError, http.client.HTTPException) as e:
+                print(f"Warning: Stream {stream.url} dropped, reconnecting: {e}")
+                upstream.close()
+                upstream = None
+                continue
+            if not data:
+                # Cut off before the end
+                upstream.close()
+                upstream = None
+                continue
+            stream.write(upstream.pos - len(data), data)
+            self._cached(len(data))
+            return upstream
+        return None
+
+    def _serve_cached(self, handler, stream, upstream, first, last, body):
+        length = stream.length
+        if first is None:
+            first, last = 0, length - 1
+        elif first < 0:                     # the last -first bytes
+            first, last = max(0, length + first), length - 1
+        last = length - 1 if last is None else min(last, length - 1)
+        if first >= length:
+            handler.send_response(416)
+            handler.send_header("Content-Range", f"bytes */{length}")
+            handler.end_headers()
+            return
+        partial = handler.headers.get("Range") is not None
+        handler.send_response(206 if partial else 200)
+        handler.send_header("Content-Type", stream.content_type or "application/octet-stream")
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(last - first + 1))
+        if partial:
+            handler.send_header("Content-Range", f"bytes {first}-{last}/{length}")
+        handler.end_headers()
+        if not body:
+            return
+
+        pos, stop = first, last + 1
+        started = False
+        version = stream.version
+        while pos < stop:
+            end = stream.cached_until(pos)
+            # Fill the prebuffer before the first byte, then just keep ahead
+            wanted = min(stop, pos + (max(1, self.prebuffer) if not started else 1))
+            if end < wanted:
+                upstream = self._fetch(stream, upstream, end)
+                if upstream is None or stream.version != version:
+                    return                  # gave up, or the file changed; the player sees the connection end
+                continue
+            started = True
+            data = stream.read(pos, min(end, stop, pos + CHUNK_SIZE) - pos)
+            handler.wfile.write(data)
+            pos += len(data)
+
+    def _relay(self, handler, upstream, body):
+        """Pass a stream without a length (radio) on as it comes"""
+        handler.send_response(200)
+        handler.send_header("Content-Type", upstream.content_type or "audio/mpeg")
+        handler.end_headers()
+        if not body:
+            return
+        url = upstream.response.geturl()
+        pending, buffered, started = [], 0, False
+        while True:
+            try:
+                data = upstream.read()
+                if not data:
+                    raise EOFError("stream ended")
+            except (OSError, EOFError, http.client.HTTPException) as e:
+                upstream.close()
+                print(f"Warning: Stream {url} dropped, reconnecting: {e}")
+                upstream = self._reconnect_live(url)
+                if upstream is None:
+                    return
+                continue
+            with self._lock:
+                self.upstream_bytes += len(data)
+            pending.append(data)
+            buffered += len(data)
+            if started or buffered >= self.prebuffer:
+                handler.wfile.write(b"".join(pending))
+                pending, buffered, started = [], 0, True
+
+    def _reconnect_live(self, url):
+        for delay in BACKOFF:
+            time.sleep(delay)
+            try:
+                return Upstream(url, 0)
+            except UpstreamError as e:
+                print(f"Warning: Stream {url} failed: {e}")
+                return None
+            except (OSError, http.client.HTTPException):
+                continue
+        return None
+
+
+def _requested_range(header):
+    """(first, last) of a Range header; (None, None) without one, first < 0 for a suffix"""
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)):
+        return None, None
+    if not match.group(1):
+        return -int(match.group(2)), None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+def prune(cache_dir=CACHE_DIR, max_bytes=1024 * 1024 * 1024, keep=()):
+    """Delete the least recently used streams, except the data files in
+    keep, until the cache fits. Returns the data files deleted."""
+    entries = []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return []
+    for name in names:
+        if name.endswith(".data"):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # Data files are sparse after seeks; count what is really on disk
+            size = st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+            entries.append((st.st_mtime, size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        for victim in (path, path[:-len(".data")] + ".json"):
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+        removed.append(path)
+        total -= size
+    return removed
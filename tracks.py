@@ -0,0 +1,212 @@
+# tracks.py
+import json
+import os
+from array import array
+import utils
+
+TRACKS_FILE = os.path.join(utils.get_config_dir(), "tracks.json")
+
+class TrackTable:
+    """
+    Interned track paths with integer ids.
+
+    Each directory prefix is stored once. Everything per track lives in
+    flat arrays: the id of its directory, and its file name as UTF-8 in one
+    shared buffer. Lookups go through an open-addressing table of ids, so a
+    track costs a few dozen bytes and no Python objects. Ids are stable for
+    the lifetime of the table.
+
+    Virtual tracks (a CUE sheet's "Album.cue#3") also have a span: the
+    file they play and where in it they start and end, in three more
+    arrays indexed through a small id -> row map.
+    """
+
+    def __init__(self):
+        self.dirs = []                      # dir id -> directory prefix, including the trailing separator
+        self._dir_ids = {}                  # directory prefix -> dir id
+        self.dir_of = array("I")            # track id -> dir id
+        self._names = bytearray()           # all file names, UTF-8, back to back
+        self._starts = array("I", [0])      # track id -> offset of its name; the last entry is the end
+        self._slots = array("i", [-1]) * 16 # hash slot -> track id, -1 when empty
+        self._span_rows = {}                # virtual track id -> row in the span arrays
+        self._span_media = array("I")       # row -> track id of the file it plays
+        self._span_start = array("I")       # row -> ms into that file
+        self._span_end = array("I")         # row -> ms where it ends; 0 = the end of the file
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    @staticmethod
+    def split(path):
+        """Split a path into (directory prefix, name) so that prefix + name == path"""
+        cut = max(path.rfind("/"), path.rfind(os.sep)) + 1
+        return path[:cut], path[cut:]
+
+    @staticmethod
+    def _encode(name):
+        # surrogatepass keeps undecodable file names (surrogate escapes) round-tripping
+        return name.encode("utf-8", "surrogatepass")
+
+    def _name_bytes(self, track_id):
+        return bytes(self._names[self._starts[track_id]:self._starts[track_id + 1]])
+
+    def _find(self, dir_id, encoded):
+        """Return (track id or -1, slot where it is or would go)"""
+        slots = self._slots
+        mask = len(slots) - 1
+        slot = hash((dir_id, encoded)) & mask
+        while True:
+            track_id = slots[slot]
+            if track_id == -1 or (self.dir_of[track_id] == dir_id
+                                  and self._name_bytes(track_id) == encoded):
+                return track_id, slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        slots = array("i", [-1]) * (len(self._slots) * 2)
+        mask = len(slots) - 1
+        for track_id in range(len(self)):
+            slot = hash((self.dir_of[track_id], self._name_bytes(track_id))) & mask
+            while slots[slot] != -1:
+                slot = (slot + 1) & mask
+            slots[slot] = track_id
+        self._slots = slots
+
+    def intern(self, path):
+        """Return the id of a path, adding it if it is new"""
+        prefix, name = self.split(path)
+        dir_id = self._dir_ids.get(prefix)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(prefix)
+            self._dir_ids[prefix] = dir_id
+        encoded = self._encode(name)
+        track_id, slot = self._find(dir_id, encoded)
+        if track_id != -1:
+            return track_id
+        track_id = len(self)
+        self._names += encoded
+        self._starts.append(len(self._names))
+        self.dir_of.append(dir_id)
+        self._slots[slot] = track_id
+        # Keep the table at most half full so probe runs stay short
+        if 2 * len(self) > len(self._slots):
+            self._grow()
+        return track_id
+
+    def lookup(self, path):
+        """Return the id of a path, or None if it was never interned"""
+        prefix, name = self.split(path)
+        dir_id = self._dir_ids.get(prefix)
+        if dir_id is None:
+            return None
+        track_id, _ = self._find(dir_id, self._encode(name))
+        return None if track_id == -1 else track_id
+
+    def name(self, track_id):
+        return self._name_bytes(track_id).decode("utf-8", "surrogatepass")
+
+    def directory(self, track_id):
+        return self.dirs[self.dir_of[track_id]]
+
+    def path(self, track_id):
+        return self.dirs[self.dir_of[track_id]] + self.name(track_id)
+
+    def set_span(self, track_id, media_path, start_ms, end_ms):
+        """Make a track play media_path from start_ms to end_ms (0 = its end)"""
+        media_id = self.intern(media_path)
+        row = self._span_rows.get(track_id)
+        if row is None:
+            self._span_rows[track_id] = len(self._span_media)
+            self._span_media.append(media_id)
+            self._span_start.append(start_ms)
+            self._span_end.append(end_ms)
+        else:
+            self._span_media[row] = media_id
+            self._span_start[row] = start_ms
+            self._span_end[row] = end_ms
+
+    def span(self, track_id):
+        """(media path, start ms, end ms) of a virtual track, or None"""
+        row = self._span_rows.get(track_id)
+        if row is None:
+            return None
+        return self.path(self._span_media[row]), self._span_start[row], self._span_end[row]
+
+
+class TrackList:
+    """Read-only sequence of paths for an array of track ids"""
+    __slots__ = ("table", "ids")
+
+    def __init__(self, table, ids):
+        self.table = table
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table.path(t) for t in self.ids[index]]
+        return self.table.path(self.ids[index])
+
+    def __iter__(self):
+        path = self.table.path
+        for track_id in self.ids:
+            yield path(track_id)
+
+    def __contains__(self, path):
+        track_id = self.table.lookup(path)
+        return track_id is not None and track_id in self.ids
+
+    def index(self, path):
+        track_id = self.table.lookup(path)
+        if track_id is None:
+            raise ValueError(f"{path!r} is not in the playlist")
+        return self.ids.index(track_id)
+
+
+# ---------- Persistence ----------
+def dump_tracks(table, ids):
+    """
+    Serialize tracks in order as {"dirs": [...], "tracks": [dir, name, ...]}.
+    Only directories that are still referenced are written.
+    """
+    dirs = []
+    renumber = {}
+    flat = []
+    for track_id in ids:
+        dir_id = table.dir_of[track_id]
+        new_id = renumber.get(dir_id)
+        if new_id is None:
+            new_id = renumber[dir_id] = len(dirs)
+            dirs.append(table.dirs[dir_id])
+        flat.append(new_id)
+        flat.append(table.name(track_id))
+    return {"version": 1, "dirs": dirs, "tracks": flat}
+
+def iter_track_paths(data):
+    """Yield the paths stored by dump_tracks"""
+    dirs = data.get("dirs", [])
+    flat = data.get("tracks", [])
+    for i in range(0, len(flat) - 1, 2):
+        dir_id, name = flat[i], flat[i + 1]
+        if isinstance(dir_id, int) and 0 <= dir_id < len(dirs) and isinstance(name, str):
+            yield dirs[dir_id] + name
+
+def save_tracks_file(table, ids, path=TRACKS_FILE):
+    utils.write_json_atomic(path, dump_tracks(table, ids), indent=None)
+
+def load_tracks_file(path=TRACKS_FILE):
+    """Return the stored track paths, or None if there is no usable file"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Could not load library: {e}")
+        return None
+    if not isinstance(data, dict):
+        return None
+    return list(iter_track_paths(data))
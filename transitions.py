@@ -0,0 +1,109 @@
+# transitions.py
+"""
+Pre-rendered transitions between two GIF frames.
+
+All in-between frames are rendered in one go before the transition
+starts, so playing it is just showing a few ready pixmaps. With numpy
+the whole crossfade is one vectorized blend over every step at once;
+without it each step is drawn with QPainter. Renderer does the same in
+a worker thread, so the GUI thread never blends.
+"""
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
+
+try:
+    import numpy        # optional: blends all steps in one vectorized pass
+except ImportError:
+    numpy = None
+
+KINDS = ("crossfade", "slide", "none")
+
+def _prepare(image, width, height):
+    image = image.convertToFormat(QImage.Format_RGBA8888_Premultiplied)
+    if image.width() != width or image.height() != height:
+        # The dock stretches every frame to its size, so do the same here
+        image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    return image
+
+def _as_array(image):
+    pixels = image.constBits().asstring(image.bytesPerLine() * image.height())
+    rows = numpy.frombuffer(pixels, numpy.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)
+
+def _from_array(pixels):
+    height, width = pixels.shape[:2]
+    pixels = numpy.ascontiguousarray(pixels)
+    # copy() so the image owns its memory once the array goes away
+    return QImage(pixels.data, width, height, width * 4, QImage.Format_RGBA8888_Premultiplied).copy()
+
+def crossfade(start, end, steps):
+    """Frames fading from start into end, both ends excluded"""
+    width, height = end.width(), end.height()
+    start, end = _prepare(start, width, height), _prepare(end, width, height)
+    if numpy is not None:
+        a = _as_array(start).astype(numpy.uint16)
+        b = _as_array(end).astype(numpy.uint16)
+        weights = numpy.arange(1, steps + 1, dtype=numpy.uint16).reshape(-1, 1, 1, 1) * 256 // (steps + 1)
+        blended = ((a * (256 - weights) + b * weights) >> 8).astype(numpy.uint8)
+        return [_from_array(frame) for frame in blended]
+
+    frames = []
+    for step in range(1, steps + 1):
+        frame = QImage(start)
+        painter = QPainter(frame)
+        painter.setOpacity(step / (steps + 1))
+        painter.drawImage(0, 0, end)
+        painter.end()
+        frames.append(frame)
+    return frames
+
+def slide(start, end, steps, backwards=False):
+    """Frames where end pushes start out sideways (to the left, or right if backwards)"""
+    width, height = end.width(), end.height()
+    start, end = _prepare(start, width, height), _prepare(end, width, height)
+    if numpy is not None:
+        # The two images side by side; each step is a window over them
+        pair = (_as_array(start), _as_array(end))
+        strip = numpy.concatenate(pair[::-1] if backwards else pair, axis=1)
+    frames = []
+    for step in range(1, steps + 1):
+        offset = width * step // (steps + 1)
+        if numpy is not None:
+            left = width - offset if backwards else offset
+            frames.append(_from_array(strip[:, left:left + width]))
+            continue
+        frame = QImage(width, height, QImage.Format_RGBA8888_Premultiplied)
+        frame.fill(Qt.transparent)
+        painter = QPainter(frame)
+        if backwards:
+            painter.drawImage(offset, 0, start)
+            painter.drawImage(offset - width, 0, end)
+        else:
+            painter.drawImage(-offset, 0, start)
+            painter.drawImage(width - offset, 0, end)
+        painter.end()
+        frames.append(frame)
+    return frames
+
+def render(kind, start, end, steps, backwards=False):
+    """In-between frames for a transition kind; empty for "none" """
+    if kind == "crossfade":
+        return crossfade(start, end, steps)
+    if kind == "slide":
+        return slide(start, end, steps, backwards)
+    return []
+
+
+class Renderer(QThread):
+    """Render one transition's frames in the background"""
+    rendered = pyqtSignal(object, list)     # emits (tag, QImages)
+
+    def __init__(self, tag, kind, start, end, steps, backwards=False, parent=None):
+        super().__init__(parent)
+        self.tag = tag                      # whatever identifies the switch to the caller
+        self.job = (kind, start, end, steps, backwards)
+
+    def run(self):
+        frames = render(*self.job)
+        if not self.isInterruptionRequested():
+            self.rendered.emit(self.tag, frames)
@@ -7,6 +7,32 @@ import sys
 
 APP_NAME = "Gifly"
 
+# Audio formats accepted by the library (lowercase, with leading dot)
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".flac", ".m4a", ".aac", ".wma")
+
+def is_audio_file(path):
+    """Return True if the path has a supported audio extension"""
+    return os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
+
+# Sheets that split one audio file into tracks (see cue.py)
+CUE_EXTENSION = ".cue"
+
+def is_cue_file(path):
+    return path[-4:].lower() == CUE_EXTENSION
+
+# Short videos the dock plays in a loop instead of a GIF
+VIDEO_LOOP_EXTENSIONS = (".mp4", ".webm")
+
+def is_video_loop(path):
+    """Return True if the dock should play the path as a video loop"""
+    return os.path.splitext(path)[1].lower() in VIDEO_LOOP_EXTENSIONS
+
+# Internet streams and podcast episodes, played through stream_cache.py
+STREAM_SCHEMES = ("http://", "https://")
+
+def is_stream_url(path):
+    return path[:8].lower().startswith(STREAM_SCHEMES)
+
 def get_config_dir():
     """
     Return a sensible config dir for Gifly.
@@ -27,6 +53,16 @@ def get_config_dir():
 
 SETTINGS_FILE = os.path.join(get_config_dir(), "settings.json")
 
+def get_control_address():
+    """
+    Return the local socket name used to control a running Gifly.
+    - On Windows: a named pipe name (\\.\pipe\<name>)
+    - Elsewhere: a Unix socket inside the config dir
+    """
+    if sys.platform == "win32":
+        return f"{APP_NAME}-control-{os.getenv('USERNAME', 'user')}"
+    return os.path.join(get_config_dir(), "control.sock")
+
 def load_settings():
     """Load settings from JSON file with error handling"""
     if os.path.exists(SETTINGS_FILE):
@@ -40,41 +76,42 @@ def load_settings():
             return get_default_settings()
     return get_default_settings()
 
+def write_json_atomic(path, data, indent=4):
+    """Write JSON to a temp file in the config dir, then move it over path"""
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=get_config_dir())
+    try:
+        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+        # Atomic replace
+        shutil.move(tmp_path, path)
+    except Exception as e:
+        print(f"Warning: Atomic save failed: {e}")
+        # Fallback non-atomic
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=indent, ensure_ascii=False)
+        except Exception as inner_e:
+            print(f"Error: Could not save {os.path.basename(path)}: {inner_e}")
+    finally:
+        # Ensure tmp doesn't remain
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        except Exception:
+            pass
+
 def save_settings(data):
     """Save settings to JSON file atomically"""
     try:
         # Validate before saving
         validated_data = validate_settings(data)
-        
-        # Atomic write: write to temp file then move
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=get_config_dir())
-        try:
-            with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-                json.dump(validated_data, f, indent=4, ensure_ascii=False)
-            # Atomic replace
-            shutil.move(tmp_path, SETTINGS_FILE)
-        except Exception as e:
-            print(f"Warning: Atomic save failed: {e}")
-            # Fallback non-atomic
-            try:
-                with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(validated_data, f, indent=4, ensure_ascii=False)
-            except Exception as inner_e:
-                print(f"Error: Could not save settings: {inner_e}")
-        finally:
-            # Ensure tmp doesn't remain
-            try:
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-            except Exception:
-                pass
+        write_json_atomic(SETTINGS_FILE, validated_data)
     except Exception as e:
         print(f"Error in save_settings: {e}")
 
 def get_default_settings():
     """Return default settings structure"""
     return {
-        "playlist": [],
         "last_index": -1,
         "last_position": 0,
         "volume": 70,
@@ -83,11 +120,37 @@ def get_default_settings():
         "shuffle": False,
         "repeat_mode": "none",
         "dock_geometry": None,
+        "extra_docks": [],                  # [{"geometry": [x, y, w, h], "gifs": [] = follow the song}]
         "window_geometry": None,
         "playlists": {},
+        "smart_playlists": {},
+        "gif_rules": [],
+        "library_roots": [],
+        "library_sort": [-1, 0],
+        "frame_memory_mb": 256,
+        "stream_prebuffer_kb": 256,         # buffered before a stream starts playing
+        "stream_cache_mb": 1024,            # disk kept of streams already heard
+        "dock_transition": "crossfade",
+        "dock_rotate_mode": "off",
+        "dock_rotate_every": 10,
+        "dock_audio_reactive": False,
+        "dock_spectrum": False,
+        "spectrum_bins": 32,
+        "spectrum_fps": 30,
+        "audio_engine": "qt",
+        "eq_enabled": False,
+        "eq_gains": [0] * 10,
+        "eq_presets": {},
         "theme": "dark"
     }
 
+def _eq_gains(gains):
+    """Equalizer gains clamped to +-12 dB, or None if they are not 10 numbers"""
+    if not (isinstance(gains, list) and len(gains) == 10
+            and all(isinstance(g, (int, float)) and not isinstance(g, bool) for g in gains)):
+        return None
+    return [max(-12, min(12, g)) for g in gains]
+
 def validate_settings(data):
     """Validate and sanitize settings data"""
     defaults = get_default_settings()
@@ -98,7 +161,8 @@ def validate_settings(data):
             data[key] = default_value
     
     # Type validation
-    if not isinstance(data.get("playlist"), list):
+    # "playlist" only appears in settings written by older versions (see tracks.py)
+    if "playlist" in data and not isinstance(data["playlist"], list):
         data["playlist"] = []
     
     if not isinstance(data.get("last_index"), int):
@@ -119,6 +183,74 @@ def validate_settings(data):
     if not isinstance(data.get("song_gifs"), dict):
         data["song_gifs"] = {}
     
+    if not isinstance(data.get("playlists"), dict):
+        data["playlists"] = {}
+    
+    if not isinstance(data.get("smart_playlists"), dict):
+        data["smart_playlists"] = {}
+
+    if not isinstance(data.get("gif_rules"), list):
+        data["gif_rules"] = []
+
+    sort = data.get("library_sort")
+    if not (isinstance(sort, list) and len(sort) == 2 and all(isinstance(v, int) for v in sort)):
+        data["library_sort"] = [-1, 0]
+    
+    memory = data.get("frame_memory_mb")
+    if not isinstance(memory, int) or isinstance(memory, bool):
+        memory = 256
+    data["frame_memory_mb"] = max(16, memory)
+
+    prebuffer = data.get("stream_prebuffer_kb")
+    if not isinstance(prebuffer, int) or isinstance(prebuffer, bool):
+        prebuffer = 256
+    data["stream_prebuffer_kb"] = min(max(0, prebuffer), 16384)
+
+    stream_cache = data.get("stream_cache_mb")
+    if not isinstance(stream_cache, int) or isinstance(stream_cache, bool):
+        stream_cache = 1024
+    data["stream_cache_mb"] = max(0, stream_cache)
+
+    if data.get("dock_transition") not in ["crossfade", "slide", "none"]:
+        data["dock_transition"] = "crossfade"
+
+    if data.get("dock_rotate_mode") not in ["off", "seconds", "loops", "beats"]:
+        data["dock_rotate_mode"] = "off"
+
+    every = data.get("dock_rotate_every")
+    if not isinstance(every, int) or isinstance(every, bool):
+        every = 10
+    data["dock_rotate_every"] = max(1, min(3600, every))
+
+    if not isinstance(data.get("dock_audio_reactive"), bool):
+        data["dock_audio_reactive"] = False
+
+    if not isinstance(data.get("dock_spectrum"), bool):
+        data["dock_spectrum"] = False
+
+    for key, default, low, high in (("spectrum_bins", 32, 4, 128), ("spectrum_fps", 30, 5, 60)):
+        value = data.get(key)
+        if not isinstance(value, int) or isinstance(value, bool):
+            value = default
+        data[key] = max(low, min(high, value))
+
+    if data.get("audio_engine") not in ["qt", "pcm"]:
+        data["audio_engine"] = "qt"
+
+    if not isinstance(data.get("eq_enabled"), bool):
+        data["eq_enabled"] = False
+
+    data["eq_gains"] = _eq_gains(data.get("eq_gains")) or [0] * 10
+
+    presets = data.get("eq_presets")
+    if not isinstance(presets, dict):
+        presets = {}
+    data["eq_presets"] = {name: gains for name, gains in
+                          ((name, _eq_gains(gains)) for name, gains in presets.items()) if gains}
+
+    if not isinstance(data.get("library_roots"), list):
+        data["library_roots"] = []
+    
     if not isinstance(data.get("shuffle"), bool):
         data["shuffle"] = False
     
@@ -129,6 +261,18 @@ def validate_settings(data):
     if data.get("dock_geometry") is not None:
         if not isinstance(data["dock_geometry"], list) or len(data["dock_geometry"]) != 4:
             data["dock_geometry"] = None
+
+    # Extra docks: a geometry each, and the GIFs they keep to ([] = follow the song)
+    extra_docks = []
+    for dock in data.get("extra_docks") if isinstance(data.get("extra_docks"), list) else []:
+        if not isinstance(dock, dict):
+            continue
+        geometry = dock.get("geometry")
+        if not isinstance(geometry, list) or len(geometry) != 4 or not all(isinstance(v, int) for v in geometry):
+            continue
+        gifs = dock.get("gifs") if isinstance(dock.get("gifs"), list) else []
+        extra_docks.append({"geometry": geometry, "gifs": [g for g in gifs if isinstance(g, str)]})
+    data["extra_docks"] = extra_docks
     
     # Validate window geometry
     if data.get("window_geometry") is not None:
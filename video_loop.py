@@ -0,0 +1,77 @@
+# video_loop.py
+"""
+Short MP4/WebM loops for the GIF dock.
+
+A video is a far smaller and cheaper to decode animation than a GIF of
+the same clip. Frames are pulled through a plain QAbstractVideoSurface
+that asks for RGB frames in system memory, so it works the same with
+every multimedia backend and graphics driver.
+"""
+from PyQt5.QtCore import QObject, QUrl, pyqtSignal
+from PyQt5.QtGui import QImage
+from PyQt5.QtMultimedia import (QAbstractVideoBuffer, QAbstractVideoSurface, QMediaContent,
+                                QMediaPlayer, QVideoFrame)
+
+class FrameSurface(QAbstractVideoSurface):
+    """Video surface that hands each frame on as a QImage"""
+    frame_ready = pyqtSignal(QImage)
+
+    FORMATS = [QVideoFrame.Format_ARGB32, QVideoFrame.Format_ARGB32_Premultiplied,
+               QVideoFrame.Format_RGB32, QVideoFrame.Format_RGB24]
+
+    def supportedPixelFormats(self, handle_type=QAbstractVideoBuffer.NoHandle):
+        if handle_type == QAbstractVideoBuffer.NoHandle:
+            return self.FORMATS
+        return []
+
+    def present(self, frame):
+        frame = QVideoFrame(frame)
+        if not frame.isValid() or not frame.map(QAbstractVideoBuffer.ReadOnly):
+            return False
+        try:
+            image_format = QVideoFrame.imageFormatFromPixelFormat(frame.pixelFormat())
+            # copy() detaches the image from the frame's buffer before unmap
+            image = QImage(frame.bits(), frame.width(), frame.height(),
+                           frame.bytesPerLine(), image_format).copy()
+        finally:
+            frame.unmap()
+        self.frame_ready.emit(image)
+        return True
+
+
+class VideoLoop(QObject):
+    """Play a video silently and endlessly, emitting its frames"""
+    frame_ready = pyqtSignal(QImage)
+    looped = pyqtSignal()                   # emits each time the video starts over
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.surface = FrameSurface(self)
+        self.surface.frame_ready.connect(self.frame_ready)
+        self.player = QMediaPlayer(self, QMediaPlayer.VideoSurface)
+        self.player.setMuted(True)
+        self.player.setVideoOutput(self.surface)
+        self.player.mediaStatusChanged.connect(self._on_status)
+        self.player.error.connect(self._on_error)
+        self.player.setMedia(QMediaContent(QUrl.fromLocalFile(path)))
+
+    def start(self):
+        self.player.play()
+
+    def stop(self):
+        self.player.stop()
+        self.player.setMedia(QMediaContent())
+
+    def _on_status(self, status):
+        # Rewind in place instead of reloading the media; the last frame
+        # stays on screen meanwhile, so the loop point does not flash
+        if status == QMediaPlayer.EndOfMedia:
+            self.player.setPosition(0)
+            self.player.play()
+            self.looped.emit()
+
+    def _on_error(self, _error):
+        print(f"Warning: Could not play video loop {self.path}: {self.player.errorString()}")
+        self.failed.emit(self.path)
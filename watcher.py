@@ -0,0 +1,154 @@
+# watcher.py
+import os
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+import utils
+
+class LibraryWatcher(QObject):
+    """
+    Watch library root folders and report audio file changes in batches.
+
+    Only directories are watched (one inotify watch per folder, not per file).
+    For every watched folder we keep a snapshot of the audio file names and
+    subfolder names it contained at the last scan, so a change notification
+    only rescans that one folder and diffs it against its snapshot.
+    """
+    changes = pyqtSignal(list, list)        # emits (added paths, removed paths)
+
+    def __init__(self, debounce_ms=750, parent=None):
+        super().__init__(parent)
+        self.roots = []
+
+        # dir path -> (frozenset of audio file names, frozenset of subdir names)
+        self._snapshots = {}
+        self._dirty = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+
+        # Changes are collected for a fixed window, then applied as one batch
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(debounce_ms)
+        self.flush_timer.timeout.connect(self._flush)
+
+    # ---------- Roots ----------
+    def add_root(self, root):
+        """Start watching a folder tree. Returns all audio files found in it."""
+        root = os.path.normpath(os.path.abspath(root))
+        if not os.path.isdir(root) or self.covers(root):
+            return []
+
+        # A new root may contain roots that were added earlier
+        self.roots = [r for r in self.roots if not self._is_under(r, root)]
+        self.roots.append(root)
+
+        found = []
+        self._walk(root, found)
+        return found
+
+    def clear(self):
+        """Stop watching everything"""
+        dirs = list(self._snapshots)
+        if dirs:
+            self.watcher.removePaths(dirs)
+        self._snapshots.clear()
+        self._dirty.clear()
+        self.roots = []
+
+    # ---------- Scanning ----------
+    @staticmethod
+    def _is_under(path, root):
+        return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+    def covers(self, path):
+        """Whether a path is inside one of the watched roots"""
+        return any(self._is_under(path, r) for r in self.roots)
+
+    @staticmethod
+    def _scan_dir(directory):
+        """Return (audio file and CUE sheet names, subdir names) of one folder, non-recursive"""
+        files = []
+        dirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif ((utils.is_audio_file(entry.name) or utils.is_cue_file(entry.name))
+                              and entry.is_file()):
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return frozenset(files), frozenset(dirs)
+
+    def _walk(self, top, found):
+        """Snapshot and watch a folder tree, collecting its audio files"""
+        stack = [top]
+        new_dirs = []
+        while stack:
+            directory = stack.pop()
+            if directory in self._snapshots:
+                continue
+            scan = self._scan_dir(directory)
+            if scan is None:
+                continue
+            files, dirs = scan
+            self._snapshots[directory] = scan
+            new_dirs.append(directory)
+            found.extend(os.path.join(directory, name) for name in files)
+            stack.extend(os.path.join(directory, name) for name in dirs)
+
+        if new_dirs:
+            failed = self.watcher.addPaths(new_dirs)
+            if failed:
+                print(f"Warning: Could not watch {len(failed)} folder(s), "
+                      f"e.g. {failed[0]} (watch limit reached?)")
+
+    def _drop(self, top, removed):
+        """Forget a folder tree, collecting the audio files it contained"""
+        gone = [d for d in self._snapshots if self._is_under(d, top)]
+        for directory in gone:
+            files, _ = self._snapshots.pop(directory)
+            removed.extend(os.path.join(directory, name) for name in files)
+            self._dirty.discard(directory)
+        if gone:
+            self.watcher.removePaths(gone)
+
+    # ---------- Change handling ----------
+    def _on_directory_changed(self, path):
+        self._dirty.add(os.path.normpath(path))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def _flush(self):
+        added = []
+        removed = []
+        dirty, self._dirty = self._dirty, set()
+
+        # Parents first, so a vanished subtree is dropped before its children
+        for directory in sorted(dirty, key=len):
+            old = self._snapshots.get(directory)
+            if old is None:
+                continue
+            scan = self._scan_dir(directory) if os.path.isdir(directory) else None
+            if scan is None:
+                self._drop(directory, removed)
+                continue
+
+            old_files, old_dirs = old
+            files, dirs = scan
+            self._snapshots[directory] = scan
+
+            added.extend(os.path.join(directory, n) for n in files - old_files)
+            removed.extend(os.path.join(directory, n) for n in old_files - files)
+
+            for name in dirs - old_dirs:
+                self._walk(os.path.join(directory, name), added)
+            for name in old_dirs - dirs:
+                self._drop(os.path.join(directory, name), removed)
+
+        if added or removed:
+            self.changes.emit(added, removed)